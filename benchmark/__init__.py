@@ -0,0 +1,10 @@
+'''
+Benchmarks for CSViewer. Run `python -m benchmark --help` from the
+repository root.
+'''
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).parent.parent.joinpath('src')
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
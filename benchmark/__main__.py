@@ -0,0 +1,128 @@
+'''
+Generate synthetic CSV files and time every stage of the pipeline.
+
+Usage:
+    python -m benchmark --output results.json
+    python -m benchmark --rows 100000 --columns 2 20 --files 1 50
+    python -m benchmark --compare base.json results.json
+'''
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+from benchmark import stages, synthetic
+
+
+def get_git_commit() -> str:
+    try:
+        output = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+    return output.stdout.strip()
+
+
+def get_meta() -> Dict:
+    import matplotlib
+    import numpy
+    import pandas
+    return {
+        'commit': get_git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+        'matplotlib': matplotlib.__version__,
+    }
+
+
+def get_result_key(result: Dict) -> str:
+    params = ','.join(f'{key}={value}' for key, value in sorted(result['params'].items()))
+    return f"{result['stage']}[{params}]"
+
+
+def compare(base_path: str, new_path: str) -> int:
+    with open(base_path, 'r') as f:
+        base = {get_result_key(result): result for result in json.load(f)['results']}
+    with open(new_path, 'r') as f:
+        new = {get_result_key(result): result for result in json.load(f)['results']}
+    for key in sorted(base.keys() & new.keys()):
+        if base[key]['best'] is None or new[key]['best'] is None:
+            continue
+        ratio = new[key]['best'] / base[key]['best']
+        print(f"{ratio:6.2f}x  {base[key]['best']:9.4f} s -> {new[key]['best']:9.4f} s  {key}")
+    return 0
+
+
+def run(args: argparse.Namespace) -> List[Dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        combinations = itertools.product(
+            args.rows, args.columns, args.header, args.files
+        )
+        for rows, columns, header, files in combinations:
+            directory = Path(tmp_dir).joinpath(f'{rows}-{columns}-{header}-{files}')
+            paths = synthetic.generate_dataset(directory, rows, columns, header, files)
+            scenario: stages.Scenario = {
+                'rows': rows,
+                'columns': columns,
+                'header': header,
+                'files': files,
+                'paths': paths,
+            }
+            for result in stages.run_stages(args.stages, scenario, args.repeat):
+                results.append(result)
+                if result['error'] is None:
+                    status = f"{result['best']:.4f} s"
+                else:
+                    status = result['error']
+                print(f'{get_result_key(result)}: {status}', file=sys.stderr)
+    return results
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--columns', type=int, nargs='+', default=[2, 20])
+    parser.add_argument('--files', type=int, nargs='+', default=[1, 20])
+    parser.add_argument(
+        '--header', type=lambda value: value.lower() in ('1', 'true', 'yes'),
+        nargs='+', default=[True, False]
+    )
+    parser.add_argument(
+        '--stages', nargs='+', choices=list(stages.STAGES),
+        default=list(stages.STAGES)
+    )
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=None, help='write JSON results here')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare)
+
+    output = {'meta': get_meta(), 'results': run(args)}
+    text = json.dumps(output, indent=4)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
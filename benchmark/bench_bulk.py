@@ -0,0 +1,74 @@
+'''
+Compare drawing many series as separate lines with the bulk
+LineCollection path.
+
+Usage:
+    python -m benchmark.bench_bulk [--series 500] [--rows 2000] [--repeat 3]
+'''
+import argparse
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import benchmark  # noqa: F401,E402  (puts src on sys.path)
+import plotting  # noqa: E402
+
+
+def make_data_pool(series: int, rows: int):
+    rng = np.random.default_rng(0)
+    time_values = np.arange(rows) * 0.02
+    return [
+        pd.DataFrame({
+            'time(sec)': time_values,
+            'response(g)': rng.standard_normal(rows).cumsum() * 1e-3
+        })
+        for _ in range(series)
+    ]
+
+
+def make_config(series: int, bulk_threshold: int) -> plotting.Config:
+    config = plotting.get_initial_configuration()
+    config['data']['fieldnames'] = [{'x': 'time(sec)', 'y': 'response(g)'}] * series
+    config['data']['labels'] = [f'run-{idx:04d}' for idx in range(series)]
+    config['figure']['size'] = [6.4, 4.8]
+    config['figure']['legend_visible'] = True
+    config['figure']['bulk_threshold'] = bulk_threshold
+    config['axis_x']['scale'] = config['axis_y']['scale'] = 'linear'
+    config['axis_x']['lim'] = config['axis_y']['lim'] = None
+    return config
+
+
+def time_draw(config: plotting.Config, data_pool, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fig = plotting.draw_figure(config, data_pool)
+        fig.canvas.draw()
+        best = min(best, time.perf_counter() - start)
+        plt.close(fig)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--series', type=int, default=500)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data_pool = make_data_pool(args.series, args.rows)
+    elapsed_lines = time_draw(make_config(args.series, args.series + 1), data_pool, args.repeat)
+    elapsed_bulk = time_draw(make_config(args.series, 1), data_pool, args.repeat)
+    print(f'series: {args.series}, rows: {args.rows}')
+    print(f'lines: {elapsed_lines:.3f} s')
+    print(f'bulk:  {elapsed_bulk:.3f} s')
+    print(f'speedup: {elapsed_lines / elapsed_bulk:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+'''
+Measure the throughput of every registered reader and codec on the same
+synthetic dataset. Throughput is given in rows per second and in MB per
+second of the equivalent uncompressed CSV. Formats whose optional package
+is missing are reported as skipped.
+
+Usage:
+    python -m benchmark.bench_readers [--rows 1000000] [--columns 4] [--repeat 3]
+'''
+import argparse
+import bz2
+import gzip
+import lzma
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+import pandas as pd
+
+import benchmark  # noqa: F401  (puts src on sys.path)
+import data_loading
+import readers
+from benchmark.synthetic import make_dataframe
+
+
+def write_compressed(opener: Callable) -> Callable[[pd.DataFrame, Path], None]:
+    def write(df: pd.DataFrame, path: Path):
+        with opener(path, 'wb') as f:
+            f.write(df.to_csv(index=False, float_format='%.7e').encode())
+    return write
+
+
+def write_zstd(df: pd.DataFrame, path: Path):
+    if readers.zstandard is None:
+        raise readers.MissingDependencyError('zstd', 'zstandard')
+    compressor = readers.zstandard.ZstdCompressor()
+    path.write_bytes(compressor.compress(df.to_csv(index=False, float_format='%.7e').encode()))
+
+
+WRITERS: Dict[str, Callable[[pd.DataFrame, Path], None]] = {
+    'csv': lambda df, path: df.to_csv(path, index=False, float_format='%.7e'),
+    'tsv': lambda df, path: df.to_csv(path, sep='\t', index=False, float_format='%.7e'),
+    'txt': lambda df, path: df.to_csv(path, sep=' ', index=False, float_format='%.7e'),
+    'csv.gz': write_compressed(gzip.open),
+    'csv.bz2': write_compressed(bz2.open),
+    'csv.xz': write_compressed(lzma.open),
+    'csv.zst': write_zstd,
+    'parquet': lambda df, path: df.to_parquet(path),
+    'feather': lambda df, path: df.to_feather(path),
+}
+
+
+def time_read(path: Path, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data_loading.load_csv(path, use_cache=False)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--columns', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_dataframe(args.rows, args.columns)
+    with tempfile.TemporaryDirectory() as directory:
+        reference = Path(directory).joinpath('reference.csv')
+        WRITERS['csv'](df, reference)
+        text_mb = reference.stat().st_size / 1e6
+        print(f'rows: {args.rows}, columns: {args.columns}, csv: {text_mb:.1f} MB')
+        print(f"{'format':10s} {'file MB':>8s} {'seconds':>8s} {'Mrows/s':>8s} {'MB/s':>8s}")
+        for name, write in WRITERS.items():
+            path = Path(directory).joinpath(f'synthetic.{name}')
+            try:
+                write(df, path)
+                elapsed = time_read(path, args.repeat)
+            except (ImportError, readers.MissingDependencyError) as e:
+                print(f"{name:10s} skipped: {str(e).splitlines()[0]}")
+                continue
+            file_mb = path.stat().st_size / 1e6
+            print(
+                f'{name:10s} {file_mb:8.1f} {elapsed:8.3f} '
+                f'{args.rows / elapsed / 1e6:8.2f} {text_mb / elapsed:8.1f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
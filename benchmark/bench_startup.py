@@ -0,0 +1,88 @@
+'''
+Time `import main_gui` in fresh interpreters and check it against a budget.
+The GUI defers pandas, numpy and matplotlib until the window is shown, so
+the import should only cost tkinter and the light modules. Exits with
+status 1 when the median import time exceeds the budget.
+
+Usage:
+    python -m benchmark.bench_startup [--runs 7] [--budget-ms 100] [--top 10]
+'''
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import List, Tuple
+
+import benchmark
+
+IMPORT_BUDGET_MS = 100
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib')
+
+TIMING_CODE = '''
+import sys, time
+start = time.perf_counter()
+import main_gui
+elapsed = time.perf_counter() - start
+loaded = [
+    name for name in {heavy!r}
+    if type(sys.modules.get(name)).__name__ == 'module'
+]
+print(elapsed, ','.join(loaded))
+'''
+
+
+def time_import() -> Tuple[float, List[str]]:
+    output = subprocess.run(
+        [sys.executable, '-c', TIMING_CODE.format(heavy=HEAVY_MODULES)],
+        cwd=benchmark.SRC_DIR, capture_output=True, text=True, check=True
+    ).stdout.split()
+    loaded = output[1].split(',') if len(output) > 1 else []
+    return float(output[0]), loaded
+
+
+def time_imports(runs: int) -> Tuple[float, List[str]]:
+    '''Median import time in ms over `runs` imports, and the heavy modules loaded.'''
+    timings, loaded = [], []
+    for _ in range(runs):
+        elapsed, loaded = time_import()
+        timings.append(elapsed * 1e3)
+    return statistics.median(timings), loaded
+
+
+def get_top_imports(top: int) -> List[Tuple[int, str]]:
+    '''Modules with the largest cumulative import time, from -X importtime.'''
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main_gui'],
+        cwd=benchmark.SRC_DIR, capture_output=True, text=True, check=True
+    ).stderr
+    entries = []
+    for line in stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        entries.append((int(fields[1]), fields[2].rstrip()))
+    return sorted(entries, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--budget-ms', type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument('--top', type=int, default=0, help='list the slowest imports')
+    args = parser.parse_args()
+
+    median, loaded = time_imports(args.runs)
+    print(f'import main_gui: median {median:.1f} ms '
+          f'over {args.runs} runs (budget {args.budget_ms:.0f} ms)')
+    if loaded:
+        print(f'loaded eagerly: {", ".join(loaded)}')
+    for microseconds, name in get_top_imports(args.top):
+        print(f'{microseconds / 1e3:8.1f} ms {name}')
+
+    if median > args.budget_ms:
+        print('over budget')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+'''
+Compare the row-by-row Treeview population with the bulk path.
+
+Usage:
+    python -m benchmark.bench_treeview [--rows 100000] [--columns 4]
+'''
+import argparse
+import time
+import tkinter as tk
+
+import numpy as np
+import pandas as pd
+
+import benchmark  # noqa: F401  (puts src on sys.path)
+from custom_widgets import Treeview
+
+
+def make_dataframe(rows: int, columns: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    data = {
+        f'column-{idx}': rng.standard_normal(rows)
+        for idx in range(columns)
+    }
+    return pd.DataFrame(data)
+
+
+def insert_rowwise(treeview: Treeview, df: pd.DataFrame):
+    for idx, row in df.iterrows():
+        treeview.insert(
+            parent='',
+            index=idx,
+            values=list(row.values),
+            tags=str(idx)
+        )
+
+
+def adjust_column_width_rowwise(treeview: Treeview):
+    lengths = {
+        column: [len(column), ] for column in treeview['columns']
+    }
+    for line in treeview.get_children():
+        columns = treeview['columns']
+        values = treeview.item(line)['values']
+        for column, value in zip(columns, values):
+            lengths[column].append(len(str(value)))
+
+    for column in treeview['columns']:
+        width = Treeview.COLUMN_WIDTH_RATIO * max(lengths[column])
+        treeview.column(column, anchor=tk.W, width=width, stretch=0)
+
+
+def time_rowwise(frame: tk.Frame, df: pd.DataFrame) -> float:
+    treeview = Treeview(frame, list(df.columns), 28)
+    start = time.perf_counter()
+    insert_rowwise(treeview, df)
+    adjust_column_width_rowwise(treeview)
+    elapsed = time.perf_counter() - start
+    treeview.clear_content()
+    return elapsed
+
+
+def time_bulk(frame: tk.Frame, df: pd.DataFrame) -> float:
+    treeview = Treeview(frame, list(df.columns), 28)
+    start = time.perf_counter()
+    treeview.insert_dataframe(df)
+    treeview.adjust_column_width()
+    elapsed = time.perf_counter() - start
+    treeview.clear_content()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--columns', type=int, default=4)
+    args = parser.parse_args()
+
+    root = tk.Tk()
+    root.withdraw()
+    frame = tk.Frame(root)
+    df = make_dataframe(args.rows, args.columns)
+
+    elapsed_rowwise = time_rowwise(frame, df)
+    elapsed_bulk = time_bulk(frame, df)
+    print(f'rows: {args.rows}, columns: {args.columns}')
+    print(f'row-by-row: {elapsed_rowwise:.3f} s')
+    print(f'bulk:       {elapsed_bulk:.3f} s')
+    print(f'speedup:    {elapsed_rowwise / elapsed_bulk:.1f}x')
+    root.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+'''
+Timed stages of the import and plot pipeline. Every stage function takes
+a prepared scenario and returns a callable that runs the stage once.
+'''
+import atexit
+import io
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, TypedDict
+
+import pandas as pd
+
+
+_tk_root = None
+
+
+class Scenario(TypedDict):
+    rows: int
+    columns: int
+    header: bool
+    files: int
+    paths: List[Path]
+
+
+class StageResult(TypedDict):
+    stage: str
+    params: Dict
+    seconds: List[float]
+    best: Optional[float]
+    median: Optional[float]
+    error: Optional[str]
+
+
+def get_fieldnames(scenario: Scenario) -> Dict[str, str]:
+    if scenario['header']:
+        df = pd.read_csv(scenario['paths'][0], nrows=0)
+        return {'x': df.columns[0], 'y': df.columns[1]}
+    return {'x': 'column-0', 'y': 'column-1'}
+
+
+def make_config(scenario: Scenario):
+    import plotting
+    config = plotting.get_initial_configuration()
+    config['data']['directory'] = str(scenario['paths'][0].parent)
+    config['data']['fieldnames'] = [get_fieldnames(scenario)] * scenario['files']
+    config['data']['labels'] = [path.stem for path in scenario['paths']]
+    config['figure']['size'] = [4.8, 2.4]
+    config['axis_x']['scale'] = config['axis_y']['scale'] = 'linear'
+    config['axis_x']['lim'] = config['axis_y']['lim'] = None
+    return config
+
+
+def stage_check_header(scenario: Scenario) -> Callable:
+    import data_loading
+
+    def run():
+        data_loading._dialect_cache.clear()
+        for path in scenario['paths']:
+            data_loading.sniff_dialect(path)['has_header']
+    return run
+
+
+def stage_collect_data_pool(scenario: Scenario) -> Callable:
+    import data_loading
+    paths = {str(idx + 1): path for idx, path in enumerate(scenario['paths'])}
+    return lambda: data_loading.load_csvs(paths, use_cache=False)
+
+
+def stage_get_data_pool(scenario: Scenario) -> Callable:
+    import plotting
+    config = make_config(scenario)
+    return lambda: plotting.get_data_pool(config, use_cache=False)
+
+
+def get_tk_root():
+    '''The hidden Tk root shared by every scenario, destroyed at exit.'''
+    global _tk_root
+    if _tk_root is None:
+        import tkinter as tk
+        _tk_root = tk.Tk()
+        _tk_root.withdraw()
+        atexit.register(_tk_root.destroy)
+    return _tk_root
+
+
+def stage_treeview(scenario: Scenario) -> Callable:
+    import tkinter as tk
+    from custom_widgets import VirtualTreeview
+    import data_loading
+
+    df = data_loading.read_csv(scenario['paths'][0])
+    root = get_tk_root()
+
+    def run():
+        frame = tk.Frame(root)
+        treeview = VirtualTreeview(frame, list(df.columns), 28)
+        treeview.set_dataframe(df)
+        treeview.adjust_column_width()
+        frame.destroy()
+    return run
+
+
+def load_data_pool(scenario: Scenario) -> List[pd.DataFrame]:
+    import data_loading
+    return [data_loading.read_csv(path) for path in scenario['paths']]
+
+
+def stage_plot_data(scenario: Scenario) -> Callable:
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import plotting
+    config = make_config(scenario)
+    data_pool = load_data_pool(scenario)
+
+    def run():
+        fig = plotting.draw_figure(config, data_pool)
+        fig.canvas.draw()
+        plt.close(fig)
+    return run
+
+
+def stage_export(scenario: Scenario) -> Callable:
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import plotting
+    config = make_config(scenario)
+    fig = plotting.draw_figure(config, load_data_pool(scenario))
+
+    def run():
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png')
+        buffer.close()
+    run.close = lambda: plt.close(fig)
+    return run
+
+
+STAGES: Dict[str, Callable[[Scenario], Callable]] = {
+    'check_header': stage_check_header,
+    'collect_data_pool': stage_collect_data_pool,
+    'get_data_pool': stage_get_data_pool,
+    'treeview': stage_treeview,
+    'plot_data': stage_plot_data,
+    'export': stage_export,
+}
+
+
+def run_stage(
+        name: str, scenario: Scenario, repeat: int) -> StageResult:
+    params = {
+        key: value for key, value in scenario.items() if key != 'paths'
+    }
+    result: StageResult = {
+        'stage': name,
+        'params': params,
+        'seconds': [],
+        'best': None,
+        'median': None,
+        'error': None
+    }
+    run = None
+    try:
+        run = STAGES[name](scenario)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            result['seconds'].append(time.perf_counter() - start)
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+        return result
+    finally:
+        if hasattr(run, 'close'):
+            run.close()
+    result['best'] = min(result['seconds'])
+    result['median'] = statistics.median(result['seconds'])
+    return result
+
+
+def run_stages(
+        names: Sequence[str], scenario: Scenario,
+        repeat: int) -> List[StageResult]:
+    return [run_stage(name, scenario, repeat) for name in names]
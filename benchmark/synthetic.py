@@ -0,0 +1,33 @@
+'''
+Synthetic CSV files shaped like the demonstration data: a time column
+followed by signal columns, written with or without a header row like
+`data/header` and `data/no_header`.
+'''
+from pathlib import Path
+from typing import List, Union
+
+import numpy as np
+import pandas as pd
+
+
+def make_dataframe(rows: int, columns: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    data = {'time(sec)': np.arange(rows) * 0.02}
+    for idx in range(1, columns):
+        data[f'channel-{idx}(g)'] = rng.standard_normal(rows).cumsum() * 1e-3
+    return pd.DataFrame(data)
+
+
+def generate_dataset(
+        directory: Union[str, Path], rows: int, columns: int,
+        header: bool = True, file_count: int = 1,
+        seed: int = 0) -> List[Path]:
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for idx in range(file_count):
+        path = directory.joinpath(f'synthetic_{idx:04d}.csv')
+        df = make_dataframe(rows, columns, seed + idx)
+        df.to_csv(path, index=False, header=header, float_format='%.7e')
+        paths.append(path)
+    return paths
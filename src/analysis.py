@@ -0,0 +1,279 @@
+'''
+Spectra of time histories, computed between collecting the plotted data
+and drawing it.
+
+* `fft`: Fourier amplitude spectrum |FFT| * dt.
+* `psd`: one-sided power spectral density by Welch's method with a Hann
+  window and 50 % overlapping segments, all segments in one batched FFT.
+* `response_spectrum`: pseudo-acceleration response spectrum of damped
+  single-degree-of-freedom oscillators. The Nigam-Jennings recurrence is
+  exact for piecewise-linear excitation. Every period and damping ratio
+  advances together as one vector, so the only Python loop is over time
+  steps.
+
+Series with non-uniform time steps are linearly resampled at their median
+step first. Results are memoized by the content of the series and the
+parameters, so re-plotting the same dataset is instant.
+'''
+from __future__ import annotations
+
+import copy
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple, TypedDict
+
+import decimation
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')  # METHODS is read at startup
+pd = lazy_import('pandas')
+
+
+METHODS = ('none', 'fft', 'psd', 'response_spectrum')
+DEFAULT_METHOD = 'none'
+DEFAULT_DAMPING = [0.05]
+DEFAULT_PERIOD_RANGE = [0.02, 10.0]  # seconds
+DEFAULT_PERIOD_NUMBER = 200
+DEFAULT_SEGMENT_LENGTH = 256  # samples per Welch segment
+UNIFORM_TOLERANCE = 1e-3  # spread of time steps, relative to the median step
+FORCING_CHUNK = 4096  # time steps of oscillator forcing precomputed at once
+RESULT_CACHE_SIZE = 64
+
+
+class AnalysisConfig(TypedDict):
+    method: str  # one of METHODS
+    damping: Sequence[float]  # response spectrum damping ratios
+    period_range: Sequence[float]  # response spectrum [min, max] period
+    period_number: int  # log-spaced periods within period_range
+    segment_length: int  # Welch segment length
+
+
+class Error(Exception):
+    '''Base class for exceptions in this module.'''
+    pass
+
+
+class AnalysisError(Error):
+    '''Exception raised when a series cannot be analysed.'''
+
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(self.message)
+
+
+def get_initial_configuration() -> AnalysisConfig:
+    return {
+        'method': DEFAULT_METHOD,
+        'damping': list(DEFAULT_DAMPING),
+        'period_range': list(DEFAULT_PERIOD_RANGE),
+        'period_number': DEFAULT_PERIOD_NUMBER,
+        'segment_length': DEFAULT_SEGMENT_LENGTH
+    }
+
+
+def parse_damping(text: str) -> List[float]:
+    try:
+        damping = [float(field) for field in text.replace(';', ',').split(',') if field.strip()]
+    except ValueError:
+        raise AnalysisError('Damping ratios must be numbers separated by commas.')
+    if not damping or not all(0 <= ratio < 1 for ratio in damping):
+        raise AnalysisError('Damping ratios must lie in [0, 1).')
+    return damping
+
+
+def get_uniform(t: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, float]:
+    '''Samples of y at a uniform time step, and the step.'''
+    t, y = decimation.get_finite(t, y)
+    if len(t) < 2:
+        raise AnalysisError('At least two finite samples are needed.')
+    steps = np.diff(t)
+    dt = float(np.median(steps))
+    if dt <= 0:
+        raise AnalysisError('Time must increase along the series.')
+    if np.ptp(steps) <= UNIFORM_TOLERANCE * dt:
+        return y, dt
+    grid = t[0] + dt * np.arange(int((t[-1] - t[0]) / dt) + 1)
+    return np.interp(grid, t, y), dt
+
+
+def fft_amplitude(y: np.ndarray, dt: float) -> Tuple[np.ndarray, np.ndarray]:
+    return np.fft.rfftfreq(len(y), dt), np.abs(np.fft.rfft(y)) * dt
+
+
+def welch_psd(
+        y: np.ndarray, dt: float,
+        segment_length: int = DEFAULT_SEGMENT_LENGTH) -> Tuple[np.ndarray, np.ndarray]:
+    size = min(segment_length, len(y))
+    segments = np.lib.stride_tricks.sliding_window_view(y, size)[::max(size // 2, 1)]
+    segments = segments - segments.mean(axis=1, keepdims=True)
+    window = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(size) / size)
+    power = np.abs(np.fft.rfft(segments * window, axis=1)) ** 2
+    psd = power.mean(axis=0) * dt / np.sum(window ** 2)
+    psd[1:] *= 2  # fold negative frequencies, except DC ...
+    if size % 2 == 0:
+        psd[-1] /= 2  # ... and Nyquist
+    return np.fft.rfftfreq(size, dt), psd
+
+
+def get_periods(period_range: Sequence[float], period_number: int) -> np.ndarray:
+    low, high = period_range
+    if not 0 < low < high:
+        raise AnalysisError('The period range must be positive and increasing.')
+    return np.geomspace(low, high, period_number)
+
+
+def get_recurrence(
+        omega: np.ndarray, damping: np.ndarray,
+        dt: float) -> Tuple[np.ndarray, ...]:
+    '''
+    Coefficients of the Nigam-Jennings recurrence for unit mass:
+    u[i+1] = A u + B v + C p[i] + D p[i+1],
+    v[i+1] = A1 u + B1 v + C1 p[i] + D1 p[i+1].
+    '''
+    root = np.sqrt(1 - damping ** 2)
+    omega_d = omega * root
+    decay = np.exp(-damping * omega * dt)
+    sin = np.sin(omega_d * dt)
+    cos = np.cos(omega_d * dt)
+    stiffness = omega ** 2
+    ratio = damping / root
+    a = decay * (ratio * sin + cos)
+    b = decay * sin / omega_d
+    c = (
+        2 * damping / (omega * dt)
+        + decay * (
+            ((1 - 2 * damping ** 2) / (omega_d * dt) - ratio) * sin
+            - (1 + 2 * damping / (omega * dt)) * cos
+        )
+    ) / stiffness
+    d = (
+        1 - 2 * damping / (omega * dt)
+        + decay * (
+            (2 * damping ** 2 - 1) / (omega_d * dt) * sin
+            + 2 * damping / (omega * dt) * cos
+        )
+    ) / stiffness
+    a1 = -decay * omega / root * sin
+    b1 = decay * (cos - ratio * sin)
+    c1 = (-1 / dt + decay * ((omega / root + ratio / dt) * sin + cos / dt)) / stiffness
+    d1 = (1 - decay * (ratio * sin + cos)) / (stiffness * dt)
+    return a, b, c, d, a1, b1, c1, d1
+
+
+def response_spectrum(
+        acceleration: np.ndarray, dt: float, periods: np.ndarray,
+        damping: Sequence[float]) -> np.ndarray:
+    '''
+    Pseudo-spectral acceleration omega^2 * max|u| of every oscillator, as
+    an array of shape (len(damping), len(periods)) in the units of
+    `acceleration`.
+    '''
+    damping_grid, period_grid = np.meshgrid(np.asarray(damping, dtype=float), periods, indexing='ij')
+    omega = (2 * np.pi / period_grid).ravel()
+    a, b, c, d, a1, b1, c1, d1 = get_recurrence(omega, damping_grid.ravel(), dt)
+
+    force = -np.asarray(acceleration, dtype=float)
+    u = np.zeros_like(omega)
+    v = np.zeros_like(omega)
+    peak = np.zeros_like(omega)
+    for start in range(0, len(force) - 1, FORCING_CHUNK):
+        current = force[start:start + FORCING_CHUNK]
+        following = force[start + 1:start + FORCING_CHUNK + 1]
+        current = current[:len(following)]
+        forcing_u = np.outer(current, c) + np.outer(following, d)
+        forcing_v = np.outer(current, c1) + np.outer(following, d1)
+        for step_u, step_v in zip(forcing_u, forcing_v):
+            u, v = a * u + b * v + step_u, a1 * u + b1 * v + step_v
+            np.maximum(peak, np.abs(u), out=peak)
+    return (omega ** 2 * peak).reshape(damping_grid.shape)
+
+
+_result_cache: 'OrderedDict[Tuple, List[Tuple[np.ndarray, np.ndarray]]]' = OrderedDict()
+
+
+def get_parameters(options: AnalysisConfig) -> Tuple:
+    method = options['method']
+    if method == 'psd':
+        return method, int(options.get('segment_length', DEFAULT_SEGMENT_LENGTH))
+    if method == 'response_spectrum':
+        return (
+            method,
+            tuple(options.get('damping', DEFAULT_DAMPING)),
+            tuple(options.get('period_range', DEFAULT_PERIOD_RANGE)),
+            int(options.get('period_number', DEFAULT_PERIOD_NUMBER))
+        )
+    return (method,)
+
+
+def analyse(x, y, options: AnalysisConfig) -> List[Tuple[np.ndarray, np.ndarray]]:
+    '''
+    Spectra of one series as (x, y) pairs, one per damping ratio for the
+    response spectrum and a single one otherwise.
+    '''
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    parameters = get_parameters(options)
+    key = (decimation.get_fingerprint(x), decimation.get_fingerprint(y), parameters)
+    if key in _result_cache:
+        _result_cache.move_to_end(key)
+        return _result_cache[key]
+
+    values, dt = get_uniform(x, y)
+    method = parameters[0]
+    if method == 'fft':
+        results = [fft_amplitude(values, dt)]
+    elif method == 'psd':
+        results = [welch_psd(values, dt, parameters[1])]
+    elif method == 'response_spectrum':
+        periods = get_periods(parameters[2], parameters[3])
+        spectra = response_spectrum(values, dt, periods, parameters[1])
+        results = [(periods, spectrum) for spectrum in spectra]
+    else:
+        raise AnalysisError(f'Unknown analysis "{method}".')
+
+    _result_cache[key] = results
+    while len(_result_cache) > RESULT_CACHE_SIZE:
+        _result_cache.popitem(last=False)
+    return results
+
+
+def get_names(method: str, column: str) -> Tuple[str, str]:
+    if method == 'fft':
+        return 'frequency(Hz)', f'|FFT| {column}'
+    if method == 'psd':
+        return 'frequency(Hz)', f'PSD {column}'
+    return 'period(s)', f'PSA {column}'
+
+
+def apply(config: Dict, data_send: Sequence[pd.DataFrame]) -> Tuple[Dict, List[pd.DataFrame]]:
+    '''
+    Replace every plotted series by its spectrum. The returned copy of
+    `config` names the new series, and a response spectrum with several
+    damping ratios adds one series per ratio.
+    '''
+    options = config.get('analysis') or get_initial_configuration()
+    method = options.get('method', DEFAULT_METHOD)
+    if method == 'none':
+        return config, list(data_send)
+
+    config = copy.deepcopy(config)
+    data = config['data']
+    damping = options.get('damping', DEFAULT_DAMPING)
+    source_indices = data.get('csv_indices') or []
+    csv_indices, labels, fieldnames, frames = [], [], [], []
+    for idx, (label, fieldname, df) in enumerate(
+            zip(data['labels'], data['fieldnames'], data_send)):
+        name_x, name_y = get_names(method, fieldname['y'])
+        results = analyse(df[fieldname['x']], df[fieldname['y']], options)
+        for number, (values_x, values_y) in enumerate(results):
+            series_label = label
+            if method == 'response_spectrum' and len(results) > 1:
+                series_label = f'{label} (h={damping[number]:g})'
+            if idx < len(source_indices):
+                csv_indices.append(source_indices[idx])
+            labels.append(series_label)
+            fieldnames.append({'x': name_x, 'y': name_y})
+            frames.append(pd.DataFrame({name_x: values_x, name_y: values_y}))
+    data['csv_indices'] = csv_indices
+    data['labels'] = labels
+    data['fieldnames'] = fieldnames
+    return config, frames
@@ -0,0 +1,247 @@
+'''
+Render many plot configurations headlessly.
+
+Configurations are rendered with the Agg backend across a process pool.
+Configurations that read the same data directory are grouped, so each
+worker parses a CSV once (projected to the union of the columns its
+configurations use) and reuses it for every figure in its group.
+A relative data directory is resolved against the configuration file.
+With --out-dir, figures mirror the directories of their configurations
+below the deepest directory common to all of them.
+
+Usage:
+    python batch_render.py "reports/**/*.json" --format png pdf --out-dir out
+'''
+import argparse
+import glob
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, TypedDict
+
+import matplotlib
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import analysis  # noqa: E402
+import data_loading  # noqa: E402
+import expressions  # noqa: E402
+import plotting  # noqa: E402
+
+
+FORMATS = ('png', 'svg', 'pdf')
+
+
+class Error(Exception):
+    '''Base class for exceptions in this module.'''
+    pass
+
+
+class MissingColumnsError(Error):
+    '''Exception raised when a csv file lacks columns a configuration plots.'''
+
+    def __init__(self, path: str, columns: Sequence[str]):
+        self.message = f'{path} has no column ' + ', '.join(repr(column) for column in columns)
+        super().__init__(self.message)
+
+
+class RenderTask(TypedDict):
+    config_path: str
+    config: plotting.Config
+    csv_paths: List[str]
+
+
+class RenderResult(TypedDict):
+    config_path: str
+    outputs: List[str]
+    seconds: float
+    error: Optional[str]
+
+
+def expand_patterns(patterns: Sequence[str]) -> List[Path]:
+    paths = []
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True) or [pattern]
+        paths.extend(Path(match) for match in sorted(matches))
+    return list(dict.fromkeys(paths))
+
+
+def read_task(config_path: Path) -> RenderTask:
+    with open(config_path, 'r') as f:
+        config: plotting.Config = json.load(f)
+    data_dir = Path(config['data']['directory'])
+    if not data_dir.is_absolute():
+        config['data']['directory'] = str(config_path.parent.joinpath(data_dir))
+    csv_paths = plotting.list_csvs(config)[:len(config['data']['fieldnames'])]
+    return {
+        'config_path': str(config_path),
+        'config': config,
+        'csv_paths': [str(path) for path in csv_paths]
+    }
+
+
+def group_tasks(tasks: Sequence[RenderTask], workers: int) -> List[List[RenderTask]]:
+    by_directory: Dict[str, List[RenderTask]] = {}
+    for task in tasks:
+        by_directory.setdefault(task['config']['data']['directory'], []).append(task)
+
+    chunk_size = max(math.ceil(len(tasks) / workers), 1)
+    groups = []
+    for directory_tasks in by_directory.values():
+        for start in range(0, len(directory_tasks), chunk_size):
+            groups.append(directory_tasks[start:start + chunk_size])
+    return groups
+
+
+def get_union_columns(tasks: Sequence[RenderTask]) -> Dict[str, List[str]]:
+    usecols: Dict[str, List[str]] = {}
+    for task in tasks:
+        required = plotting.get_required_columns(task['config'])
+        for idx, path in enumerate(task['csv_paths']):
+            columns = usecols.setdefault(path, [])
+            for column in required.get(idx, []):
+                if column not in columns:
+                    columns.append(column)
+    return usecols
+
+
+def get_config_root(tasks: Sequence[RenderTask]) -> Optional[str]:
+    '''Deepest directory holding every configuration of `tasks`.'''
+    if not tasks:
+        return None
+    return os.path.commonpath([
+        str(Path(task['config_path']).resolve().parent) for task in tasks
+    ])
+
+
+def get_output_paths(
+        task: RenderTask, out_dir: Optional[str],
+        formats: Sequence[str], root: Optional[str] = None) -> List[Path]:
+    config_path = Path(task['config_path'])
+    if out_dir:
+        directory = Path(out_dir)
+        if root is not None:
+            directory = directory.joinpath(config_path.resolve().parent.relative_to(root))
+    else:
+        directory = config_path.parent
+    return [directory.joinpath(f'{config_path.stem}.{fmt}') for fmt in formats]
+
+
+def load_projected(path: str, columns: Sequence[str]) -> pd.DataFrame:
+    '''
+    The `columns` of `path` that it has. Configurations sharing the file may
+    ask for different columns, so each checks its own with check_columns.
+    '''
+    available = data_loading.scan_schema(path)['columns']
+    usecols = [column for column in columns if column in available]
+    return data_loading.load_csv(path, usecols=usecols)
+
+
+def check_columns(task: RenderTask, frames: Dict[str, pd.DataFrame]):
+    required = plotting.get_required_columns(task['config'])
+    for idx, path in enumerate(task['csv_paths']):
+        missing = [
+            column for column in required.get(idx, [])
+            if column not in frames[path].columns
+        ]
+        if missing:
+            raise MissingColumnsError(path, missing)
+
+
+def render_group(
+        tasks: Sequence[RenderTask], out_dir: Optional[str],
+        formats: Sequence[str], dpi: Optional[float],
+        root: Optional[str] = None) -> List[RenderResult]:
+    usecols = get_union_columns(tasks)
+    frames: Dict[str, pd.DataFrame] = {}
+    results: List[RenderResult] = []
+    for task in tasks:
+        start = time.perf_counter()
+        result: RenderResult = {
+            'config_path': task['config_path'],
+            'outputs': [],
+            'seconds': 0.0,
+            'error': None
+        }
+        try:
+            for path in task['csv_paths']:
+                if path not in frames:
+                    frames[path] = load_projected(path, usecols[path])
+            check_columns(task, frames)
+            data_pool = [frames[path] for path in task['csv_paths']]
+            data_pool = expressions.evaluate_frames(task['config'], data_pool)
+            config, data_pool = analysis.apply(task['config'], data_pool)
+            fig = plotting.draw_figure(config, data_pool)
+            try:
+                for output in get_output_paths(task, out_dir, formats, root):
+                    output.parent.mkdir(parents=True, exist_ok=True)
+                    fig.savefig(output, dpi=dpi)
+                    result['outputs'].append(str(output))
+            finally:
+                plt.close(fig)
+        except Exception as e:
+            result['error'] = f'{type(e).__name__}: {e}'
+        result['seconds'] = time.perf_counter() - start
+        results.append(result)
+    return results
+
+
+def print_summary(results: Sequence[RenderResult], elapsed: float):
+    for result in results:
+        status = 'ok' if result['error'] is None else 'FAILED'
+        print(f"{result['seconds']:8.3f} s  {status:6s}  {result['config_path']}")
+        if result['error'] is not None:
+            print(f"          {result['error']}")
+    failed = sum(result['error'] is not None for result in results)
+    print(f'{len(results)} figures, {failed} failed, {elapsed:.2f} s total')
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('configs', nargs='+', help='config files or glob patterns')
+    parser.add_argument('--format', nargs='+', choices=FORMATS, default=['png'])
+    parser.add_argument('--out-dir', default=None)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--dpi', type=float, default=None)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    tasks: List[RenderTask] = []
+    results: List[RenderResult] = []
+    for config_path in expand_patterns(args.configs):
+        try:
+            tasks.append(read_task(config_path))
+        except Exception as e:
+            results.append({
+                'config_path': str(config_path),
+                'outputs': [],
+                'seconds': 0.0,
+                'error': f'{type(e).__name__}: {e}'
+            })
+
+    groups = group_tasks(tasks, args.workers)
+    root = get_config_root(tasks)
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(
+                render_group, group, args.out_dir, args.format, args.dpi, root
+            )
+            for group in groups
+        ]
+        for future in futures:
+            results.extend(future.result())
+
+    print_summary(results, time.perf_counter() - start)
+    return 1 if any(result['error'] is not None for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,334 @@
+'''
+Project bundles: a configuration and its data pool saved in one file, so a
+project reopens without parsing any text.
+
+Layout:
+
+    MAGIC | header size (uint64, little-endian) | JSON header | column arrays
+
+Each column is stored as one raw array. Arrays start at multiples of
+ALIGNMENT bytes after the header, so opening a bundle memory-maps the file
+once and hands out zero-copy views of it, like readers.NpyReader does.
+String columns are stored as categorical codes, and their categories are
+kept in the header.
+
+The header records the size, mtime and SHA-256 of every source file at the
+time of saving. `Bundle.changed_sources` compares the stat first and hashes
+a source again only when its size or mtime differs. Saving again keeps the
+records of the opened bundle for sources that are missing or unchanged, so
+a bundle whose CSV files were moved can still be saved. Datasets read out of
+core (see chunked) are not copied into the bundle; they are read from their
+source again when opened.
+'''
+import hashlib
+import json
+import os
+import queue
+import struct
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Mapping, Optional, Tuple, TypedDict, Union
+
+import numpy as np
+import pandas as pd
+
+import data_loading
+import readers
+from data_pool import DataPool, TabName
+
+
+MAGIC = b'CSVBNDL\x01'
+VERSION = 1
+ALIGNMENT = 64
+EXTENSION = '.csvb'
+HASH_BLOCK_SIZE = 1024 * 1024
+SIZE_FORMAT = '<Q'
+
+PathLike = Union[str, Path]
+
+
+class Source(TypedDict):
+    path: str
+    size: int  # -1 when the file was missing at the first save
+    mtime_ns: int
+    sha256: str
+
+
+class ArrayInfo(TypedDict):
+    name: str
+    dtype: str
+    offset: int  # relative to the first array
+    categories: Optional[List[str]]  # only for categorical codes
+
+
+class Dataset(TypedDict):
+    source: Source
+    rows: int
+    columns: List[str]
+    arrays: Optional[List[ArrayInfo]]  # None when not bundled
+
+
+class Header(TypedDict):
+    version: int
+    config: Dict
+    datasets: Dict[TabName, Dataset]
+
+
+class Error(Exception):
+    '''Base class for exceptions in this module.'''
+    pass
+
+
+class BundleFormatError(Error):
+    '''Exception raised when a file is not a readable bundle.'''
+
+    def __init__(self, path: PathLike, reason: str):
+        self.message = f'{path}: {reason}'
+        super().__init__(self.message)
+
+
+def align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def hash_file(path: PathLike) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(HASH_BLOCK_SIZE)
+            if not data:
+                break
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def describe_source(path: PathLike, previous: Optional[Source] = None) -> Source:
+    '''
+    Stat and hash `path`. The `previous` record is returned as it is when
+    the file is missing or its size and mtime did not change.
+    '''
+    try:
+        stat = os.stat(path)
+    except OSError:
+        if previous is not None:
+            return previous
+        return {'path': str(path), 'size': -1, 'mtime_ns': 0, 'sha256': ''}
+    if previous is not None and previous['path'] == str(path) \
+            and (previous['size'], previous['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+        return previous
+    return {
+        'path': str(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': hash_file(path)
+    }
+
+
+def source_changed(source: Source) -> bool:
+    try:
+        stat = os.stat(source['path'])
+    except OSError:
+        return True
+    if (stat.st_size, stat.st_mtime_ns) == (source['size'], source['mtime_ns']):
+        return False
+    if stat.st_size != source['size']:
+        return True
+    return hash_file(source['path']) != source['sha256']
+
+
+def to_array(series: pd.Series) -> Tuple[np.ndarray, Optional[List[str]]]:
+    '''Raw values of a column, or codes and categories for strings.'''
+    if series.dtype.kind in 'biufcmM' and not pd.api.types.is_extension_array_dtype(series):
+        return np.ascontiguousarray(series.to_numpy()), None
+    if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+        return series.to_numpy(dtype=np.float64, na_value=np.nan), None
+    categorical = series
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        categorical = series.astype(str).astype('category')
+    categories = [str(category) for category in categorical.cat.categories]
+    return np.ascontiguousarray(categorical.cat.codes.to_numpy()), categories
+
+
+def write_bundle(
+        path: PathLike, config: Dict, data_pool: DataPool,
+        sources: Optional[Mapping[TabName, Source]] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None):
+    '''
+    Save `config` and every dataset of `data_pool`. Datasets not loaded yet
+    are read first. `sources` are the records of the bundle the data pool
+    was opened from (see describe_source). `on_progress` is called with the
+    number of datasets done and their total. The file is written next to
+    `path` and then renamed, so an interrupted save keeps any previous
+    bundle.
+    '''
+    sources = sources or {}
+    datasets: Dict[TabName, Dataset] = {}
+    arrays: List[np.ndarray] = []
+    offset = 0
+    for done, tabname in enumerate(data_pool):
+        df = data_pool[tabname]
+        dataset: Dataset = {
+            'source': describe_source(data_pool.path(tabname), sources.get(tabname)),
+            'rows': len(df),
+            'columns': data_pool.columns(tabname),
+            'arrays': None
+        }
+        if data_loading.get_out_of_core(df) is None:
+            dataset['arrays'] = []
+            for column in df.columns:
+                values, categories = to_array(df[column])
+                dataset['arrays'].append({
+                    'name': str(column),
+                    'dtype': values.dtype.str,
+                    'offset': offset,
+                    'categories': categories
+                })
+                arrays.append(values)
+                offset = align(offset + values.nbytes)
+        else:
+            dataset['rows'] = data_pool.approx_rows(tabname)
+        datasets[tabname] = dataset
+        if on_progress is not None:
+            on_progress(done + 1, len(data_pool))
+
+    header: Header = {'version': VERSION, 'config': config, 'datasets': datasets}
+    encoded = json.dumps(header).encode('utf-8')
+    temporary = Path(f'{path}.tmp')
+    try:
+        with open(temporary, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack(SIZE_FORMAT, len(encoded)))
+            f.write(encoded)
+            start = align(f.tell())
+            for values, info in zip(arrays, iterate_arrays(datasets)):
+                f.write(b'\0' * (start + info['offset'] - f.tell()))
+                values.tofile(f)
+        os.replace(temporary, path)
+    except BaseException:
+        temporary.unlink(missing_ok=True)
+        raise
+
+
+def iterate_arrays(datasets: Dict[TabName, Dataset]):
+    for dataset in datasets.values():
+        yield from dataset['arrays'] or []
+
+
+def is_bundle(path: PathLike) -> bool:
+    return readers.read_magic(path).startswith(MAGIC)
+
+
+class Bundle:
+    '''An opened bundle. Its arrays stay mapped while the frames are used.'''
+
+    def __init__(self, path: PathLike):
+        self.path = str(path)
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise BundleFormatError(path, 'not a bundle')
+            size_field = f.read(struct.calcsize(SIZE_FORMAT))
+            if len(size_field) != struct.calcsize(SIZE_FORMAT):
+                raise BundleFormatError(path, 'truncated header')
+            encoded = f.read(struct.unpack(SIZE_FORMAT, size_field)[0])
+            self.start = align(f.tell())
+        try:
+            self.header: Header = json.loads(encoded.decode('utf-8'))
+        except ValueError:
+            raise BundleFormatError(path, 'corrupt header')
+        if self.header.get('version', 0) > VERSION:
+            raise BundleFormatError(path, 'saved by a newer version')
+        self.mapped: Optional[np.memmap] = None
+
+    @property
+    def config(self) -> Dict:
+        return self.header['config']
+
+    @property
+    def datasets(self) -> Dict[TabName, Dataset]:
+        return self.header['datasets']
+
+    def get_mapped(self) -> np.memmap:
+        if self.mapped is None:
+            self.mapped = np.memmap(self.path, dtype=np.uint8, mode='r')
+        return self.mapped
+
+    def frame(self, tabname: TabName) -> Optional[pd.DataFrame]:
+        '''Zero-copy frame of a bundled dataset, or None if not bundled.'''
+        dataset = self.datasets[tabname]
+        if dataset['arrays'] is None:
+            return None
+        mapped = self.get_mapped()
+        views = {}
+        for info in dataset['arrays']:
+            dtype = np.dtype(info['dtype'])
+            start = self.start + info['offset']
+            end = start + dtype.itemsize * dataset['rows']
+            if end > len(mapped):
+                raise BundleFormatError(self.path, f'column "{info["name"]}" is truncated')
+            values = mapped[start:end].view(dtype)
+            if info['categories'] is not None:
+                values = pd.Categorical.from_codes(values, info['categories'])
+            views[info['name']] = values
+        return readers.frame_from_views(views, self.path)
+
+    def changed_sources(self) -> List[TabName]:
+        return [
+            tabname for tabname, dataset in self.datasets.items()
+            if source_changed(dataset['source'])
+        ]
+
+    @property
+    def sources(self) -> Dict[TabName, Source]:
+        return {tabname: dataset['source'] for tabname, dataset in self.datasets.items()}
+
+    def get_data_pool(
+            self, use_cache: bool = True, compact: bool = True,
+            memory_budget: Optional[int] = None) -> DataPool:
+        '''
+        Data pool holding the bundled frames. Datasets that were not bundled
+        are read from their source when first asked for.
+        '''
+        schemas = {
+            tabname: {
+                'path': dataset['source']['path'],
+                'columns': list(dataset['columns']),
+                'approx_rows': dataset['rows']
+            }
+            for tabname, dataset in self.datasets.items()
+        }
+        data_pool = DataPool(schemas, use_cache, compact, memory_budget)
+        for tabname in self.datasets:
+            frame = self.frame(tabname)
+            if frame is not None:
+                data_pool.store_frame(tabname, frame)
+        data_pool.enforce_budget()
+        return data_pool
+
+
+class BundleWriter(threading.Thread):
+    '''
+    Run `write_bundle` off the GUI thread. Messages are posted to
+    `messages` like data_loading.ImportWorker does: ('progress', (done,
+    total)), then ('done', path) or ('failed', error).
+    '''
+
+    def __init__(
+            self, path: PathLike, config: Dict, data_pool: DataPool,
+            sources: Optional[Mapping[TabName, Source]] = None):
+        super().__init__(daemon=True)
+        self.path = path
+        self.config = config
+        self.data_pool = data_pool
+        self.sources = sources
+        self.messages: queue.Queue = queue.Queue()
+
+    def run(self):
+        def on_progress(done: int, total: int):
+            self.messages.put(('progress', (done, total)))
+
+        try:
+            write_bundle(self.path, self.config, self.data_pool, self.sources, on_progress)
+        except Exception as e:
+            self.messages.put(('failed', f'{self.path}: {e}'))
+        else:
+            self.messages.put(('done', self.path))
@@ -0,0 +1,364 @@
+'''
+Persistent index of the data files in a directory.
+
+The catalog is a SQLite database stored next to the data (CATALOG_NAME), or
+under FALLBACK_DIR when the directory is read-only. For every file it keeps
+the size, mtime, sniffed dialect, column names and row count, so files can
+be filtered by column without opening them again. Rows are counted by
+scanning the memory-mapped file for newlines, without parsing it, so the
+count is approximate: blank lines and quoted fields spanning several lines
+add to it.
+
+`Catalog.refresh` lists the directory, stats every file and only re-indexes
+files whose size or mtime changed. Entries of deleted files are dropped.
+Paths are stored relative to the directory, so a share mounted at another
+location reuses the same catalog.
+
+SQLite locking is unreliable on some network file systems, so the catalog
+never uses WAL and keeps write transactions short.
+'''
+import hashlib
+import json
+import mmap
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from stat import S_ISREG
+from typing import (
+    Callable, Dict, List, Optional, Sequence, Tuple, TypedDict, Union
+)
+
+import data_loading
+import readers
+
+
+CATALOG_NAME = '.csviewer-catalog.sqlite'
+FALLBACK_DIR = Path.home().joinpath('.csviewer', 'catalogs')
+SCHEMA_VERSION = 1
+DEFAULT_PATTERNS = ('*.csv',)
+COUNT_BLOCK_SIZE = 16 * 1024 * 1024
+LOCK_TIMEOUT = 30.0  # seconds to wait for another writer
+
+PathLike = Union[str, Path]
+
+
+class Entry(TypedDict):
+    path: str  # absolute
+    size: int
+    mtime_ns: int
+    delimiter: Optional[str]  # None for binary formats
+    has_header: bool
+    columns: List[str]
+    rows: int  # newline count, see the module docstring
+    error: Optional[str]  # why the file could not be indexed
+
+
+class RefreshSummary(TypedDict):
+    paths: List[str]  # every listed file, in listing order
+    indexed: int
+    removed: int
+    failed: int
+
+
+def get_catalog_path(directory: PathLike) -> Path:
+    directory = Path(directory).resolve()
+    if os.access(directory, os.W_OK):
+        return directory.joinpath(CATALOG_NAME)
+    digest = hashlib.sha1(str(directory).encode('utf-8')).hexdigest()
+    return FALLBACK_DIR.joinpath(f'{digest}.sqlite')
+
+
+def count_lines(path: PathLike) -> int:
+    '''Number of lines, counting a last line without a newline.'''
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            lines = sum(
+                mapped[start:start + COUNT_BLOCK_SIZE].count(b'\n')
+                for start in range(0, size, COUNT_BLOCK_SIZE)
+            )
+            if mapped[size - 1] != ord('\n'):
+                lines += 1
+    return lines
+
+
+def count_stream_lines(path: PathLike, codec: readers.Codec) -> int:
+    lines, last = 0, b'\n'
+    with codec.open(path) as f:
+        while True:
+            data = f.read(COUNT_BLOCK_SIZE)
+            if not data:
+                break
+            lines += data.count(b'\n')
+            last = data[-1:]
+    return lines if last == b'\n' else lines + 1
+
+
+def index_file(path: PathLike) -> Entry:
+    stat = os.stat(path)
+    entry: Entry = {
+        'path': str(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'delimiter': None,
+        'has_header': False,
+        'columns': [],
+        'rows': 0,
+        'error': None
+    }
+    reader, codec = readers.identify(path)
+    schema = data_loading.scan_schema(path)
+    entry['columns'] = schema['columns']
+    if reader is not None:
+        entry['rows'] = schema['approx_rows']
+        return entry
+
+    dialect = data_loading.sniff_dialect(path)
+    lines = count_lines(path) if codec is None else count_stream_lines(path, codec)
+    entry['delimiter'] = dialect['delimiter']
+    entry['has_header'] = dialect['has_header']
+    entry['rows'] = max(lines - int(dialect['has_header']), 0)
+    return entry
+
+
+def stat_file(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    if not S_ISREG(stat.st_mode):
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class Catalog:
+    def __init__(self, directory: PathLike, catalog_path: PathLike = None):
+        self.directory = Path(directory).resolve()
+        self.catalog_path = Path(catalog_path or get_catalog_path(directory))
+        self.catalog_path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.catalog_path, timeout=LOCK_TIMEOUT)
+        self.create_tables()
+
+    def __enter__(self) -> 'Catalog':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def create_tables(self):
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        with self.connection:
+            if version != SCHEMA_VERSION:
+                self.connection.execute('DROP TABLE IF EXISTS files')
+                self.connection.execute('DROP TABLE IF EXISTS file_columns')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS files ('
+                'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, '
+                'delimiter TEXT, has_header INTEGER, columns TEXT, '
+                'rows INTEGER, error TEXT)'
+            )
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS file_columns ('
+                'name TEXT, path TEXT, PRIMARY KEY (name, path)) WITHOUT ROWID'
+            )
+            self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def relative(self, path: PathLike) -> str:
+        path = Path(path)
+        if not path.is_absolute():
+            path = self.directory.joinpath(path)
+        return path.relative_to(self.directory).as_posix()
+
+    def absolute(self, relative: str) -> str:
+        return str(self.directory.joinpath(relative))
+
+    def to_entry(self, row: tuple) -> Entry:
+        path, size, mtime_ns, delimiter, has_header, columns, rows, error = row
+        return {
+            'path': self.absolute(path),
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'delimiter': delimiter,
+            'has_header': bool(has_header),
+            'columns': json.loads(columns),
+            'rows': rows,
+            'error': error
+        }
+
+    def get(self, path: PathLike) -> Optional[Entry]:
+        row = self.connection.execute(
+            'SELECT * FROM files WHERE path = ?', (self.relative(path),)
+        ).fetchone()
+        return None if row is None else self.to_entry(row)
+
+    def entries(self) -> List[Entry]:
+        rows = self.connection.execute('SELECT * FROM files ORDER BY path')
+        return [self.to_entry(row) for row in rows]
+
+    def list_files(self, patterns: Sequence[str]) -> List[Path]:
+        paths = {}
+        for pattern in patterns:
+            for path in self.directory.glob(pattern):
+                if path.name != CATALOG_NAME:
+                    paths.setdefault(path, None)
+        return list(paths)
+
+    def refresh(
+            self, patterns: Sequence[str] = DEFAULT_PATTERNS,
+            max_workers: Optional[int] = None,
+            on_progress: Optional[Callable[[data_loading.FileProgress], None]] = None,
+            cancel_event: Optional[threading.Event] = None) -> RefreshSummary:
+        '''
+        Bring the entries of the files matching `patterns` up to date.
+        Only new files and files whose size or mtime changed are read.
+        '''
+        paths = self.list_files(patterns)
+        max_workers = max_workers or data_loading.MAX_WORKERS
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            stats = list(executor.map(stat_file, paths))
+        known: Dict[str, Tuple[int, int]] = {
+            path: (size, mtime_ns) for path, size, mtime_ns in
+            self.connection.execute('SELECT path, size, mtime_ns FROM files')
+        }
+
+        listed = set()
+        changed: Dict[str, Path] = {}
+        for path, stat in zip(paths, stats):
+            if stat is None:
+                continue
+            relative = self.relative(path)
+            listed.add(relative)
+            if known.get(relative) != stat:
+                changed[relative] = path
+
+        results, errors = data_loading.map_files(
+            index_file, changed, max_workers,
+            on_progress=on_progress, cancel_event=cancel_event
+        )
+        removed = [
+            relative for relative in known
+            if relative not in listed and not Path(self.absolute(relative)).exists()
+        ]
+        with self.connection:
+            for relative, entry in results.items():
+                self.store(relative, entry)
+            for relative, error in errors.items():
+                self.store_error(relative, changed[relative], error)
+            for relative in removed:
+                self.delete(relative)
+        return {
+            'paths': [str(path) for path, stat in zip(paths, stats) if stat is not None],
+            'indexed': len(results),
+            'removed': len(removed),
+            'failed': len(errors)
+        }
+
+    def store(self, relative: str, entry: Entry):
+        self.delete(relative)
+        self.connection.execute(
+            'INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                relative, entry['size'], entry['mtime_ns'], entry['delimiter'],
+                int(entry['has_header']), json.dumps(entry['columns']),
+                entry['rows'], entry['error']
+            )
+        )
+        self.connection.executemany(
+            'INSERT OR IGNORE INTO file_columns VALUES (?, ?)',
+            [(column, relative) for column in entry['columns']]
+        )
+
+    def store_error(self, relative: str, path: Path, error: str):
+        stat = stat_file(path) or (0, 0)
+        self.store(relative, {
+            'path': str(path),
+            'size': stat[0],
+            'mtime_ns': stat[1],
+            'delimiter': None,
+            'has_header': False,
+            'columns': [],
+            'rows': 0,
+            'error': error
+        })
+
+    def delete(self, relative: str):
+        self.connection.execute('DELETE FROM files WHERE path = ?', (relative,))
+        self.connection.execute('DELETE FROM file_columns WHERE path = ?', (relative,))
+
+    def find(
+            self, columns: Sequence[str],
+            paths: Sequence[PathLike] = None) -> List[str]:
+        '''
+        Files holding every one of `columns`. The result keeps the order of
+        `paths` when given, and is sorted by path otherwise.
+        '''
+        columns = list(dict.fromkeys(columns))
+        if columns:
+            placeholders = ', '.join('?' * len(columns))
+            rows = self.connection.execute(
+                f'SELECT path FROM file_columns WHERE name IN ({placeholders}) '
+                'GROUP BY path HAVING COUNT(*) = ?',
+                (*columns, len(columns))
+            )
+        else:
+            rows = self.connection.execute('SELECT path FROM files WHERE error IS NULL')
+        found = {relative for relative, in rows}
+        if paths is None:
+            return [self.absolute(relative) for relative in sorted(found)]
+        return [str(path) for path in paths if self.relative(path) in found]
+
+
+def find_files(
+        directory: PathLike, columns: Sequence[str],
+        patterns: Sequence[str] = DEFAULT_PATTERNS,
+        max_workers: Optional[int] = None,
+        on_progress: Optional[Callable[[data_loading.FileProgress], None]] = None,
+        cancel_event: Optional[threading.Event] = None) -> List[str]:
+    '''Refresh the catalog of `directory` and list the files having `columns`.'''
+    with Catalog(directory) as catalog:
+        summary = catalog.refresh(patterns, max_workers, on_progress, cancel_event)
+        return catalog.find(columns, summary['paths'])
+
+
+class CatalogWorker(threading.Thread):
+    '''
+    Run `find_files` off the GUI thread. Messages are posted to `messages`
+    like data_loading.ImportWorker does.
+    '''
+
+    def __init__(
+            self, directory: PathLike, columns: Sequence[str],
+            patterns: Sequence[str] = DEFAULT_PATTERNS):
+        super().__init__(daemon=True)
+        self.directory = directory
+        self.columns = columns
+        self.patterns = patterns
+        self.messages: queue.Queue = queue.Queue()
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        def on_progress(progress: data_loading.FileProgress):
+            self.messages.put(('progress', progress))
+
+        try:
+            result = find_files(
+                self.directory, self.columns, self.patterns,
+                on_progress=on_progress, cancel_event=self.cancel_event
+            )
+        except data_loading.LoadCancelledError:
+            self.messages.put(('cancelled', None))
+        except Exception as e:
+            self.messages.put(('failed', str(e)))
+        else:
+            self.messages.put(('done', result))
+
+    def cancel(self):
+        self.cancel_event.set()
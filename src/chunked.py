@@ -0,0 +1,202 @@
+'''
+Out-of-core access to delimited text files larger than memory.
+
+A first pass streams the file in raw blocks of BLOCK_SIZE bytes cut at line
+boundaries and parses only the selected columns. Nothing but two small
+structures is kept:
+
+* a block index: the byte offset, first row and per-column min/max of
+  every block, so later reads can seek straight to the blocks that cover
+  a value range;
+* a summary: min/max/mean of every column over buckets of a fixed number
+  of rows, enough to draw an accurate overview of the whole record.
+
+All selected columns are read as float64; unparsable fields become NaN.
+'''
+import io
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+BLOCK_SIZE = 4 * 1024 * 1024
+SUMMARY_BUCKETS = 100_000
+SOURCE_ATTR = 'out_of_core'
+
+
+class Error(Exception):
+    '''Base class for exceptions in this module.'''
+    pass
+
+
+class ScanCancelledError(Error):
+    '''Exception raised when a scan was cancelled.'''
+    message = 'Scan cancelled.'
+
+
+def reduce_buckets(
+        values: np.ndarray,
+        bucket_rows: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    buckets = values.reshape(-1, bucket_rows, values.shape[1])
+    counts = np.isfinite(buckets).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.nansum(buckets, axis=1) / counts
+    return np.fmin.reduce(buckets, axis=1), np.fmax.reduce(buckets, axis=1), means
+
+
+class ChunkedFile:
+    '''
+    Block index and bucket summary of the `columns` of a delimited file.
+    `positions` are the field positions of `columns`, and `data_offset` is
+    the byte offset of the first data line (after any header).
+    '''
+
+    def __init__(
+            self, path: str, delimiter: str, data_offset: int,
+            columns: Sequence[str], positions: Sequence[int],
+            approx_rows: int):
+        self.path = path
+        self.delimiter = delimiter
+        self.data_offset = data_offset
+        self.columns = list(columns)
+        self.positions = list(positions)
+        self.bucket_rows = max(approx_rows // SUMMARY_BUCKETS, 1)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.first_rows = np.zeros(1, dtype=np.int64)
+        self.block_mins = np.empty((0, len(columns)))
+        self.block_maxs = np.empty((0, len(columns)))
+        self.summary: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return int(self.first_rows[-1])
+
+    def parse(self, data: bytes) -> np.ndarray:
+        try:
+            df = pd.read_csv(
+                io.BytesIO(data), sep=self.delimiter, header=None,
+                usecols=self.positions
+            )
+        except pd.errors.EmptyDataError:
+            return np.empty((0, len(self.columns)))
+        df = df.apply(pd.to_numeric, errors='coerce')
+        return df.to_numpy(dtype=np.float64)
+
+    def iter_blocks(self, cancel_event: Optional[threading.Event] = None):
+        with open(self.path, 'rb') as f:
+            f.seek(self.data_offset)
+            offset = self.data_offset
+            carry = b''
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ScanCancelledError
+                data = f.read(BLOCK_SIZE)
+                if not data:
+                    if carry:
+                        yield offset, carry
+                    return
+                data = carry + data
+                end = data.rfind(b'\n') + 1
+                if end == 0:
+                    carry = data  # a line longer than a block
+                    continue
+                yield offset, data[:end]
+                carry = data[end:]
+                offset += end
+
+    def scan(self, cancel_event: Optional[threading.Event] = None):
+        offsets: List[int] = []
+        first_rows: List[int] = []
+        block_mins: List[np.ndarray] = []
+        block_maxs: List[np.ndarray] = []
+        summaries: Dict[str, List[np.ndarray]] = {'min': [], 'max': [], 'mean': []}
+        remainder = np.empty((0, len(self.columns)))
+        end, row = self.data_offset, 0
+
+        for offset, data in self.iter_blocks(cancel_event):
+            values = self.parse(data)
+            offsets.append(offset)
+            first_rows.append(row)
+            if len(values):
+                block_mins.append(np.fmin.reduce(values, axis=0))
+                block_maxs.append(np.fmax.reduce(values, axis=0))
+            else:
+                block_mins.append(np.full(len(self.columns), np.nan))
+                block_maxs.append(np.full(len(self.columns), np.nan))
+            end, row = offset + len(data), row + len(values)
+
+            values = np.concatenate([remainder, values])
+            full = len(values) - len(values) % self.bucket_rows
+            if full:
+                results = reduce_buckets(values[:full], self.bucket_rows)
+                for parts, result in zip(summaries.values(), results):
+                    parts.append(result)
+            remainder = values[full:]
+        if len(remainder):
+            results = reduce_buckets(remainder, len(remainder))
+            for parts, result in zip(summaries.values(), results):
+                parts.append(result)
+
+        self.offsets = np.array(offsets + [end], dtype=np.int64)
+        self.first_rows = np.array(first_rows + [row], dtype=np.int64)
+        self.block_mins = np.array(block_mins).reshape(-1, len(self.columns))
+        self.block_maxs = np.array(block_maxs).reshape(-1, len(self.columns))
+        self.summary = {
+            name: np.concatenate(parts) if parts else np.empty((0, len(self.columns)))
+            for name, parts in summaries.items()
+        }
+
+    def overview(self, columns: Sequence[str] = None) -> pd.DataFrame:
+        '''
+        Two rows per bucket, holding the minimum and then the maximum of
+        every column. For a sorted x column this draws the min/max envelope
+        of each y column.
+        '''
+        columns = self.columns if columns is None else list(columns)
+        positions = [self.columns.index(column) for column in columns]
+        mins = self.summary['min'][:, positions]
+        maxs = self.summary['max'][:, positions]
+        values = np.empty((2 * len(mins), len(columns)))
+        values[0::2] = mins
+        values[1::2] = maxs
+        df = pd.DataFrame(values, columns=columns)
+        df.attrs[SOURCE_ATTR] = self.path
+        return df
+
+    def find_blocks(self, column: str, low: float, high: float) -> np.ndarray:
+        position = self.columns.index(column)
+        overlap = (self.block_maxs[:, position] >= low) \
+            & (self.block_mins[:, position] <= high)
+        return np.flatnonzero(overlap)
+
+    def count_rows(self, column: str, low: float, high: float) -> int:
+        blocks = self.find_blocks(column, low, high)
+        return int(np.sum(self.first_rows[blocks + 1] - self.first_rows[blocks]))
+
+    def read_block_range(self, first: int, last: int) -> np.ndarray:
+        start, end = self.offsets[first], self.offsets[last + 1]
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        return self.parse(data)
+
+    def read_range(
+            self, column: str, low: float, high: float,
+            columns: Sequence[str] = None) -> pd.DataFrame:
+        '''
+        Exact rows whose `column` lies within [low, high], read by seeking
+        to the indexed blocks that can hold them. Consecutive blocks are
+        read in one go.
+        '''
+        columns = self.columns if columns is None else list(columns)
+        blocks = self.find_blocks(column, low, high)
+        parts = []
+        if len(blocks):
+            breaks = np.flatnonzero(np.diff(blocks) > 1) + 1
+            for run in np.split(blocks, breaks):
+                parts.append(self.read_block_range(run[0], run[-1]))
+        values = np.concatenate(parts) if parts else np.empty((0, len(self.columns)))
+        df = pd.DataFrame(values, columns=self.columns)
+        selected = df[column].between(low, high)
+        return df.loc[selected, columns].reset_index(drop=True)
@@ -0,0 +1,268 @@
+'''
+On-disk columnar cache of parsed CSV files.
+
+Each entry is a directory holding one `.npy` file per column and a
+`meta.json` describing column names. String columns are stored as
+categorical codes (-1 for missing values), with their categories and dtype
+in `meta.json`; columns mixing strings with other values are not cached.
+Entries are keyed by the absolute path, size and mtime of the source file,
+so an edited file simply misses.
+Reads of some columns only store those columns; later reads of other
+columns add theirs to the same entry, and the entry is marked complete
+once every column of the file was stored.
+The modification time of `meta.json` is touched on every hit and used for
+LRU eviction once the cache grows beyond its size cap.
+
+Usage:
+    python csv_cache.py info
+    python csv_cache.py clear
+'''
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, TypedDict, Union
+
+import numpy as np
+import pandas as pd
+
+
+CACHE_DIR = Path.home().joinpath('.csviewer', 'cache')
+SIZE_CAP = 2 * 1024 ** 3
+META_NAME = 'meta.json'
+FORMAT_VERSION = 2  # part of the key, so entries of older layouts miss
+
+PathLike = Union[str, Path]
+
+
+class StringInfo(TypedDict):
+    categories: List[str]
+    dtype: str
+
+
+class EntryInfo(TypedDict):
+    key: str
+    source: str
+    size: int
+    last_used: float
+
+
+class CacheInfo(TypedDict):
+    directory: str
+    size: int
+    size_cap: int
+    entries: List[EntryInfo]
+
+
+def get_key(path: PathLike) -> str:
+    stat = os.stat(path)
+    source = f'{FORMAT_VERSION}|{Path(path).resolve()}|{stat.st_size}|{stat.st_mtime_ns}'
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+def get_entry_dir(key: str, cache_dir: Path = None) -> Path:
+    return (cache_dir or CACHE_DIR).joinpath(key)
+
+
+def get_dir_size(directory: Path) -> int:
+    return sum(file.stat().st_size for file in directory.iterdir())
+
+
+def read_meta(entry_dir: Path) -> dict:
+    with open(entry_dir.joinpath(META_NAME), 'r') as f:
+        return json.load(f)
+
+
+def load(
+        path: PathLike, cache_dir: Path = None,
+        usecols: Sequence[str] = None, key: str = None) -> Optional[pd.DataFrame]:
+    '''
+    The cached frame of `path`, or only its `usecols`. None when the entry
+    is missing, stale or lacks some of the requested columns.
+    '''
+    try:
+        entry_dir = get_entry_dir(key or get_key(path), cache_dir)
+        meta = read_meta(entry_dir)
+        if usecols is None:
+            if not meta.get('complete', True):
+                return None
+            columns = meta['columns']
+        else:
+            columns = list(dict.fromkeys(usecols))
+        positions = {column: idx for idx, column in enumerate(meta['columns'])}
+        if not all(column in positions for column in columns):
+            return None
+        strings = meta.get('strings', {})
+        data = {
+            column: from_array(
+                np.load(entry_dir.joinpath(f'{positions[column]}.npy'), allow_pickle=False),
+                strings.get(column)
+            )
+            for column in columns
+        }
+    except (OSError, ValueError, KeyError):
+        return None
+    os.utime(entry_dir.joinpath(META_NAME))
+    return pd.DataFrame(data, columns=columns)
+
+
+def to_array(series: pd.Series) -> Optional[Tuple[np.ndarray, Optional[StringInfo]]]:
+    '''
+    Raw values of a column, or codes and categories for strings. None for
+    columns that would not load back as parsed, e.g. strings mixed with
+    numbers.
+    '''
+    if series.dtype.kind in 'biufcmM' and not pd.api.types.is_extension_array_dtype(series):
+        return series.to_numpy(), None
+    if pd.api.types.infer_dtype(series, skipna=True) not in ('string', 'empty'):
+        return None
+    categorical = series.astype('category')
+    info: StringInfo = {
+        'categories': [str(category) for category in categorical.cat.categories],
+        'dtype': str(series.dtype)
+    }
+    return categorical.cat.codes.to_numpy(), info
+
+
+def from_array(values: np.ndarray, info: Optional[StringInfo]) -> Union[np.ndarray, pd.Series]:
+    if info is None:
+        return values
+    categorical = pd.Categorical.from_codes(values, info['categories'])
+    return pd.Series(categorical).astype(info['dtype'])
+
+
+def store(
+        path: PathLike, df: pd.DataFrame,
+        cache_dir: Path = None, size_cap: int = None, key: str = None,
+        complete: bool = True):
+    '''
+    Save `df` as the entry of `path`. Pass the `key` taken before `df` was
+    read, so a file modified while being read is not cached as its new
+    version. Without `complete`, `df` holds some columns of the file only
+    and is merged into the columns already cached for it.
+    '''
+    key = key or get_key(path)
+    entry_dir = get_entry_dir(key, cache_dir)
+    tmp_dir = entry_dir.with_name(
+        f'{key}.tmp{os.getpid()}-{threading.get_ident()}'
+    )
+    try:
+        arrays, strings = {}, {}
+        if not complete:
+            arrays, strings, complete = load_arrays(entry_dir)
+        for column in df.columns:
+            stored = to_array(df[column])
+            if stored is None:
+                complete = False
+                continue
+            arrays[str(column)] = stored[0]
+            strings.pop(str(column), None)
+            if stored[1] is not None:
+                strings[str(column)] = stored[1]
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        for idx, values in enumerate(arrays.values()):
+            np.save(tmp_dir.joinpath(f'{idx}.npy'), values)
+        meta = {
+            'source': str(Path(path).resolve()),
+            'columns': list(arrays),
+            'strings': strings,
+            'complete': complete
+        }
+        with open(tmp_dir.joinpath(META_NAME), 'w') as f:
+            json.dump(meta, f)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        tmp_dir.rename(entry_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
+    evict(cache_dir, size_cap)
+
+
+def load_arrays(
+        entry_dir: Path) -> Tuple[Dict[str, np.ndarray], Dict[str, StringInfo], bool]:
+    '''
+    Stored arrays of an existing entry, the info of its string columns and
+    whether it is complete.
+    '''
+    try:
+        meta = read_meta(entry_dir)
+        arrays = {
+            column: np.load(entry_dir.joinpath(f'{idx}.npy'), allow_pickle=False)
+            for idx, column in enumerate(meta['columns'])
+        }
+    except (OSError, ValueError, KeyError):
+        return {}, {}, False
+    return arrays, meta.get('strings', {}), meta.get('complete', True)
+
+
+def get_info(cache_dir: Path = None) -> CacheInfo:
+    cache_dir = cache_dir or CACHE_DIR
+    entries: List[EntryInfo] = []
+    if cache_dir.is_dir():
+        for entry_dir in cache_dir.iterdir():
+            meta_path = entry_dir.joinpath(META_NAME)
+            try:
+                with open(meta_path, 'r') as f:
+                    meta = json.load(f)
+                entries.append({
+                    'key': entry_dir.name,
+                    'source': meta.get('source', ''),
+                    'size': get_dir_size(entry_dir),
+                    'last_used': meta_path.stat().st_mtime
+                })
+            except (OSError, ValueError):
+                continue  # temporary or concurrently evicted entry
+    entries.sort(key=lambda entry: entry['last_used'], reverse=True)
+    return {
+        'directory': str(cache_dir),
+        'size': sum(entry['size'] for entry in entries),
+        'size_cap': SIZE_CAP,
+        'entries': entries
+    }
+
+
+def evict(cache_dir: Path = None, size_cap: int = None):
+    cache_dir = cache_dir or CACHE_DIR
+    size_cap = SIZE_CAP if size_cap is None else size_cap
+    info = get_info(cache_dir)
+    size = info['size']
+    for entry in reversed(info['entries']):
+        if size <= size_cap:
+            break
+        shutil.rmtree(get_entry_dir(entry['key'], cache_dir), ignore_errors=True)
+        size -= entry['size']
+
+
+def clear(cache_dir: Path = None):
+    shutil.rmtree(cache_dir or CACHE_DIR, ignore_errors=True)
+
+
+def format_info(info: CacheInfo) -> str:
+    lines = [
+        f"Cache directory: {info['directory']}",
+        f"Entries: {len(info['entries'])}",
+        f"Size: {info['size'] / 1e6:.1f} MB / {info['size_cap'] / 1e6:.1f} MB",
+    ]
+    for entry in info['entries']:
+        lines.append(f"  {entry['size'] / 1e6:8.1f} MB  {entry['source']}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('command', choices=['info', 'clear'])
+    args = parser.parse_args()
+    if args.command == 'info':
+        print(format_info(get_info()))
+    else:
+        clear()
+        print('Cache cleared.')
+
+
+if __name__ == '__main__':
+    main()
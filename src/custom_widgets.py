@@ -1,8 +1,23 @@
+from __future__ import annotations
+
 import tkinter as tk
 from tkinter import ttk
 from typing import Sequence, Union, Dict
 
-import pandas as pd
+from lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+
+
+def format_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    return df.astype(str)
+
+
+def measure_column_lengths(formatted: pd.DataFrame) -> Sequence[int]:
+    return [
+        int(formatted[column].str.len().max())
+        for column in formatted.columns
+    ]
 
 
 class Treeview(ttk.Treeview):
@@ -25,23 +40,43 @@ class Treeview(ttk.Treeview):
         self.pack(fill='both')
         scrollbar_ver.config(command=self.yview)
         scrollbar_hor.config(command=self.xview)
+        self.scrollbar_ver = scrollbar_ver
+        self.scrollbar_hor = scrollbar_hor
         self['columns'] = columns
         self['show'] = 'headings'
         for column in columns:
             self.heading(column, text=column, anchor=tk.W)
+        self.reset_column_lengths()
 
     def clear_content(self):
-        for item in self.get_children():
-            self.delete(item)
+        self.delete(*self.get_children())
+        self.reset_column_lengths()
+
+    def reset_column_lengths(self):
+        self.column_lengths = {
+            column: len(column) for column in self['columns']
+        }
+
+    def update_column_lengths(self, formatted: pd.DataFrame):
+        if formatted.empty:
+            return
+        lengths = measure_column_lengths(formatted)
+        for column, length in zip(self['columns'], lengths):
+            self.column_lengths[column] = max(
+                self.column_lengths[column], length
+            )
 
     def insert_dataframe(self, df: pd.DataFrame):
-        for idx, row in df.iterrows():
+        formatted = format_dataframe(df)
+        rows = formatted.to_numpy().tolist()
+        for idx, values in zip(df.index, rows):
             self.insert(
                 parent='',
-                index=idx,
-                values=list(row.values),
+                index='end',
+                values=values,
                 tags=str(idx)
             )
+        self.update_column_lengths(formatted)
 
     def get_dataframe(self) -> pd.DataFrame:
         columns = self['columns']
@@ -53,17 +88,8 @@ class Treeview(ttk.Treeview):
         return pd.DataFrame(data)
 
     def adjust_column_width(self):
-        lengths = {
-            column: [len(column), ] for column in self['columns']
-        }
-        for line in self.get_children():
-            columns = self['columns']
-            values = self.item(line)['values']
-            for column, value in zip(columns, values):
-                lengths[column].append(len(str(value)))
-
         for column in self['columns']:
-            width = Treeview.COLUMN_WIDTH_RATIO * max(lengths[column])
+            width = Treeview.COLUMN_WIDTH_RATIO * self.column_lengths[column]
             self.column(
                 column,
                 anchor=tk.W,
@@ -72,6 +98,111 @@ class Treeview(ttk.Treeview):
             )
 
 
+class VirtualTreeview(Treeview):
+    '''
+    Treeview that keeps a DataFrame as backing store and only materializes
+    the rows in the viewport. A fixed set of `height` items is created once
+    and their values are rewritten whenever the view is scrolled.
+    '''
+    WIDTH_SAMPLE_ROWS = 1000
+
+    def __init__(
+            self, frame: Union[tk.Frame, ttk.Frame],
+            columns: Sequence[str], height: int):
+        super().__init__(frame, columns, height)
+        self.dataframe = pd.DataFrame(columns=columns)
+        self.first_row = 0
+        self.config(yscrollcommand='')
+        self.scrollbar_ver.config(command=self.yview_rows)
+        self.bind('<MouseWheel>', self.on_mousewheel)
+        self.bind('<Button-4>', lambda event: self.scroll_rows(-3))
+        self.bind('<Button-5>', lambda event: self.scroll_rows(3))
+
+    def set_dataframe(self, df: pd.DataFrame):
+        self.dataframe = df
+        self.first_row = 0
+        self.reset_column_lengths()
+        sample_num = VirtualTreeview.WIDTH_SAMPLE_ROWS
+        if len(df) > 2 * sample_num:
+            sample = pd.concat([df.head(sample_num), df.tail(sample_num)])
+        else:
+            sample = df
+        self.update_column_lengths(format_dataframe(sample))
+        self.render_rows()
+
+    def extend_dataframe(self, df: pd.DataFrame):
+        '''
+        Swap in a frame that grew at the end. The view stays where it was,
+        or keeps following the last rows when it was already showing them.
+        '''
+        at_end = self.first_row >= self.get_max_first_row()
+        new_rows = df.iloc[len(self.dataframe):]
+        self.dataframe = df
+        sample = new_rows.tail(VirtualTreeview.WIDTH_SAMPLE_ROWS)
+        self.update_column_lengths(format_dataframe(sample))
+        if at_end:
+            self.first_row = self.get_max_first_row()
+        self.render_rows()
+
+    def get_dataframe(self) -> pd.DataFrame:
+        return self.dataframe
+
+    def clear_content(self):
+        super().clear_content()
+        self.dataframe = pd.DataFrame(columns=self['columns'])
+        self.first_row = 0
+        self.scrollbar_ver.set(0, 1)
+
+    def get_visible_row_number(self) -> int:
+        return int(self['height'])
+
+    def get_max_first_row(self) -> int:
+        return max(len(self.dataframe) - self.get_visible_row_number(), 0)
+
+    def render_rows(self):
+        visible_num = self.get_visible_row_number()
+        self.first_row = min(max(self.first_row, 0), self.get_max_first_row())
+        last_row = self.first_row + visible_num
+        rows = self.dataframe.iloc[self.first_row:last_row]
+        values = format_dataframe(rows).to_numpy().tolist()
+        items = self.get_children()
+        for item in items[len(values):]:
+            self.delete(item)
+        for idx, row_values in enumerate(values):
+            if idx < len(items):
+                self.item(items[idx], values=row_values)
+            else:
+                self.insert(parent='', index='end', values=row_values)
+
+        row_num = len(self.dataframe)
+        if row_num == 0:
+            self.scrollbar_ver.set(0, 1)
+        else:
+            self.scrollbar_ver.set(
+                self.first_row / row_num,
+                min(last_row, row_num) / row_num
+            )
+
+    def scroll_rows(self, number: int):
+        self.first_row += number
+        self.render_rows()
+
+    def yview_rows(self, *args):
+        action = args[0]
+        if action == 'moveto':
+            fraction = float(args[1])
+            self.first_row = int(round(fraction * len(self.dataframe)))
+            self.render_rows()
+        elif action == 'scroll':
+            number, what = int(args[1]), args[2]
+            if what == 'pages':
+                number *= self.get_visible_row_number()
+            self.scroll_rows(number)
+
+    def on_mousewheel(self, event: tk.Event):
+        self.scroll_rows(-3 if event.delta > 0 else 3)
+
+
 class Notebook(ttk.Notebook):
     def __init__(self, frame: Union[tk.Frame, ttk.Frame]):
         super().__init__(frame)
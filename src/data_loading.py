@@ -0,0 +1,521 @@
+import csv
+import io
+import os
+import queue
+import threading
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+)
+from pathlib import Path
+from typing import (
+    BinaryIO, Callable, Dict, Hashable, List, Mapping, Optional, Sequence, Tuple,
+    TypedDict, TypeVar, Union
+)
+
+import pandas as pd
+
+import chunked
+import csv_cache
+import readers
+from instrumentation import span
+
+
+SNIFF_SIZE = 64 * 1024
+OUT_OF_CORE_SIZE = 2 * 1024 ** 3  # larger plain files are summarized, not loaded
+PRESCAN_ROWS = 1000
+DELIMITERS = (',', '\t', ';')
+WHITESPACE = r'\s+'
+
+MAX_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+PathLike = Union[str, Path]
+FileKey = Tuple[str, int, int]
+Key = TypeVar('Key', bound=Hashable)
+
+
+class Dialect(TypedDict):
+    delimiter: str
+    has_header: bool
+
+
+Schema = readers.Schema
+
+
+class FileProgress(TypedDict):
+    key: Hashable
+    path: str
+    bytes_read: int
+    rows: int
+    error: Optional[str]
+
+
+class Error(Exception):
+    '''Base class for exceptions in this module.'''
+    pass
+
+
+class LoadCancelledError(Error):
+    '''Exception raised when loading was cancelled by the user.'''
+    message = 'Import cancelled.'
+
+
+_dialect_cache: Dict[FileKey, Dialect] = {}
+_chunked_files: Dict[str, Tuple[FileKey, chunked.ChunkedFile]] = {}
+_chunked_lock = threading.Lock()
+
+
+def get_file_key(path: PathLike) -> FileKey:
+    stat = os.stat(path)
+    return str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns
+
+
+def split_sample(prefix: bytes, complete: bool) -> List[str]:
+    lines = prefix.decode('utf-8', errors='replace').splitlines()
+    if not complete and lines:
+        lines = lines[:-1]  # the last line may be cut by the prefix bound
+    return [line for line in lines if line.strip()]
+
+
+def split_fields(lines: Sequence[str], delimiter: str) -> List[List[str]]:
+    if delimiter == WHITESPACE:
+        return [line.split() for line in lines]
+    return list(csv.reader(lines, delimiter=delimiter))
+
+
+def detect_delimiter(lines: Sequence[str]) -> str:
+    for delimiter in DELIMITERS:
+        field_nums = {len(row) for row in split_fields(lines, delimiter)}
+        if len(field_nums) == 1 and field_nums.pop() > 1:
+            return delimiter
+    field_nums = {len(row) for row in split_fields(lines, WHITESPACE)}
+    if len(field_nums) == 1 and field_nums.pop() > 1:
+        return WHITESPACE
+    return DELIMITERS[0]
+
+
+def is_number(field: str) -> bool:
+    try:
+        float(field)
+    except ValueError:
+        return False
+    return True
+
+
+def detect_header(lines: Sequence[str], delimiter: str) -> bool:
+    rows = split_fields(lines, delimiter)
+    if not rows:
+        return False
+    first, rest = rows[0], rows[1:]
+    if all(is_number(field) for field in first):
+        return False
+    if not rest:
+        return True
+
+    for idx, field in enumerate(first):
+        column = [row[idx] for row in rest if idx < len(row)]
+        if column and not is_number(field) and all(map(is_number, column)):
+            return True
+
+    try:
+        return csv.Sniffer().has_header('\n'.join(lines))
+    except csv.Error:
+        return False
+
+
+def sniff_prefix(prefix: bytes, complete: bool) -> Dialect:
+    lines = split_sample(prefix, complete)
+    delimiter = detect_delimiter(lines)
+    return {
+        'delimiter': delimiter,
+        'has_header': detect_header(lines, delimiter)
+    }
+
+
+def get_dialect(
+        path: PathLike, prefix: bytes, complete: bool = None) -> Dialect:
+    key = get_file_key(path)
+    if key not in _dialect_cache:
+        if complete is None:
+            complete = len(prefix) >= key[1]
+        _dialect_cache[key] = sniff_prefix(prefix, complete)
+    return _dialect_cache[key]
+
+
+def sniff_dialect(path: PathLike) -> Dialect:
+    key = get_file_key(path)
+    if key not in _dialect_cache:
+        codec = readers.identify(path)[1]
+        if codec is not None:
+            with codec.open(path) as f:
+                prefix = f.read(SNIFF_SIZE)
+            complete = len(prefix) < SNIFF_SIZE
+        else:
+            with open(path, 'rb') as f:
+                prefix = f.read(SNIFF_SIZE)
+            complete = len(prefix) >= key[1]
+        _dialect_cache[key] = sniff_prefix(prefix, complete)
+    return _dialect_cache[key]
+
+
+def get_parser_options(dialect: Dialect) -> Dict:
+    return {
+        'sep': dialect['delimiter'],
+        'header': 0 if dialect['has_header'] else None
+    }
+
+
+def name_columns(df: pd.DataFrame, dialect: Dialect) -> pd.DataFrame:
+    if not dialect['has_header']:
+        df.columns = [f'column-{col}' for col in df.columns]
+    return df
+
+
+def prescan(prefix: bytes, complete: bool, dialect: Dialect) -> pd.DataFrame:
+    lines = split_sample(prefix, complete)[:PRESCAN_ROWS + 1]
+    return pd.read_csv(
+        io.StringIO('\n'.join(lines)), **get_parser_options(dialect)
+    )
+
+
+def get_column_names(sample: pd.DataFrame, dialect: Dialect) -> List[str]:
+    if dialect['has_header']:
+        return [str(column) for column in sample.columns]
+    return [f'column-{column}' for column in sample.columns]
+
+
+def get_projection_options(
+        sample: pd.DataFrame, dialect: Dialect,
+        usecols: Sequence[str]) -> Dict:
+    names = get_column_names(sample, dialect)
+    missing = [column for column in usecols if column not in names]
+    if missing:
+        raise ValueError(f'Columns not found: {", ".join(missing)}')
+
+    positions = sorted({names.index(column) for column in usecols})
+    dtype = {
+        sample.columns[pos]: 'float64'
+        for pos in positions if sample.dtypes.iloc[pos].kind == 'f'
+    }
+    return {'usecols': positions, 'dtype': dtype}
+
+
+def parse_text(
+        path: PathLike, stream: BinaryIO, prefix: bytes, complete: bool,
+        usecols: Sequence[str] = None) -> pd.DataFrame:
+    dialect = get_dialect(path, prefix, complete)
+    options = get_parser_options(dialect)
+    if usecols is not None:
+        sample = prescan(prefix, complete, dialect)
+        options.update(get_projection_options(sample, dialect, usecols))
+    df = pd.read_csv(stream, **options)
+    return name_columns(df, dialect)
+
+
+def read_csv(path: PathLike, usecols: Sequence[str] = None) -> pd.DataFrame:
+    '''
+    Read a delimited text file exactly once. The dialect is sniffed from a
+    bounded prefix peeked from the read buffer, and the same buffered handle
+    is then handed to the parser. Compressed files are decoded as a stream
+    by their readers.CODECS entry, and the prefix read for sniffing is
+    replayed to the parser.
+
+    When `usecols` is given, only those columns are parsed. Float columns
+    found by a short prescan of the prefix are passed to the parser as
+    explicit dtypes so it skips type inference for them.
+    '''
+    codec = readers.identify(path)[1]
+    if codec is not None:
+        with codec.open(path) as f:
+            prefix = f.read(SNIFF_SIZE)
+            stream = io.BufferedReader(readers.PrefixedReader(prefix, f))
+            return parse_text(path, stream, prefix, len(prefix) < SNIFF_SIZE, usecols)
+
+    with open(path, 'rb', buffering=SNIFF_SIZE) as f:
+        prefix = f.peek(SNIFF_SIZE)[:SNIFF_SIZE]
+        complete = len(prefix) >= os.fstat(f.fileno()).st_size
+        return parse_text(path, f, prefix, complete, usecols)
+
+
+def open_chunked(
+        path: PathLike, usecols: Sequence[str] = None,
+        cancel_event: Optional[threading.Event] = None) -> chunked.ChunkedFile:
+    '''
+    Return the block index and summary of a file, scanning it once. A file
+    already scanned for a superset of `usecols` is not read again; otherwise
+    it is rescanned for the union of both column sets. Setting
+    `cancel_event` stops the scan with chunked.ScanCancelledError.
+    '''
+    key = get_file_key(path)
+    with open(path, 'rb') as f:
+        prefix = f.read(SNIFF_SIZE)
+    complete = len(prefix) >= key[1]
+    dialect = get_dialect(path, prefix)
+    sample = prescan(prefix, complete, dialect)
+    names = get_column_names(sample, dialect)
+    usecols = names if usecols is None else list(usecols)
+
+    with _chunked_lock:
+        cached_key, chunked_file = _chunked_files.get(key[0], (None, None))
+    if cached_key == key:
+        if all(column in chunked_file.columns for column in usecols):
+            return chunked_file
+        usecols = list(dict.fromkeys(chunked_file.columns + usecols))
+
+    positions = get_projection_options(sample, dialect, usecols)['usecols']
+    data_offset = prefix.find(b'\n') + 1 if dialect['has_header'] else 0
+    chunked_file = chunked.ChunkedFile(
+        str(path), get_parser_options(dialect)['sep'], data_offset,
+        [names[pos] for pos in positions], positions,
+        estimate_row_number(prefix, key[1], complete, dialect)
+    )
+    chunked_file.scan(cancel_event)
+    with _chunked_lock:
+        _chunked_files[key[0]] = (key, chunked_file)
+    return chunked_file
+
+
+def get_out_of_core(df: pd.DataFrame) -> Optional[chunked.ChunkedFile]:
+    '''
+    Return the scanned file behind a frame built by `load_csv` from a
+    summary, or None for frames that hold every row.
+    '''
+    path = df.attrs.get(chunked.SOURCE_ATTR)
+    if path is None:
+        return None
+    with _chunked_lock:
+        return _chunked_files.get(str(Path(path).resolve()), (None, None))[1]
+
+
+def load_csv(
+        path: PathLike, use_cache: bool = True,
+        usecols: Sequence[str] = None,
+        cancel_event: Optional[threading.Event] = None) -> pd.DataFrame:
+    '''
+    Binary formats are read by their registered reader (see readers.py).
+    Plain text files above OUT_OF_CORE_SIZE are never loaded whole: the
+    returned frame is the min/max overview of their `usecols` (see
+    chunked.py) and exact rows are read on demand through `get_out_of_core`.
+    `cancel_event` stops the scan of such a file.
+
+    Compressed files are always loaded whole, whatever their size: the
+    block index of an out-of-core file seeks to byte offsets, which a
+    compressed stream cannot do.
+    '''
+    reader, codec = readers.identify(path)
+    if reader is not None:
+        return reader.read(path, usecols)
+    if codec is None and get_file_size(path) > OUT_OF_CORE_SIZE:
+        return open_chunked(path, usecols, cancel_event).overview(usecols)
+    if not use_cache:
+        return read_csv(path, usecols)
+    try:
+        key = csv_cache.get_key(path)
+    except OSError:
+        return read_csv(path, usecols)
+    df = csv_cache.load(path, usecols=usecols, key=key)
+    if df is not None:
+        return df
+    df = read_csv(path, usecols)
+    csv_cache.store(path, df, key=key, complete=usecols is None)
+    return df
+
+
+def get_file_size(path: PathLike) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def estimate_row_number(
+        prefix: bytes, size: int, complete: bool, dialect: Dialect) -> int:
+    header_num = 1 if dialect['has_header'] else 0
+    if complete:
+        return max(len(split_sample(prefix, complete)) - header_num, 0)
+    consumed = prefix.rfind(b'\n') + 1
+    if consumed == 0:
+        return 0
+    line_num = prefix[:consumed].count(b'\n')
+    return max(round(size * line_num / consumed) - header_num, 0)
+
+
+def scan_schema(path: PathLike) -> Schema:
+    '''
+    Describe a file from its bounded prefix only: column names from the
+    sniffed header and a row count extrapolated from the mean line length.
+    For compressed files the extrapolation uses the compressed size, so
+    the row count is a lower bound.
+    '''
+    reader, codec = readers.identify(path)
+    if reader is not None:
+        return reader.scan_schema(path)
+    if codec is not None:
+        with codec.open(path) as f:
+            prefix = f.read(SNIFF_SIZE)
+        size = get_file_size(path)
+        complete = len(prefix) < SNIFF_SIZE
+    else:
+        with open(path, 'rb') as f:
+            prefix = f.read(SNIFF_SIZE)
+            size = os.fstat(f.fileno()).st_size
+        complete = len(prefix) >= size
+    dialect = get_dialect(path, prefix, complete)
+    sample = prescan(prefix, complete, dialect)
+    return {
+        'path': str(path),
+        'columns': get_column_names(sample, dialect),
+        'approx_rows': estimate_row_number(prefix, size, complete, dialect)
+    }
+
+
+def get_row_number(result) -> int:
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    return result.get('approx_rows', 0)
+
+
+def map_files(
+        function: Callable,
+        paths: Mapping[Key, PathLike],
+        max_workers: Optional[int] = None,
+        use_processes: bool = False,
+        on_progress: Optional[Callable[[FileProgress], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+        arguments: Optional[Mapping[Key, Tuple]] = None
+) -> Tuple[Dict[Key, object], Dict[Key, str]]:
+    '''
+    Call `function(path, *arguments[key])` for every file concurrently. The
+    C parser releases the GIL, so a thread pool is the default; a process
+    pool can be requested for pure-Python parsing paths. Results keep the
+    order of `paths`, and a failing file is reported in the returned errors
+    instead of aborting the others.
+
+    `on_progress` is called once per finished file. Setting `cancel_event`
+    drops the files not started yet and raises LoadCancelledError.
+    '''
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    max_workers = max_workers or min(MAX_WORKERS, max(len(paths), 1))
+    arguments = arguments or {}
+    results: Dict[Key, object] = {}
+    errors: Dict[Key, str] = {}
+    with executor_class(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(function, path, *arguments.get(key, ())): key
+            for key, path in paths.items()
+        }
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            if cancel_event is not None and cancel_event.is_set():
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise LoadCancelledError
+            for future in done:
+                key = futures[future]
+                progress: FileProgress = {
+                    'key': key,
+                    'path': str(paths[key]),
+                    'bytes_read': get_file_size(paths[key]),
+                    'rows': 0,
+                    'error': None
+                }
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    errors[key] = progress['error'] = f'{paths[key]}: {e}'
+                else:
+                    progress['rows'] = get_row_number(results[key])
+                if on_progress is not None:
+                    on_progress(progress)
+
+    results = {key: results[key] for key in paths if key in results}
+    errors = {key: errors[key] for key in paths if key in errors}
+    return results, errors
+
+
+def load_csvs(
+        paths: Mapping[Key, PathLike],
+        max_workers: Optional[int] = None,
+        use_processes: bool = False,
+        on_progress: Optional[Callable[[FileProgress], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+        use_cache: bool = True,
+        usecols: Optional[Mapping[Key, Sequence[str]]] = None
+) -> Tuple[Dict[Key, pd.DataFrame], Dict[Key, str]]:
+    '''
+    Parse many files concurrently with `map_files`. With `use_cache`, parsed
+    files are served from and stored to csv_cache. `usecols` optionally maps
+    keys to the only columns to parse. In a thread pool, `cancel_event`
+    also stops the scans of out-of-core files already running.
+    '''
+    usecols = usecols or {}
+    scan_event = None if use_processes else cancel_event  # events do not pickle
+    arguments = {key: (use_cache, usecols.get(key), scan_event) for key in paths}
+    return map_files(
+        load_csv, paths, max_workers, use_processes,
+        on_progress, cancel_event, arguments
+    )
+
+
+def scan_schemas(
+        paths: Mapping[Key, PathLike],
+        max_workers: Optional[int] = None,
+        use_processes: bool = False,
+        on_progress: Optional[Callable[[FileProgress], None]] = None,
+        cancel_event: Optional[threading.Event] = None
+) -> Tuple[Dict[Key, Schema], Dict[Key, str]]:
+    return map_files(
+        scan_schema, paths, max_workers, use_processes,
+        on_progress, cancel_event
+    )
+
+
+class ImportWorker(threading.Thread):
+    '''
+    Run `load_csvs`, or `scan_schemas` when `lazy`, off the GUI thread.
+    Progress and the final result are posted to `messages` as (kind,
+    payload) tuples, where kind is one of 'progress', 'done', 'cancelled' or
+    'failed', so the GUI can poll the queue from its event loop.
+    '''
+
+    def __init__(
+            self, paths: Mapping[Key, PathLike],
+            max_workers: Optional[int] = None,
+            use_processes: bool = False,
+            use_cache: bool = True,
+            lazy: bool = False):
+        super().__init__(daemon=True)
+        self.paths = paths
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        self.use_cache = use_cache
+        self.lazy = lazy
+        self.total_bytes = sum(get_file_size(path) for path in paths.values())
+        self.messages: queue.Queue = queue.Queue()
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        def on_progress(progress: FileProgress):
+            self.messages.put(('progress', progress))
+
+        try:
+            with span('collect_data_pool') as collect_span:
+                if self.lazy:
+                    result = scan_schemas(
+                        self.paths, self.max_workers, self.use_processes,
+                        on_progress, self.cancel_event
+                    )
+                else:
+                    result = load_csvs(
+                        self.paths, self.max_workers, self.use_processes,
+                        on_progress, self.cancel_event, self.use_cache
+                    )
+                collect_span.rows = sum(map(get_row_number, result[0].values()))
+        except LoadCancelledError:
+            self.messages.put(('cancelled', None))
+        except Exception as e:
+            self.messages.put(('failed', str(e)))
+        else:
+            self.messages.put(('done', result))
+
+    def cancel(self):
+        self.cancel_event.set()
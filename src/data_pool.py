@@ -0,0 +1,295 @@
+import itertools
+import queue
+import threading
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Set
+
+import numpy as np
+import pandas as pd
+
+import data_loading
+import readers
+
+
+TabName = str
+
+# float64 columns become float32 when the round-trip error stays below
+# this fraction of the column's range, so e.g. epoch timestamps whose
+# float32 resolution would merge neighbouring samples stay float64.
+FLOAT32_TOLERANCE = 1e-6
+CATEGORY_RATIO = 0.5  # object columns with fewer unique values are categorical
+
+
+class Error(Exception):
+    '''Base class for exceptions in this module.'''
+    pass
+
+
+class NoSourceError(Error):
+    '''Exception raised when columns must be read for a dataset without a file.'''
+
+    def __init__(self, tabname: TabName, columns: Sequence[str]):
+        self.message = (
+            f'CSV ID {tabname} has no file to read column '
+            + ', '.join(f'"{column}"' for column in columns) + ' from.'
+        )
+        super().__init__(self.message)
+
+
+def compact_float(series: pd.Series) -> pd.Series:
+    values = series.to_numpy()
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return series.astype(np.float32)
+    low, high = finite.min(), finite.max()
+    if max(abs(low), abs(high)) > np.finfo(np.float32).max:
+        return series
+    error = np.abs(finite.astype(np.float32).astype(np.float64) - finite).max()
+    if error > FLOAT32_TOLERANCE * (high - low):
+        return series
+    return series.astype(np.float32)
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Downcast numeric columns to the smallest dtype that keeps their values
+    (see FLOAT32_TOLERANCE) and store repeated strings as categoricals.
+    Memory-mapped frames are returned as they are, since any conversion
+    would copy them into memory.
+    '''
+    if readers.MAPPED_ATTR in df.attrs:
+        return df
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        if series.dtype == np.float64:
+            series = compact_float(series)
+        elif series.dtype.kind == 'i':
+            series = pd.to_numeric(series, downcast='integer')
+        elif series.dtype.kind == 'u':
+            series = pd.to_numeric(series, downcast='unsigned')
+        elif series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+            if series.nunique() < CATEGORY_RATIO * len(series):
+                series = series.astype('category')
+        columns[column] = series
+    compacted = pd.DataFrame(columns, index=df.index)
+    compacted.attrs = df.attrs
+    return compacted
+
+
+def get_memory_usage(df: pd.DataFrame) -> int:
+    if readers.MAPPED_ATTR in df.attrs:
+        return 0  # pages of the mapped file belong to the OS page cache
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class DataPool(Mapping[TabName, pd.DataFrame]):
+    '''
+    Data pool keyed by CSV ID that only knows each file's schema up front.
+    Column data is parsed the first time it is asked for and kept for later
+    requests, so filling the X/Y comboboxes never touches the file body.
+    Indexing a CSV ID materializes all of its columns.
+
+    With `compact`, loaded frames are downcast by `compact_frame`. When the
+    frames exceed `memory_budget` bytes, the least recently used datasets
+    are released; they are read again from disk when next asked for.
+    Frames given to `set_frame` cannot be reloaded and are never released.
+    `on_release` is called with the CSV ID of every released dataset.
+    `version` counts the changes of a dataset's rows.
+    '''
+
+    def __init__(
+            self, schemas: Mapping[TabName, data_loading.Schema] = None,
+            use_cache: bool = True, compact: bool = True,
+            memory_budget: Optional[int] = None):
+        self.schemas: Dict[TabName, data_loading.Schema] = dict(schemas or {})
+        self.use_cache = use_cache
+        self.compact = compact
+        self.memory_budget = memory_budget
+        self.frames: Dict[TabName, pd.DataFrame] = {}
+        self.memory: Dict[TabName, int] = {}
+        self.last_used: Dict[TabName, int] = {}
+        self.pinned: Set[TabName] = set()
+        self.versions: Dict[TabName, int] = {}
+        self.counter = itertools.count()
+        self.on_release: Optional[Callable[[TabName], None]] = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_frames(
+            cls, paths: Mapping[TabName, str],
+            frames: Mapping[TabName, pd.DataFrame],
+            use_cache: bool = True, compact: bool = True,
+            memory_budget: Optional[int] = None) -> 'DataPool':
+        schemas = {
+            tabname: {
+                'path': str(paths[tabname]),
+                'columns': [str(column) for column in df.columns],
+                'approx_rows': len(df)
+            }
+            for tabname, df in frames.items()
+        }
+        data_pool = cls(schemas, use_cache, compact, memory_budget)
+        for tabname, df in frames.items():
+            data_pool.store_frame(tabname, df)
+        data_pool.enforce_budget()
+        return data_pool
+
+    def __getitem__(self, tabname: TabName) -> pd.DataFrame:
+        return self.get_columns(tabname, self.columns(tabname))
+
+    def __iter__(self) -> Iterator[TabName]:
+        return iter(self.schemas)
+
+    def __len__(self) -> int:
+        return len(self.schemas)
+
+    def __contains__(self, tabname: object) -> bool:
+        return tabname in self.schemas
+
+    def columns(self, tabname: TabName) -> List[str]:
+        return list(self.schemas[tabname]['columns'])
+
+    def approx_rows(self, tabname: TabName) -> int:
+        return self.schemas[tabname]['approx_rows']
+
+    def path(self, tabname: TabName) -> str:
+        return self.schemas[tabname]['path']
+
+    def version(self, tabname: TabName) -> int:
+        return self.versions.get(tabname, 0)
+
+    def loaded_columns(self, tabname: TabName) -> List[str]:
+        frame = self.frames.get(tabname)
+        return [] if frame is None else list(frame.columns)
+
+    def is_loaded(self, tabname: TabName, columns: Sequence[str]) -> bool:
+        loaded = self.loaded_columns(tabname)
+        return all(column in loaded for column in columns)
+
+    def get_columns(
+            self, tabname: TabName, columns: Sequence[str]) -> pd.DataFrame:
+        columns = list(dict.fromkeys(columns))
+        with self.lock:
+            loaded = self.loaded_columns(tabname)
+            missing = [column for column in columns if column not in loaded]
+        if missing:
+            df = self.read_columns(tabname, missing)  # without the lock held
+        with self.lock:
+            if missing:
+                self.add_columns(tabname, df)
+            self.last_used[tabname] = next(self.counter)
+            frame = self.frames[tabname][columns]
+        if missing:
+            self.enforce_budget(keep=tabname)
+        return frame
+
+    def read_columns(self, tabname: TabName, columns: Sequence[str]) -> pd.DataFrame:
+        path = self.path(tabname)
+        if not path:
+            raise NoSourceError(tabname, columns)
+        if len(columns) == len(self.columns(tabname)):
+            df = data_loading.load_csv(path, self.use_cache)
+        else:
+            df = data_loading.load_csv(path, self.use_cache, columns)
+        return compact_frame(df) if self.compact else df
+
+    def add_columns(self, tabname: TabName, df: pd.DataFrame):
+        frame = self.frames.get(tabname)
+        if frame is None or len(frame) != len(df):
+            frame = df  # the file changed since the loaded columns were read
+        else:
+            added = [column for column in df.columns if column not in frame]
+            frame = pd.concat([frame, df[added]], axis=1)
+        order = [column for column in self.columns(tabname) if column in frame]
+        self.frames[tabname] = frame[order]
+        self.memory[tabname] = get_memory_usage(self.frames[tabname])
+        self.schemas[tabname]['approx_rows'] = len(frame)
+
+    def store_frame(self, tabname: TabName, df: pd.DataFrame):
+        if self.compact:
+            df = compact_frame(df)
+        self.frames[tabname] = df
+        self.memory[tabname] = get_memory_usage(df)
+        self.last_used[tabname] = next(self.counter)
+
+    def release(self, tabname: TabName):
+        with self.lock:
+            self.frames.pop(tabname, None)
+            self.memory.pop(tabname, None)
+        if self.on_release is not None:
+            self.on_release(tabname)
+
+    def get_memory_usage(self) -> int:
+        return sum(self.memory.values())
+
+    def enforce_budget(self, keep: TabName = None):
+        '''
+        Release the least recently used datasets, except `keep` and pinned
+        ones, until the loaded frames fit into the memory budget.
+        '''
+        if self.memory_budget is None:
+            return
+        with self.lock:
+            candidates = sorted(
+                (tabname for tabname in self.frames
+                 if tabname != keep and tabname not in self.pinned
+                 and self.memory[tabname]),  # releasing mapped frames frees nothing
+                key=lambda tabname: self.last_used.get(tabname, -1)
+            )
+            usage = self.get_memory_usage()
+            released = []
+            for tabname in candidates:
+                if usage <= self.memory_budget:
+                    break
+                usage -= self.memory[tabname]
+                released.append(tabname)
+        for tabname in released:
+            self.release(tabname)
+
+    def set_frame(self, tabname: TabName, frame: pd.DataFrame):
+        with self.lock:
+            self.frames[tabname] = frame
+            self.memory[tabname] = get_memory_usage(frame)
+            self.pinned.add(tabname)
+            self.versions[tabname] = self.version(tabname) + 1
+            self.schemas[tabname]['columns'] = [str(column) for column in frame.columns]
+            self.schemas[tabname]['approx_rows'] = len(frame)
+
+    def append_rows(self, tabname: TabName, rows: pd.DataFrame):
+        '''
+        Append rows read from a followed file to a loaded frame. Only the
+        columns already loaded are kept.
+        '''
+        with self.lock:
+            frame = self.frames.get(tabname)
+            if frame is None or rows.empty:
+                return
+            frame = pd.concat([frame, rows[frame.columns]], ignore_index=True)
+            self.frames[tabname] = frame
+            self.versions[tabname] = self.version(tabname) + 1
+            self.memory[tabname] = get_memory_usage(frame)
+            self.schemas[tabname]['approx_rows'] = len(frame)
+
+
+class MaterializeWorker(threading.Thread):
+    '''
+    Load the `requests` columns (CSV ID -> columns) of a data pool off the
+    GUI thread. The result is posted to `messages` as ('done', None) or
+    ('failed', error) like data_loading.ImportWorker does, after which the
+    columns are served from memory.
+    '''
+
+    def __init__(self, data_pool: DataPool, requests: Mapping[TabName, Sequence[str]]):
+        super().__init__(daemon=True)
+        self.data_pool = data_pool
+        self.requests = requests
+        self.messages: queue.Queue = queue.Queue()
+
+    def run(self):
+        try:
+            for tabname, columns in self.requests.items():
+                self.data_pool.get_columns(tabname, columns)
+        except Exception as e:
+            self.messages.put(('failed', f'{self.data_pool.path(tabname)}: {e}'))
+        else:
+            self.messages.put(('done', None))
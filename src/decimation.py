@@ -0,0 +1,325 @@
+'''
+Shape-preserving reduction of long series before they are drawn.
+
+`m4` keeps the first, last, minimum and maximum sample of every pixel-wide
+bucket, which renders identically to the full series at that width.
+`lttb` (largest triangle three buckets) keeps one visually significant
+sample per bucket and gives smoother curves at the cost of a Python loop
+over the buckets.
+
+`MinMaxPyramid` precomputes min/max samples over blocks of 4, 16, 64, ...
+samples so any x-range can be re-queried at the level of detail the
+current zoom needs.
+'''
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')  # METHODS is read at startup
+
+
+METHODS = ('none', 'm4', 'lttb')
+DEFAULT_METHOD = 'm4'
+PYRAMID_FACTOR = 4
+PYRAMID_CACHE_SIZE = 32
+
+
+def get_finite(x: np.ndarray, y: np.ndarray, log_x: bool = False):
+    mask = np.isfinite(x) & np.isfinite(y)
+    if log_x:
+        mask &= x > 0
+    return x[mask], y[mask]
+
+
+def is_sorted(x: np.ndarray) -> bool:
+    return bool(np.all(x[1:] >= x[:-1]))
+
+
+def get_bucket_starts(
+        x: np.ndarray, bucket_num: int, log_x: bool = False) -> np.ndarray:
+    position = np.log10(x) if log_x else x
+    edges = np.linspace(position[0], position[-1], bucket_num + 1)[1:-1]
+    starts = np.searchsorted(position, edges, side='left')
+    return np.unique(np.concatenate([[0], starts]))
+
+
+def m4(
+        x: np.ndarray, y: np.ndarray, bucket_num: int,
+        log_x: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    starts = get_bucket_starts(x, bucket_num, log_x)
+    starts = starts[starts < len(x)]
+    ends = np.append(starts[1:], len(x))
+    counts = ends - starts
+
+    mins = np.minimum.reduceat(y, starts)
+    maxs = np.maximum.reduceat(y, starts)
+    min_candidates = np.flatnonzero(y == np.repeat(mins, counts))
+    max_candidates = np.flatnonzero(y == np.repeat(maxs, counts))
+    min_idx = min_candidates[np.searchsorted(min_candidates, starts)]
+    max_idx = max_candidates[np.searchsorted(max_candidates, starts)]
+
+    keep = np.unique(np.concatenate([starts, ends - 1, min_idx, max_idx]))
+    return x[keep], y[keep]
+
+
+def lttb(
+        x: np.ndarray, y: np.ndarray, bucket_num: int,
+        log_x: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    position = np.log10(x) if log_x else x.astype(float)
+    bucket_num = max(bucket_num, 3)
+    edges = np.linspace(1, len(x) - 1, bucket_num - 1).astype(int)
+    keep = np.empty(bucket_num, dtype=np.int64)
+    keep[0], keep[-1] = 0, len(x) - 1
+    selected = 0
+    for idx in range(bucket_num - 2):
+        start, end = edges[idx], max(edges[idx + 1], edges[idx] + 1)
+        next_end = edges[idx + 2] if idx + 2 < len(edges) else len(x)
+        next_x = position[end:next_end].mean() if next_end > end else position[-1]
+        next_y = y[end:next_end].mean() if next_end > end else y[-1]
+        areas = np.abs(
+            (position[selected] - next_x) * (y[start:end] - y[selected])
+            - (position[selected] - position[start:end]) * (next_y - y[selected])
+        )
+        selected = start + int(np.argmax(areas))
+        keep[idx + 1] = selected
+    keep = np.unique(keep)
+    return x[keep], y[keep]
+
+
+def decimate(
+        x, y, pixel_width: int, method: str = DEFAULT_METHOD,
+        log_x: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Reduce a series to what `pixel_width` pixels can show. Series that are
+    short enough, or whose x values are not sorted, are returned unchanged.
+    '''
+    x = np.asarray(x)
+    y = np.asarray(y)
+    bucket_num = max(int(pixel_width), 1)
+    if method == 'none' or len(x) <= 4 * bucket_num:
+        return x, y
+    if x.dtype.kind not in 'iuf' or y.dtype.kind not in 'iuf':
+        return x, y
+
+    x, y = get_finite(x, y, log_x)
+    if len(x) <= 4 * bucket_num or not is_sorted(x) or x[0] == x[-1]:
+        return x, y
+    if method == 'm4':
+        return m4(x, y, bucket_num, log_x)
+    if method == 'lttb':
+        return lttb(x, y, 2 * bucket_num, log_x)
+    raise ValueError(f'Unknown decimation method: {method}')
+
+
+class GrowingArray:
+    '''
+    One-dimensional array with spare capacity, so appending copies only
+    the appended values (amortized).
+    '''
+
+    def __init__(self, values: np.ndarray):
+        self.data = np.array(values)
+        self.size = len(self.data)
+
+    @property
+    def values(self) -> np.ndarray:
+        return self.data[:self.size]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def replace_tail(self, start: int, values: np.ndarray):
+        '''Drop the items from `start` on and append `values`.'''
+        size = start + len(values)
+        if size > len(self.data):
+            data = np.empty(max(size, 2 * len(self.data)), dtype=self.data.dtype)
+            data[:start] = self.data[:start]
+            self.data = data
+        self.data[start:size] = values
+        self.size = size
+
+
+class PyramidLevel:
+    def __init__(self, block: int, min_idx: np.ndarray, max_idx: np.ndarray):
+        self.block = block
+        self.min_buffer = GrowingArray(min_idx)
+        self.max_buffer = GrowingArray(max_idx)
+
+    @property
+    def min_idx(self) -> np.ndarray:
+        return self.min_buffer.values
+
+    @property
+    def max_idx(self) -> np.ndarray:
+        return self.max_buffer.values
+
+
+def reduce_level(
+        y: np.ndarray, min_idx: np.ndarray, max_idx: np.ndarray,
+        factor: int) -> Tuple[np.ndarray, np.ndarray]:
+    pad = -len(min_idx) % factor
+    min_idx = np.append(min_idx, np.repeat(min_idx[-1:], pad))
+    max_idx = np.append(max_idx, np.repeat(max_idx[-1:], pad))
+    min_idx = min_idx.reshape(-1, factor)
+    max_idx = max_idx.reshape(-1, factor)
+    rows = np.arange(len(min_idx))
+    min_idx = min_idx[rows, np.argmin(y[min_idx], axis=1)]
+    max_idx = max_idx[rows, np.argmax(y[max_idx], axis=1)]
+    return min_idx, max_idx
+
+
+class MinMaxPyramid:
+    '''
+    Min/max level-of-detail pyramid over a series with sorted x values.
+    Level k holds, for every block of `factor ** k` samples, the indices of
+    its minimum and maximum, so a query returns at most about four samples
+    per pixel whatever the length of the record. `extend` appends samples
+    and recomputes only the last block of every level.
+    '''
+
+    def __init__(
+            self, x: np.ndarray, y: np.ndarray, factor: int = PYRAMID_FACTOR,
+            log_x: bool = False):
+        self.x_buffer = GrowingArray(x)
+        self.y_buffer = GrowingArray(y)
+        self.factor = factor
+        self.log_x = log_x
+        self.rows = len(x)  # samples given, including non-finite ones
+        self.levels: List[PyramidLevel] = []
+        self.update_levels(0)
+
+    @property
+    def x(self) -> np.ndarray:
+        return self.x_buffer.values
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.y_buffer.values
+
+    def update_levels(self, first: int):
+        '''Recompute every level entry covering samples from `first` on.'''
+        y = self.y
+        count = len(y)  # entries of the level below
+        changed = first  # first changed entry of the level below
+        depth = 0
+        while count > 1:
+            if depth == len(self.levels):
+                empty = np.empty(0, dtype=np.int64)
+                self.levels.append(PyramidLevel(self.factor ** (depth + 1), empty, empty))
+            level = self.levels[depth]
+            start = min(changed // self.factor, len(level.min_idx))
+            if depth == 0:
+                min_idx = max_idx = np.arange(start * self.factor, count)
+            else:
+                below = self.levels[depth - 1]
+                min_idx = below.min_idx[start * self.factor:]
+                max_idx = below.max_idx[start * self.factor:]
+            new_min, new_max = reduce_level(y, min_idx, max_idx, self.factor)
+            level.min_buffer.replace_tail(start, new_min)
+            level.max_buffer.replace_tail(start, new_max)
+            count = len(level.min_idx)
+            changed = start
+            depth += 1
+
+    def extend(self, x, y) -> bool:
+        '''
+        Append samples. Return False, leaving the pyramid unchanged, when
+        they are not numeric or would leave x unsorted.
+        '''
+        x = np.asarray(x)
+        y = np.asarray(y)
+        if x.dtype.kind not in 'iuf' or y.dtype.kind not in 'iuf':
+            return False
+        rows = len(x)
+        x, y = get_finite(x, y, self.log_x)
+        if len(x) and ((len(self.x) and x[0] < self.x[-1]) or not is_sorted(x)):
+            return False
+        first = len(self.x)
+        self.x_buffer.replace_tail(first, x)
+        self.y_buffer.replace_tail(first, y)
+        self.rows += rows
+        if len(x):
+            self.update_levels(first)
+        return True
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def get_index_range(
+            self, xmin: Optional[float], xmax: Optional[float]) -> Tuple[int, int]:
+        start = 0 if xmin is None else np.searchsorted(self.x, xmin, 'left') - 1
+        end = len(self.x) if xmax is None else np.searchsorted(self.x, xmax, 'right') + 1
+        return max(int(start), 0), min(int(end), len(self.x))
+
+    def query(
+            self, xmin: Optional[float], xmax: Optional[float],
+            pixel_width: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.get_index_range(xmin, xmax)
+        sample_num = end - start
+        if sample_num <= 4 * pixel_width:
+            return self.x[start:end], self.y[start:end]
+
+        target_block = sample_num / (2 * max(pixel_width, 1))
+        level = self.levels[-1]
+        for candidate in self.levels:
+            if candidate.block >= target_block:
+                level = candidate
+                break
+        block_start = start // level.block
+        block_end = -(-end // level.block)
+        keep = np.concatenate([
+            [start, end - 1],
+            level.min_idx[block_start:block_end],
+            level.max_idx[block_start:block_end]
+        ])
+        keep = np.unique(keep[(keep >= start) & (keep < end)])
+        return self.x[keep], self.y[keep]
+
+
+FINGERPRINT_SAMPLES = 4096
+
+_pyramid_cache: 'OrderedDict[Tuple, MinMaxPyramid]' = OrderedDict()
+
+
+def get_fingerprint(array: np.ndarray) -> Tuple:
+    step = max(len(array) // FINGERPRINT_SAMPLES, 1)
+    digest = hashlib.blake2b(np.ascontiguousarray(array[::step]).tobytes())
+    return array.shape, array.dtype.str, digest.hexdigest(), float(np.nansum(array))
+
+
+def get_pyramid(x, y, log_x: bool = False) -> Optional[MinMaxPyramid]:
+    '''
+    Return the cached pyramid of a series, building it on first use. The
+    cache is keyed by a content fingerprint, so the same dataset re-sent as
+    a new DataFrame still hits. None is returned for series that cannot be
+    refined by x-range (non-numeric or unsorted x).
+    '''
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if x.dtype.kind not in 'iuf' or y.dtype.kind not in 'iuf':
+        return None
+    key = (get_fingerprint(x), get_fingerprint(y), log_x)
+    if key in _pyramid_cache:
+        _pyramid_cache.move_to_end(key)
+        return _pyramid_cache[key]
+
+    finite_x, finite_y = get_finite(x, y, log_x)
+    if len(finite_x) < 2 or not is_sorted(finite_x):
+        return None
+
+    pyramid = MinMaxPyramid(finite_x, finite_y, log_x=log_x)
+    pyramid.rows = len(x)
+    _pyramid_cache[key] = pyramid
+    while len(_pyramid_cache) > PYRAMID_CACHE_SIZE:
+        _pyramid_cache.popitem(last=False)
+    return pyramid
+
+
+def forget_pyramid(pyramid: MinMaxPyramid):
+    '''Drop a pyramid from the cache, e.g. once it was extended.'''
+    for key in [key for key, cached in _pyramid_cache.items() if cached is pyramid]:
+        del _pyramid_cache[key]
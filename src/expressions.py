@@ -0,0 +1,320 @@
+'''
+Derived fields: columns computed from expressions over the data pool.
+
+A derived field belongs to one dataset (CSV ID) and is offered next to its
+raw columns. Its expression references columns as `{column}` within the
+same dataset or `{csv_id:column}` in any dataset, e.g.
+
+    {1:acceleration(g)} * 9.81
+    sqrt({1:acceleration(g)}**2 + {2:acceleration(g)}**2 + {3:acceleration(g)}**2)
+    rms({acceleration(g)}, 50)
+
+References are rewritten to plain variables and the expression is
+evaluated by `pandas.eval` over whole arrays, which uses numexpr when it is
+installed. `rms(reference, window)` is a trailing moving RMS over `window`
+samples and is computed before the expression. Referenced columns must
+have the same length.
+
+Results are cached by expression and by the versions of their inputs (see
+DataPool.version), so a followed file that grows is evaluated again while
+an unchanged one is not.
+'''
+from __future__ import annotations
+
+import re
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple, TypedDict
+
+from data_pool import DataPool, TabName
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+REFERENCE = re.compile(r'\{(?:(\d+):)?([^{}]+)\}')
+RMS_CALL = re.compile(r'rms\(\s*(\{[^{}]+\})\s*,\s*(\d+)\s*\)')
+RESULT_CACHE_SIZE = 32
+
+Variable = Tuple[TabName, str, int]  # CSV ID, column, RMS window (0: raw)
+
+
+class DerivedField(TypedDict):
+    csv_idx: TabName
+    name: str
+    expression: str
+
+
+class Error(Exception):
+    '''Base class for exceptions in this module.'''
+    pass
+
+
+class ExpressionError(Error):
+    '''Exception raised when a derived field cannot be evaluated.'''
+
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(self.message)
+
+
+def rewrite(expression: str, csv_idx: TabName) -> Tuple[str, Dict[str, Variable]]:
+    '''
+    Replace column references by variable names. Return the rewritten
+    expression and the reference behind every variable.
+    '''
+    names: Dict[Variable, str] = {}
+
+    def substitute(reference: str, window: int) -> str:
+        match = REFERENCE.fullmatch(reference)
+        variable = (match.group(1) or csv_idx, match.group(2).strip(), window)
+        return names.setdefault(variable, f'v{len(names)}')
+
+    text = RMS_CALL.sub(lambda m: substitute(m.group(1), int(m.group(2))), expression)
+    text = REFERENCE.sub(lambda m: substitute(m.group(0), 0), text)
+    if '{' in text or '}' in text:
+        raise ExpressionError(f'Unmatched brace in "{expression}".')
+    return text, {name: variable for variable, name in names.items()}
+
+
+def to_numeric(values: np.ndarray, name: str) -> np.ndarray:
+    values = np.asarray(values)
+    if values.dtype.kind not in 'biuf':
+        raise ExpressionError(f'"{name}" is not numeric.')
+    return values.astype(float, copy=False)
+
+
+def rolling_rms(values: np.ndarray, window: int) -> np.ndarray:
+    if window < 1:
+        raise ExpressionError('The RMS window must be at least one sample.')
+    squares = pd.Series(np.asarray(values, dtype=float) ** 2)
+    return np.sqrt(squares.rolling(window, min_periods=1).mean().to_numpy())
+
+
+class DerivedPool:
+    '''
+    View of a data pool that adds derived fields to its columns. Widgets
+    and plotting ask this view for columns instead of the data pool.
+    '''
+
+    def __init__(self, data_pool: DataPool, fields: Sequence[DerivedField] = ()):
+        self.data_pool = data_pool
+        self.fields: Dict[Tuple[TabName, str], DerivedField] = {}
+        self.cache: 'OrderedDict[Tuple, np.ndarray]' = OrderedDict()
+        self.set_fields(fields)
+
+    def set_fields(self, fields: Sequence[DerivedField]):
+        '''Replace every field without evaluating them.'''
+        self.fields = {}
+        for field in fields:
+            self.fields[(str(field['csv_idx']), field['name'])] = {
+                'csv_idx': str(field['csv_idx']),
+                'name': field['name'],
+                'expression': field['expression']
+            }
+
+    def keys(self):
+        return self.data_pool.keys()
+
+    def __contains__(self, csv_idx: object) -> bool:
+        return csv_idx in self.data_pool
+
+    def definitions(self) -> List[DerivedField]:
+        return [dict(field) for field in self.fields.values()]
+
+    def derived_columns(self, csv_idx: TabName) -> List[str]:
+        return [name for idx, name in self.fields if idx == csv_idx]
+
+    def columns(self, csv_idx: TabName) -> List[str]:
+        return self.data_pool.columns(csv_idx) + self.derived_columns(csv_idx)
+
+    def add(self, field: DerivedField):
+        '''Add or replace a field after checking that it evaluates.'''
+        csv_idx, name = str(field['csv_idx']), field['name'].strip()
+        if csv_idx not in self.data_pool:
+            raise ExpressionError(f'CSV ID {csv_idx} is not in the data pool.')
+        if not name:
+            raise ExpressionError('A derived field needs a name.')
+        if name in self.data_pool.columns(csv_idx):
+            raise ExpressionError(f'CSV ID {csv_idx} already has a column "{name}".')
+        key = (csv_idx, name)
+        previous = self.fields.get(key)
+        self.fields[key] = {'csv_idx': csv_idx, 'name': name, 'expression': field['expression']}
+        try:
+            self.get_values(csv_idx, name)
+        except Exception:
+            if previous is None:
+                del self.fields[key]
+            else:
+                self.fields[key] = previous
+            raise
+
+    def remove(self, csv_idx: TabName, name: str):
+        self.fields.pop((csv_idx, name), None)
+
+    def get_version(self, csv_idx: TabName, column: str, stack: Tuple = ()) -> Tuple:
+        field = self.fields.get((csv_idx, column))
+        if field is None:
+            return csv_idx, self.data_pool.version(csv_idx)
+        if (csv_idx, column) in stack:
+            raise ExpressionError(f'"{column}" refers to itself.')
+        stack = stack + ((csv_idx, column),)
+        variables = rewrite(field['expression'], csv_idx)[1]
+        return field['expression'], tuple(
+            self.get_version(idx, name, stack) for idx, name, _ in variables.values()
+        )
+
+    def get_values(self, csv_idx: TabName, column: str, stack: Tuple = ()) -> np.ndarray:
+        field = self.fields.get((csv_idx, column))
+        if field is None:
+            if csv_idx not in self.data_pool:
+                raise ExpressionError(f'CSV ID {csv_idx} is not in the data pool.')
+            if column not in self.data_pool.columns(csv_idx):
+                raise ExpressionError(f'CSV ID {csv_idx} has no column "{column}".')
+            return self.data_pool.get_columns(csv_idx, [column])[column].to_numpy()
+        return self.evaluate(field, stack)
+
+    def evaluate(self, field: DerivedField, stack: Tuple = ()) -> np.ndarray:
+        csv_idx, name = field['csv_idx'], field['name']
+        key = (csv_idx, field['expression'], self.get_version(csv_idx, name, stack))
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        text, variables = rewrite(field['expression'], csv_idx)
+        stack = stack + ((csv_idx, name),)
+        arrays = {}
+        for variable, (idx, column, window) in variables.items():
+            values = to_numeric(self.get_values(idx, column, stack), column)
+            arrays[variable] = values if window == 0 else rolling_rms(values, window)
+        if len({len(values) for values in arrays.values()}) > 1:
+            raise ExpressionError(f'The columns referenced by "{name}" differ in length.')
+        try:
+            result = pd.eval(text, local_dict=arrays)
+        except Exception as e:
+            raise ExpressionError(f'Cannot evaluate "{name}": {e}')
+        result = to_numeric(result, name)
+        if result.ndim == 0:
+            result = np.full(self.data_pool.approx_rows(csv_idx), float(result))
+
+        self.cache[key] = result
+        while len(self.cache) > RESULT_CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return result
+
+    def get_requirements(
+            self, csv_idx: TabName, columns: Sequence[str],
+            requirements: Dict[TabName, List[str]] = None,
+            stack: Tuple = ()) -> Dict[TabName, List[str]]:
+        '''Raw columns, by CSV ID, that `columns` of `csv_idx` are computed from.'''
+        requirements = {} if requirements is None else requirements
+        for column in columns:
+            field = self.fields.get((csv_idx, column))
+            if field is None:
+                if csv_idx in self.data_pool and column in self.data_pool.columns(csv_idx):
+                    required = requirements.setdefault(csv_idx, [])
+                    if column not in required:
+                        required.append(column)
+                continue
+            if (csv_idx, column) in stack:
+                raise ExpressionError(f'"{column}" refers to itself.')
+            for idx, name, _ in rewrite(field['expression'], csv_idx)[1].values():
+                self.get_requirements(
+                    idx, [name], requirements, stack + ((csv_idx, column),)
+                )
+        return requirements
+
+    def get_columns(self, csv_idx: TabName, columns: Sequence[str]) -> pd.DataFrame:
+        '''Like DataPool.get_columns, with derived fields among `columns`.'''
+        columns = list(dict.fromkeys(columns))
+        derived = self.derived_columns(csv_idx)
+        if not any(column in derived for column in columns):
+            return self.data_pool.get_columns(csv_idx, columns)
+        values = {column: self.get_values(csv_idx, column) for column in columns}
+        if len({len(array) for array in values.values()}) > 1:
+            raise ExpressionError(
+                f'Columns {", ".join(columns)} of CSV ID {csv_idx} differ in length.'
+            )
+        return pd.DataFrame(values)
+
+
+def get_positions(config: Dict) -> Dict[TabName, int]:
+    '''First position in config['data']['fieldnames'] of every CSV ID.'''
+    positions: Dict[TabName, int] = {}
+    for idx, csv_idx in enumerate(config['data'].get('csv_indices') or []):
+        positions.setdefault(str(csv_idx), idx)
+    return positions
+
+
+def expand_required_columns(
+        config: Dict, required: Dict[int, List[str]]) -> Dict[int, List[str]]:
+    '''
+    Replace the derived fields among the `required` columns of every plotted
+    dataset (by position) by the raw columns they are computed from. Raw
+    columns of the dataset's own CSV ID are required from the dataset, and
+    those of another CSV ID from the first dataset plotting it.
+    '''
+    fields = {
+        (str(field['csv_idx']), field['name']): field
+        for field in config['data'].get('derived_fields') or []
+    }
+    if not fields:
+        return required
+    csv_indices = [str(csv_idx) for csv_idx in config['data'].get('csv_indices') or []]
+    positions = get_positions(config)
+    expanded: Dict[int, List[str]] = {idx: [] for idx in required}
+
+    def add(idx: int, csv_idx: TabName, column: str, stack: Tuple):
+        field = fields.get((csv_idx, column))
+        if field is None:
+            columns = expanded.setdefault(idx, [])
+            if column not in columns:
+                columns.append(column)
+        elif (csv_idx, column) not in stack:  # cycles are reported on evaluation
+            for ref_idx, name, _ in rewrite(field['expression'], csv_idx)[1].values():
+                if ref_idx == csv_idx:
+                    add(idx, ref_idx, name, stack + ((csv_idx, column),))
+                elif ref_idx in positions:
+                    add(positions[ref_idx], ref_idx, name, stack + ((csv_idx, column),))
+
+    for idx, columns in required.items():
+        for column in columns:
+            if idx < len(csv_indices):
+                add(idx, csv_indices[idx], column, ())
+            else:
+                add(idx, '', column, ())
+    return expanded
+
+
+def evaluate_frames(config: Dict, frames: Sequence[pd.DataFrame]) -> List[pd.DataFrame]:
+    '''
+    Frames of the plotted (x, y) columns, computing the derived fields of
+    `config`, for plotting outside the GUI. Dataset i of `frames` is the CSV
+    ID config['data']['csv_indices'][i]. Each dataset is evaluated over its
+    own frame; references to other CSV IDs read the first dataset plotting
+    them, as in expand_required_columns.
+    '''
+    data = config['data']
+    if not data.get('derived_fields'):
+        return list(frames)
+    csv_indices = [str(csv_idx) for csv_idx in data.get('csv_indices') or []]
+    if len(csv_indices) < len(frames):
+        raise ExpressionError('Derived fields need data.csv_indices for every dataset.')
+    if not frames:
+        return []
+    positions = get_positions(config)
+
+    def get_derived_pool(idx: int) -> DerivedPool:
+        by_id = {csv_idx: frames[position] for csv_idx, position in positions.items()}
+        by_id[csv_indices[idx]] = frames[idx]
+        data_pool = DataPool.from_frames(
+            {csv_idx: '' for csv_idx in by_id}, by_id, use_cache=False, compact=False
+        )
+        return DerivedPool(data_pool, data['derived_fields'])
+
+    shared = get_derived_pool(0)  # for every dataset first plotting its CSV ID
+    results = []
+    for idx, (csv_idx, fieldname) in enumerate(zip(csv_indices, data['fieldnames'])):
+        derived = shared if positions[csv_idx] == idx else get_derived_pool(idx)
+        results.append(derived.get_columns(csv_idx, [fieldname['x'], fieldname['y']]))
+    return results
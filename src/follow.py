@@ -0,0 +1,91 @@
+'''
+Follow delimited text files that are still being written.
+
+A FileFollower remembers the byte offset just past the last complete line
+it has parsed. Each poll reads only the bytes appended since then, parses
+the complete lines among them and leaves a trailing partial line in the
+file for the next poll.
+'''
+import io
+import os
+from pathlib import Path
+from typing import List, Union
+
+import pandas as pd
+
+import data_loading
+
+
+PathLike = Union[str, Path]
+
+
+class Error(Exception):
+    '''Base class for exceptions in this module.'''
+    pass
+
+
+class FileTruncatedError(Error):
+    '''Exception raised when a followed file became shorter than its offset.'''
+    message = 'File was truncated or replaced.'
+
+
+def get_complete_end(data: bytes) -> int:
+    return data.rfind(b'\n') + 1
+
+
+class FileFollower:
+    def __init__(self, path: PathLike):
+        self.path = str(path)
+        self.offset = 0
+        self.columns: List[str] = []
+        self.dialect: data_loading.Dialect = None
+
+    def read_all(self) -> pd.DataFrame:
+        '''
+        Parse every complete line written so far and start following from
+        the end of the last one.
+        '''
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        end = get_complete_end(data)
+        self.offset = 0
+        if end == 0:
+            self.dialect = None
+            return pd.DataFrame(columns=self.columns)
+
+        data = data[:end]
+        prefix = data[:data_loading.SNIFF_SIZE]
+        dialect = data_loading.sniff_prefix(prefix, len(prefix) == len(data))
+        df = pd.read_csv(io.BytesIO(data), **data_loading.get_parser_options(dialect))
+        df = data_loading.name_columns(df, dialect)
+        self.dialect = dialect
+        self.columns = [str(column) for column in df.columns]
+        self.offset = end
+        return df
+
+    def poll(self) -> pd.DataFrame:
+        '''
+        Return the rows appended since the last call, which may be none.
+        Raises FileTruncatedError when the file shrank below the offset.
+        '''
+        if self.dialect is None:
+            return self.read_all()
+        size = os.path.getsize(self.path)
+        if size < self.offset:
+            raise FileTruncatedError
+        if size == self.offset:
+            return pd.DataFrame(columns=self.columns)
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        end = get_complete_end(data)
+        if end == 0:
+            return pd.DataFrame(columns=self.columns)
+        self.offset += end
+        return pd.read_csv(
+            io.BytesIO(data[:end]),
+            sep=self.dialect['delimiter'],
+            header=None,
+            names=self.columns
+        )
@@ -0,0 +1,188 @@
+'''
+Named timing spans across the import and plot pipeline.
+
+Wrap a stage with `span('name')`; when tracing is disabled the call
+returns a shared no-op object, so instrumented code pays only a function
+call. When enabled, every span records wall time, an optional row count
+and, if memory tracing is on, the peak Python memory allocated during the
+span (via tracemalloc). Spans can be exported as plain JSON or in the
+Chrome trace event format (chrome://tracing, Perfetto).
+
+Set the environment variable CSVIEWER_TRACE=1 to enable tracing at start.
+'''
+import json
+import os
+import threading
+import time
+import tracemalloc
+from functools import wraps
+from typing import Callable, List, Optional, TypedDict
+
+
+class SpanRecord(TypedDict):
+    name: str
+    start: float
+    duration: float
+    rows: Optional[int]
+    peak_memory: Optional[int]
+    thread: int
+
+
+class NullSpan:
+    rows = None
+
+    def __setattr__(self, name: str, value):
+        pass  # shared by every disabled span, so nothing is recorded
+
+    def __enter__(self) -> 'NullSpan':
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def start(self) -> 'NullSpan':
+        return self
+
+    def stop(self, rows: int = None):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    def __init__(self, tracer: 'Tracer', name: str, rows: int = None):
+        self.tracer = tracer
+        self.name = name
+        self.rows = rows
+        self.peak = 0
+        self.start_time = 0.0
+        self.start_memory = 0
+
+    def __enter__(self) -> 'Span':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+    def start(self) -> 'Span':
+        stack = self.tracer.get_stack()
+        if self.tracer.trace_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.start_memory = current
+        stack.append(self)
+        self.start_time = time.perf_counter()
+        return self
+
+    def stop(self, rows: int = None):
+        duration = time.perf_counter() - self.start_time
+        if rows is not None:
+            self.rows = rows
+        stack = self.tracer.get_stack()
+        if self in stack:
+            stack.remove(self)
+        peak_memory = None
+        if self.tracer.trace_memory and tracemalloc.is_tracing():
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            peak_memory = max(self.peak - self.start_memory, 0)
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+        self.tracer.record({
+            'name': self.name,
+            'start': self.start_time - self.tracer.origin,
+            'duration': duration,
+            'rows': self.rows,
+            'peak_memory': peak_memory,
+            'thread': threading.get_ident()
+        })
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.origin = time.perf_counter()
+        self.records: List[SpanRecord] = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def enable(self, trace_memory: bool = True):
+        self.enabled = True
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        self.enabled = False
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.trace_memory = False
+
+    def clear(self):
+        with self.lock:
+            self.records = []
+
+    def get_stack(self) -> List[Span]:
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def record(self, record: SpanRecord):
+        with self.lock:
+            self.records.append(record)
+
+    def span(self, name: str, rows: int = None):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, rows)
+
+    def get_records(self) -> List[SpanRecord]:
+        with self.lock:
+            return list(self.records)
+
+    def export_json(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.get_records(), f, indent=4)
+
+    def export_chrome_trace(self, path: str):
+        events = []
+        for record in self.get_records():
+            events.append({
+                'name': record['name'],
+                'ph': 'X',
+                'ts': record['start'] * 1e6,
+                'dur': record['duration'] * 1e6,
+                'pid': os.getpid(),
+                'tid': record['thread'],
+                'args': {
+                    'rows': record['rows'],
+                    'peak_memory': record['peak_memory']
+                }
+            })
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events}, f)
+
+
+tracer = Tracer()
+if os.environ.get('CSVIEWER_TRACE') == '1':
+    tracer.enable()
+
+
+def span(name: str, rows: int = None):
+    return tracer.span(name, rows)
+
+
+def traced(name: str) -> Callable:
+    def decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+            with tracer.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
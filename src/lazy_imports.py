@@ -0,0 +1,35 @@
+'''
+Deferred imports so the main window shows before the heavy modules load.
+
+`lazy_import` returns a module whose code only runs on its first attribute
+access (importlib.util.LazyLoader). Modules that annotate with names from
+a lazy module need `from __future__ import annotations`, otherwise the
+annotations themselves trigger the load.
+
+`load` forces a lazy module to execute. The GUI calls it for one module at
+a time from the Tk event loop once the window is up, so the first plot
+usually finds everything loaded. Loading stays on the Tk thread because
+lazy modules are not safe to load from several threads at once.
+'''
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f'No module named {name!r}', name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def load(module: ModuleType) -> ModuleType:
+    getattr(module, '__name__')  # any attribute access runs a lazy module
+    return module
@@ -1,18 +1,35 @@
-import csv
+from __future__ import annotations
+
 import json
 import os
+import queue
 import sys
 import tkinter as tk
 from pathlib import Path
 from tkinter import font
 from tkinter import filedialog
+from tkinter import simpledialog
 from tkinter import ttk
-from typing import Dict, Sequence, TypedDict, Union
-
-import pandas as pd
+from typing import Callable, Dict, Sequence, Set, Tuple, TypedDict, Union
 
-import plotting
+import instrumentation
 from custom_widgets import *
+from lazy_imports import lazy_import, load
+
+# loaded on first use or by App.warm_up once the window is shown
+pd = lazy_import('pandas')
+expressions = lazy_import('expressions')
+analysis = lazy_import('analysis')
+bundle = lazy_import('bundle')
+catalog = lazy_import('catalog')
+csv_cache = lazy_import('csv_cache')
+data_loading = lazy_import('data_loading')
+decimation = lazy_import('decimation')
+follow = lazy_import('follow')
+pool = lazy_import('data_pool')
+plotting = lazy_import('plotting')
+plot_canvas = lazy_import('plot_canvas')
+readers = lazy_import('readers')
 
 
 class AxisVisualWidgets(TypedDict):
@@ -29,6 +46,9 @@ class FigureVisualWidgets(TypedDict):
     height: LabelEntry
     grid_visible: tk.IntVar
     legend_visible: tk.IntVar
+    decimation: ttk.Combobox
+    analysis: ttk.Combobox
+    damping: LabelEntry
 
 
 class DataVisualWidgets(TypedDict):
@@ -47,9 +67,6 @@ class DataVisualTab(ttk.Frame):
         self.widgets: DataVisualWidgets = {}
 
 
-DataPool = Dict[TabName, pd.DataFrame]
-
-
 class DataVisualNotebook(Notebook):
     def __init__(self, frame: Union[tk.Frame, ttk.Frame]):
         super().__init__(frame)
@@ -86,16 +103,24 @@ class DataVisualNotebook(Notebook):
         widgets['label'] = label_entry
         tab.widgets = widgets
 
-    def update_fieldname_options(self, tabname: TabName, data_pool: DataPool):
+    def update_fieldname_options(self, tabname: TabName, data_pool: expressions.DerivedPool):
         widgets = self.tabs_[tabname].widgets
         csv_idx = widgets['csv_idx'].get()
-        columns = list(data_pool[csv_idx].columns)
+        columns = data_pool.columns(csv_idx)
         widgets['field_x'].config(values=columns)
         widgets['field_x'].current(0)
         widgets['field_y'].config(values=columns)
         widgets['field_y'].current(1)
 
-    def initialize_widgets(self, tabname: TabName, data_pool: DataPool):
+    def refresh_fieldname_options(self, data_pool: expressions.DerivedPool):
+        for tab in self.tabs_.values():
+            csv_idx = tab.widgets['csv_idx'].get()
+            if csv_idx in data_pool:
+                columns = data_pool.columns(csv_idx)
+                tab.widgets['field_x'].config(values=columns)
+                tab.widgets['field_y'].config(values=columns)
+
+    def initialize_widgets(self, tabname: TabName, data_pool: expressions.DerivedPool):
         widgets = self.tabs_[tabname].widgets
         values_csv_idx = list(data_pool.keys())
         widgets['csv_idx'].config(values=values_csv_idx)
@@ -107,21 +132,125 @@ class DataVisualNotebook(Notebook):
         )
 
 
+def load_columns(
+        widget: tk.Misc, data_pool: pool.DataPool,
+        requests: Dict[TabName, Sequence[str]],
+        on_loaded: Callable[[], None], on_failed: Callable[[str], None]):
+    '''
+    Call `on_loaded` once the `requests` columns (CSV ID -> columns) of
+    `data_pool` are in memory. Columns not loaded yet are read by a
+    MaterializeWorker polled from the event loop of `widget`, so parsing a
+    lazily imported file never blocks the GUI.
+    '''
+    missing = {
+        tabname: columns for tabname, columns in requests.items()
+        if not data_pool.is_loaded(tabname, columns)
+    }
+    if not missing:
+        on_loaded()
+        return
+    worker = pool.MaterializeWorker(data_pool, missing)
+    worker.start()
+
+    def poll():
+        try:
+            kind, payload = worker.messages.get_nowait()
+        except queue.Empty:
+            widget.after(App.IMPORT_POLL_MS, poll)
+            return
+        if kind == 'done':
+            on_loaded()
+        else:
+            on_failed(payload)
+    widget.after(App.IMPORT_POLL_MS, poll)
+
+
 class DataPoolNotebook(Notebook):
     def __init__(self, frame: Union[tk.Frame, ttk.Frame]):
         super().__init__(frame)
+        self.datapool = {}  # replaced by the first imported data pool
+        self.populated_tabs = set()
+        self.loading_tabs = set()
+        self.treeviews: Dict[TabName, VirtualTreeview] = {}
+        self.bind(
+            '<<NotebookTabChanged>>',
+            lambda event: self.populate_selected_tab()
+        )
 
-    def present_data_pool(self, datapool: DataPool):
-        for tabname, dataframe in datapool.items():
+    def present_data_pool(self, datapool: pool.DataPool):
+        self.datapool = datapool
+        self.datapool.on_release = self.unpopulate_tab
+        self.populated_tabs = set()
+        self.loading_tabs = set()
+        self.treeviews = {}
+        for tabname in datapool.keys():
             self.create_new_empty_tab(tabname)
-            tab = self.tabs_[tabname]
-            columns = list(dataframe.columns)
-            treeview = Treeview(tab, columns, App.HEIGHT_DATAPOOL)
-            treeview.insert_dataframe(dataframe)
-            treeview.adjust_column_width()
+        self.populate_selected_tab()
+
+    def populate_selected_tab(self):
+        if not self.tabs_ or not self.select():
+            return
+        tabname = self.tab(self.select(), 'text')
+        if tabname in self.populated_tabs or tabname in self.loading_tabs \
+                or tabname not in self.datapool:
+            return
+        datapool = self.datapool
+        self.loading_tabs.add(tabname)
+        ttk.Label(self.tabs_[tabname], text='Loading...').pack(**App.PADS)
+        load_columns(
+            self, datapool, {tabname: datapool.columns(tabname)},
+            lambda: self.populate_tab(tabname, datapool),
+            lambda message: self.show_load_error(tabname, datapool, message)
+        )
+
+    def is_current(self, tabname: TabName, datapool: pool.DataPool) -> bool:
+        return datapool is self.datapool and tabname in self.loading_tabs
+
+    def show_load_error(self, tabname: TabName, datapool: pool.DataPool, message: str):
+        if not self.is_current(tabname, datapool):
+            return
+        self.loading_tabs.discard(tabname)
+        for widget in self.tabs_[tabname].winfo_children():
+            widget.destroy()
+        tk.messagebox.showerror(title='Error', message=message)
+
+    @instrumentation.traced('populate_data_pool_tab')
+    def populate_tab(self, tabname: TabName, datapool: pool.DataPool):
+        if not self.is_current(tabname, datapool):
+            return  # the data pool or its tabs were replaced meanwhile
+        self.loading_tabs.discard(tabname)
+        tab = self.tabs_[tabname]
+        for widget in tab.winfo_children():
+            widget.destroy()
+        dataframe = self.datapool[tabname]
+        columns = list(dataframe.columns)
+        treeview = VirtualTreeview(tab, columns, App.HEIGHT_DATAPOOL)
+        treeview.set_dataframe(dataframe)
+        treeview.adjust_column_width()
+        self.populated_tabs.add(tabname)
+        self.treeviews[tabname] = treeview
+
+    def unpopulate_tab(self, tabname: TabName):
+        if tabname not in self.populated_tabs:
+            return
+        for widget in self.tabs_[tabname].winfo_children():
+            widget.destroy()
+        self.populated_tabs.discard(tabname)
+        self.treeviews.pop(tabname, None)
+
+    def extend_tab(self, tabname: TabName):
+        if tabname in self.treeviews:
+            self.treeviews[tabname].extend_dataframe(self.datapool[tabname])
+
+    def remove_all_tabs(self):
+        super().remove_all_tabs()
+        self.populated_tabs = set()
+        self.loading_tabs = set()
+        self.treeviews = {}
 
     def clear_content(self):
         self.remove_all_tabs()
+        self.datapool = pool.DataPool()
         tabname = '1'
         self.create_new_empty_tab(tabname)
         tab = self.tabs_[tabname]
@@ -129,28 +258,207 @@ class DataPoolNotebook(Notebook):
 
 
 class CsvInfoTreeview(Treeview):
+    LIVE_TAG = 'live'
+
     def __init__(self, frame: Union[tk.Frame, ttk.Frame], columns: Sequence[str], height: int):
         super().__init__(frame, columns, height)
+        self.tag_configure(CsvInfoTreeview.LIVE_TAG, foreground='green')
 
-    def collect_data_pool(self) -> DataPool:
-        data_pool: DataPool = {}
-        csv_info = self.get_dataframe()
-        for row in csv_info.itertuples():
-            csv_idx, csv_path = row[1:]
-            tabname = str(csv_idx)
-            if self.check_header(csv_path):
-                csv_dataframe = pd.read_csv(csv_path)
+    def toggle_live(self):
+        for item in self.selection():
+            tags = list(self.item(item, 'tags'))
+            if CsvInfoTreeview.LIVE_TAG in tags:
+                tags.remove(CsvInfoTreeview.LIVE_TAG)
             else:
-                csv_dataframe = pd.read_csv(csv_path, header=None)
-                columns = [f'column-{col}' for col in csv_dataframe.columns]
-                csv_dataframe.columns = columns
-            data_pool[tabname] = csv_dataframe
-        return data_pool
+                tags.append(CsvInfoTreeview.LIVE_TAG)
+            self.item(item, tags=tags)
+
+    def get_live_ids(self) -> Set[TabName]:
+        return {
+            str(self.item(item, 'values')[0])
+            for item in self.tag_has(CsvInfoTreeview.LIVE_TAG)
+        }
+
+    def get_csv_paths(self) -> Dict[TabName, str]:
+        csv_info = self.get_dataframe()
+        return {
+            str(csv_idx): csv_path
+            for csv_idx, csv_path in zip(csv_info['CSV ID'], csv_info['CSV Path'])
+        }
+
+    def collect_data_pool(
+            self, max_workers: int = None,
+            use_processes: bool = False) -> Tuple[pool.DataPool, Dict[TabName, str]]:
+        paths = self.get_csv_paths()
+        frames, errors = data_loading.load_csvs(paths, max_workers, use_processes)
+        return pool.DataPool.from_frames(paths, frames), errors
 
     def check_header(self, csv_path: str):
-        with open(csv_path, 'r') as f:
-            has_header = csv.Sniffer().has_header(f.read())
-            return has_header
+        return data_loading.sniff_dialect(csv_path)['has_header']
+
+
+class DiagnosticsWindow(tk.Toplevel):
+    '''
+    Lists the spans recorded by `instrumentation.tracer` and exports them.
+    '''
+    COLUMNS = ('Stage', 'Start [s]', 'Duration [ms]', 'Rows', 'Peak memory [MB]')
+    HEIGHT = 20
+
+    def __init__(self, master: tk.Tk):
+        super().__init__(master)
+        self.title('Diagnostics')
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        self.enabled = tk.BooleanVar(value=instrumentation.tracer.enabled)
+        checkbutton = ttk.Checkbutton(
+            self, text='Record spans', variable=self.enabled,
+            command=self.toggle_tracing
+        )
+        checkbutton.grid(row=0, column=0, sticky=tk.W, **App.PADS)
+
+        frame = ttk.Frame(self)
+        frame.grid(row=1, column=0, sticky=tk.NSEW, **App.PADS)
+        self.treeview = Treeview(frame, DiagnosticsWindow.COLUMNS, DiagnosticsWindow.HEIGHT)
+
+        frame_buttons = ttk.Frame(self)
+        frame_buttons.grid(row=2, column=0, sticky=tk.E, **App.PADS)
+        buttons = (
+            ('Refresh', self.refresh),
+            ('Clear', self.clear),
+            ('Export JSON', self.export_json),
+            ('Export Chrome trace', self.export_chrome_trace)
+        )
+        for column, (text, command) in enumerate(buttons):
+            button = ttk.Button(frame_buttons, text=text, command=command)
+            button.grid(row=0, column=column, padx=2)
+        self.refresh()
+
+    def toggle_tracing(self):
+        if self.enabled.get():
+            instrumentation.tracer.enable()
+        else:
+            instrumentation.tracer.disable()
+
+    def refresh(self):
+        rows = []
+        for record in instrumentation.tracer.get_records():
+            peak_memory = record['peak_memory']
+            rows.append((
+                record['name'],
+                f"{record['start']:.3f}",
+                f"{record['duration'] * 1e3:.1f}",
+                '' if record['rows'] is None else record['rows'],
+                '' if peak_memory is None else f'{peak_memory / 1e6:.1f}'
+            ))
+        self.treeview.clear_content()
+        self.treeview.insert_dataframe(
+            pd.DataFrame(rows, columns=DiagnosticsWindow.COLUMNS)
+        )
+        self.treeview.adjust_column_width()
+
+    def clear(self):
+        instrumentation.tracer.clear()
+        self.refresh()
+
+    def export_json(self):
+        path = filedialog.asksaveasfilename(
+            parent=self, filetypes=[('JSON File', '*.json'), ],
+            defaultextension='.json'
+        )
+        if path:
+            instrumentation.tracer.export_json(path)
+
+    def export_chrome_trace(self):
+        path = filedialog.asksaveasfilename(
+            parent=self, filetypes=[('Chrome trace', '*.json'), ],
+            defaultextension='.json'
+        )
+        if path:
+            instrumentation.tracer.export_chrome_trace(path)
+
+
+class DerivedFieldsWindow(tk.Toplevel):
+    '''
+    Lists the derived fields of the data pool and adds or removes them.
+    '''
+    COLUMNS = ('CSV ID', 'Name', 'Expression')
+    HEIGHT = 10
+    WIDTH_EXPRESSION = 48
+
+    def __init__(
+            self, master: tk.Tk, derived: expressions.DerivedPool,
+            on_change: Callable[[], None]):
+        super().__init__(master)
+        self.title('Derived fields')
+        self.derived = derived
+        self.on_change = on_change
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        frame = ttk.Frame(self)
+        frame.grid(row=0, column=0, sticky=tk.NSEW, **App.PADS)
+        self.treeview = Treeview(frame, DerivedFieldsWindow.COLUMNS, DerivedFieldsWindow.HEIGHT)
+
+        frame_entries = ttk.Frame(self)
+        frame_entries.grid(row=1, column=0, sticky=tk.EW, **App.PADS)
+        label = tk.Label(frame_entries, text='CSV ID: ')
+        label.grid(row=0, column=0, sticky=tk.W, **App.PADS)
+        self.combobox_csv_idx = ttk.Combobox(frame_entries, width=App.WIDTH_COMBOBOX)
+        self.combobox_csv_idx.grid(row=0, column=1, sticky=tk.W, **App.PADS)
+        self.combobox_csv_idx.config(values=list(derived.keys()), state='readonly')
+        if derived.keys():
+            self.combobox_csv_idx.current(0)
+
+        self.name = LabelEntry(frame_entries, 'Name: ', App.WIDTH_ENTRY, tk.StringVar())
+        self.name.label.grid(row=1, column=0, sticky=tk.W, **App.PADS)
+        self.name.entry.grid(row=1, column=1, sticky=tk.W, **App.PADS)
+
+        self.expression = LabelEntry(
+            frame_entries, 'Expression: ', DerivedFieldsWindow.WIDTH_EXPRESSION,
+            tk.StringVar()
+        )
+        self.expression.label.grid(row=2, column=0, sticky=tk.W, **App.PADS)
+        self.expression.entry.grid(row=2, column=1, sticky=tk.W, **App.PADS)
+
+        frame_buttons = ttk.Frame(self)
+        frame_buttons.grid(row=2, column=0, sticky=tk.E, **App.PADS)
+        buttons = (('Add', self.add), ('Remove selected', self.remove))
+        for column, (text, command) in enumerate(buttons):
+            button = ttk.Button(frame_buttons, text=text, command=command)
+            button.grid(row=0, column=column, padx=2)
+        self.refresh()
+
+    def refresh(self):
+        rows = [
+            (field['csv_idx'], field['name'], field['expression'])
+            for field in self.derived.definitions()
+        ]
+        self.treeview.clear_content()
+        self.treeview.insert_dataframe(
+            pd.DataFrame(rows, columns=DerivedFieldsWindow.COLUMNS)
+        )
+        self.treeview.adjust_column_width()
+
+    def add(self):
+        try:
+            self.derived.add({
+                'csv_idx': self.combobox_csv_idx.get(),
+                'name': self.name.variable.get(),
+                'expression': self.expression.variable.get()
+            })
+        except expressions.Error as e:
+            tk.messagebox.showerror(title='Error', message=e.message, parent=self)
+            return
+        self.refresh()
+        self.on_change()
+
+    def remove(self):
+        for item in self.treeview.selection():
+            csv_idx, name = self.treeview.item(item, 'values')[:2]
+            self.derived.remove(str(csv_idx), name)
+        self.refresh()
+        self.on_change()
 
 
 class ConfigWidgets(TypedDict):
@@ -178,6 +486,11 @@ class EmptyDataPoolError(Error):
     message = 'Please import data first.'
 
 
+class ImportRunningError(Error):
+    '''Exception raised when an import is already in progress.'''
+    message = 'Import is in progress.'
+
+
 class App:
     PADS = {
         'padx': 5, 'pady': 5,
@@ -190,10 +503,34 @@ class App:
     HEIGHT_DATAPOOL = 28
     WIDTH_COMBOBOX = 12
     WIDTH_ENTRY = 14
+    LOADER_MAX_WORKERS = None  # None -> decided by data_loading
+    LOADER_USE_PROCESSES = False
+    LOADER_USE_CACHE = True
+    LOADER_LAZY = True  # read only schemas at import
+    CACHE_INFO_ENTRIES = 20
+    IMPORT_POLL_MS = 50
+    FOLLOW_POLL_MS = 1000
+    DATA_POOL_COMPACT = True  # downcast dtypes of loaded frames
+    DATA_POOL_BUDGET_MB = 4096
+    MEMORY_POLL_MS = 1000
+    MAX_EXTERNAL_FIGURES = 5
+    MAX_DATASETS = 1000  # above plotting.BULK_THRESHOLD
+    WARM_UP_MODULES = (
+        pd, decimation, readers, data_loading, pool, plotting, plot_canvas,
+        analysis
+    )
 
     # typesetting
     def __init__(self):
         self.root = self.initialize_main_window()
+        self.import_worker: data_loading.ImportWorker = None
+        self.catalog_worker: catalog.CatalogWorker = None
+        self.bundle_sources: Dict[TabName, bundle.Source] = {}  # of the opened bundle
+        self.last_figure = None
+        self.followers: Dict[TabName, follow.FileFollower] = {}
+        self.follow_job = None
+        self.derived: expressions.DerivedPool = None  # created with the data pool
+        self.memory_budget_mb = App.DATA_POOL_BUDGET_MB
         self.font_label = font.Font(family='Helvetica', size=10)
         self.font_button = font.Font(family='Helvetica', size=10)
         self.config_widgets = self.initialize_configuration_widgets()
@@ -205,6 +542,9 @@ class App:
         self.create_frame_for_axis_visual_x()
         self.create_frame_for_axis_visual_y()
         self.create_frame_for_plot()
+        self.create_frame_for_figure()
+        self.update_memory_usage()
+        self.root.after_idle(self.warm_up, list(App.WARM_UP_MODULES))
         self.root.mainloop()
 
     def initialize_configuration_widgets(self) -> ConfigWidgets:
@@ -227,6 +567,7 @@ class App:
         root.columnconfigure(0, weight=1)
         root.columnconfigure(1, weight=1)
         root.columnconfigure(2, weight=1)
+        root.columnconfigure(3, weight=3)
         root.rowconfigure(0, weight=1)
         root.rowconfigure(1, weight=5)
         root.rowconfigure(2, weight=5)
@@ -242,12 +583,28 @@ class App:
         filemenu.add_command(label='Open', command=self.open)
         filemenu.add_command(label='Save', command=self.save)
         filemenu.add_command(label='Save as...', command=self.save_as)
+        filemenu.add_command(label='Save with data...', command=self.save_with_data)
         filemenu.add_command(label='Close', command=self.close)
         menubar.add_cascade(label='File', menu=filemenu)
 
+        cachemenu = tk.Menu(menubar, tearoff=0)
+        cachemenu.add_command(label='Cache info', command=self.show_cache_info)
+        cachemenu.add_command(label='Clear cache', command=self.clear_cache)
+        menubar.add_cascade(label='Cache', menu=cachemenu)
+
+        datamenu = tk.Menu(menubar, tearoff=0)
+        datamenu.add_command(label='Derived fields...', command=self.show_derived_fields)
+        menubar.add_cascade(label='Data', menu=datamenu)
+
+        memorymenu = tk.Menu(menubar, tearoff=0)
+        memorymenu.add_command(label='Set memory budget...', command=self.set_memory_budget)
+        menubar.add_cascade(label='Memory', menu=memorymenu)
+
         helpmenu = tk.Menu(menubar, tearoff=0)
         helpmenu.add_command(label='Help Index', command=lambda *args: None)
         helpmenu.add_command(label='About...', command=lambda *args: None)
+        helpmenu.add_separator()
+        helpmenu.add_command(label='Diagnostics...', command=self.show_diagnostics)
         menubar.add_cascade(label='Help', menu=helpmenu)
         self.root.configure(menu=menubar)
 
@@ -273,6 +630,24 @@ class App:
         )
         button.grid(row=0, column=0, **App.PADS)
         button['font'] = self.font_button
+
+        button = tk.Button(
+            subframe,
+            text='Follow',
+            command=lambda: self.toggle_follow(),
+            width=6
+        )
+        button.grid(row=1, column=0, **App.PADS)
+        button['font'] = self.font_button
+
+        button = tk.Button(
+            subframe,
+            text='Find',
+            command=lambda: self.find_csvs(),
+            width=6
+        )
+        button.grid(row=2, column=0, **App.PADS)
+        button['font'] = self.font_button
         self.config_widgets['csv_info'] = treeview
 
     def create_frame_for_data_pool(self):
@@ -308,6 +683,31 @@ class App:
         )
         button.grid(row=1, column=1, **App.PADS)
         button['font'] = self.font_button
+
+        progressbar = ttk.Progressbar(frame, mode='determinate')
+        progressbar.grid(row=2, column=0, sticky=tk.EW, **App.PADS)
+        self.import_progressbar = progressbar
+
+        button = tk.Button(
+            frame,
+            text='Cancel',
+            command=lambda: self.cancel_import(),
+            width=6,
+            state='disabled'
+        )
+        button.grid(row=2, column=1, **App.PADS)
+        button['font'] = self.font_button
+        self.import_cancel_button = button
+
+        stringvar = tk.StringVar()
+        label = tk.Label(frame, textvariable=stringvar, anchor=tk.W)
+        label.grid(row=3, column=0, columnspan=2, sticky=tk.EW, **App.PADS)
+        self.import_status = stringvar
+
+        stringvar = tk.StringVar()
+        label = tk.Label(frame, textvariable=stringvar, anchor=tk.W)
+        label.grid(row=4, column=0, columnspan=2, sticky=tk.EW, **App.PADS)
+        self.memory_status = stringvar
         self.config_widgets['data_pool'] = notebook
 
     def create_frame_for_data_visual(self):
@@ -327,7 +727,7 @@ class App:
         label = tk.Label(frame, text='Numbers of datasets')
         label.grid(row=0, column=0, **App.PADS)
 
-        spinbox = Spinbox(frame, from_=1, to=20, width=3)
+        spinbox = Spinbox(frame, from_=1, to=App.MAX_DATASETS, width=4)
         spinbox.grid(row=0, column=1, **App.PADS)
         spinbox.config(
             command=lambda: self.change_number_of_dataset()
@@ -383,6 +783,28 @@ class App:
         intvar.set(True)
         widgets['legend_visible'] = intvar
 
+        label = tk.Label(frame, text='Decimation: ')
+        combobox = ttk.Combobox(frame, width=App.WIDTH_COMBOBOX)
+        label.grid(row=4, column=0, sticky=tk.W, **App.PADS)
+        combobox.grid(row=4, column=1, columnspan=3, sticky=tk.W, **App.PADS)
+        combobox.config(values=decimation.METHODS, state='readonly')
+        combobox.set(decimation.DEFAULT_METHOD)
+        widgets['decimation'] = combobox
+
+        label = tk.Label(frame, text='Analysis: ')
+        combobox = ttk.Combobox(frame, width=App.WIDTH_COMBOBOX)
+        label.grid(row=5, column=0, sticky=tk.W, **App.PADS)
+        combobox.grid(row=5, column=1, columnspan=3, sticky=tk.W, **App.PADS)
+        combobox.config(values=analysis.METHODS, state='readonly')
+        combobox.set(analysis.DEFAULT_METHOD)
+        widgets['analysis'] = combobox
+
+        label_entry = LabelEntry(frame, 'Damping: ', 14, tk.StringVar())
+        label_entry.label.grid(row=6, column=0, sticky=tk.W, **App.PADS)
+        label_entry.entry.grid(row=6, column=1, columnspan=3, sticky=tk.W, **App.PADS)
+        label_entry.variable.set('0.05')
+        widgets['damping'] = label_entry
+
     def create_frame_for_axis_visual_x(self):
         widgets = self.config_widgets['axis_x']
         frame = tk.LabelFrame(self.root, text='X-Axis Visualization')
@@ -507,12 +929,45 @@ class App:
         button.grid(row=0, column=1, **App.PADS)
         button['font'] = self.font_button
 
+        intvar = tk.IntVar()
+        checkbutton = tk.Checkbutton(
+            frame,
+            text='Plot in new window',
+            variable=intvar
+        )
+        checkbutton.grid(row=1, column=0, columnspan=2, **App.PADS)
+        self.plot_external = intvar
+
+    def create_frame_for_figure(self):
+        frame = tk.LabelFrame(self.root, text='Figure')
+        frame.grid(row=0, column=3, rowspan=4, sticky=tk.NSEW, **App.PADS)
+        frame['font'] = self.font_label
+        self.frame_figure = frame
+        self.plot_canvas: plot_canvas.PlotCanvas = None  # created by get_plot_canvas
+
+    def get_plot_canvas(self) -> plot_canvas.PlotCanvas:
+        if self.plot_canvas is None:
+            self.plot_canvas = plot_canvas.PlotCanvas(self.frame_figure)
+        return self.plot_canvas
+
+    def warm_up(self, modules: list):
+        '''
+        Load the deferred modules one per event-loop turn after the window
+        is shown, then embed the figure canvas.
+        '''
+        if modules:
+            load(modules.pop(0))
+            self.root.after_idle(self.warm_up, modules)
+        else:
+            self.get_plot_canvas()
+
     # actions
     def update_csv_info(self, csv_info: pd.DataFrame):
         treeview_csv_info = self.config_widgets['csv_info']
         notebook_data_pool = self.config_widgets['data_pool']
         notebook_data_visual = self.config_widgets['data_visual']
         spinbox_dataset = self.config_widgets['dataset_number']
+        self.stop_following()
         treeview_csv_info.clear_content()
         treeview_csv_info.insert_dataframe(csv_info)
         treeview_csv_info.adjust_column_width()
@@ -525,14 +980,64 @@ class App:
     def open_csvs(self):
         csv_paths = filedialog.askopenfilenames(
             title='Choose csv files',
-            filetypes=[('csv files', '*.csv')]
+            filetypes=readers.get_filetypes()
         )
+        self.set_csv_paths(csv_paths)
+
+    def set_csv_paths(self, csv_paths: Sequence[str]):
         csv_info = pd.DataFrame(
             [[idx + 1, path] for idx, path in enumerate(csv_paths)],
             columns=['CSV ID', 'CSV Path']
         )
         self.update_csv_info(csv_info)
 
+    def find_csvs(self):
+        directory = filedialog.askdirectory(title='Choose data directory')
+        if not directory:
+            return
+        columns = simpledialog.askstring(
+            title='Find',
+            prompt='Required columns (comma-separated, empty for all files):',
+            parent=self.root
+        )
+        if columns is None:
+            return
+        columns = [column.strip() for column in columns.split(',') if column.strip()]
+        patterns = [f'*{extension}' for extension in readers.get_extensions()]
+        worker = catalog.CatalogWorker(directory, columns, patterns)
+        self.catalog_worker = worker
+        self.import_cancel_button.config(state='normal')
+        self.import_status.set(f'Indexing {directory}...')
+        worker.start()
+        self.root.after(
+            App.IMPORT_POLL_MS, lambda: self.poll_catalog_worker(worker, 0)
+        )
+
+    def poll_catalog_worker(self, worker: catalog.CatalogWorker, indexed: int):
+        while True:
+            try:
+                kind, payload = worker.messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                indexed += 1
+                self.import_status.set(f'Indexed {indexed} new or modified files')
+                continue
+            self.import_cancel_button.config(state='disabled')
+            if kind == 'cancelled':
+                self.import_status.set('Indexing cancelled.')
+            elif kind == 'failed':
+                self.import_status.set('')
+                tk.messagebox.showerror(title='Error', message=payload)
+            else:
+                self.import_status.set(f'Found {len(payload)} files.')
+                if payload:
+                    self.set_csv_paths(payload)
+            return
+        self.root.after(
+            App.IMPORT_POLL_MS, lambda: self.poll_catalog_worker(worker, indexed)
+        )
+
     def check_csv_chosen(self):
         if not self.config_widgets['csv_info'].get_children():
             raise NoCsvError
@@ -541,32 +1046,252 @@ class App:
         if not hasattr(self, 'data_pool'):
             raise EmptyDataPoolError
         else:
-            if self.data_pool == {}:
+            if not self.data_pool:
                 raise EmptyDataPoolError
 
-    def import_csv(self):
+    def check_import_idle(self):
+        if self.import_worker is not None and self.import_worker.is_alive():
+            raise ImportRunningError
+
+    def import_csv(self, on_complete: Callable[[], None] = None):
         try:
             self.check_csv_chosen()
-        except NoCsvError as e:
+            self.check_import_idle()
+        except (NoCsvError, ImportRunningError) as e:
             tk.messagebox.showerror(title='Error', message=e.message)
         else:
-            treeview_csv_info = self.config_widgets['csv_info']
-            notebook_data_pool = self.config_widgets['data_pool']
-            notebook_data_visual = self.config_widgets['data_visual']
-            spinbox_dataset = self.config_widgets['dataset_number']
-            self.data_pool = treeview_csv_info.collect_data_pool()
-            notebook_data_pool.remove_all_tabs()
-            notebook_data_pool.present_data_pool(self.data_pool)
-            notebook_data_visual.remove_all_tabs()
-            notebook_data_visual.create_new_empty_tab('1')
-            notebook_data_visual.fill_data_visual_widgets('1')
-            notebook_data_visual.initialize_widgets('1', self.data_pool)
-            spinbox_dataset.stringvar.set(1)
+            paths = self.config_widgets['csv_info'].get_csv_paths()
+            self.stop_following()
+            worker = data_loading.ImportWorker(
+                paths, App.LOADER_MAX_WORKERS, App.LOADER_USE_PROCESSES,
+                App.LOADER_USE_CACHE, App.LOADER_LAZY
+            )
+            self.import_worker = worker
+            self.import_progressbar.config(
+                maximum=max(worker.total_bytes, 1), value=0
+            )
+            self.import_cancel_button.config(state='normal')
+            self.import_progress = {'files': 0, 'bytes': 0, 'rows': 0}
+            self.import_status.set(f'Reading {len(paths)} files...')
+            self.import_span = instrumentation.span('import_csv').start()
+            worker.start()
+            self.root.after(
+                App.IMPORT_POLL_MS,
+                lambda: self.poll_import_worker(worker, on_complete)
+            )
+
+    def poll_import_worker(
+            self, worker: data_loading.ImportWorker,
+            on_complete: Callable[[], None]):
+        while True:
+            try:
+                kind, payload = worker.messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                self.update_import_progress(worker, payload)
+            else:
+                self.finish_import(kind, payload, on_complete)
+                return
+        self.root.after(
+            App.IMPORT_POLL_MS,
+            lambda: self.poll_import_worker(worker, on_complete)
+        )
+
+    def update_import_progress(
+            self, worker: data_loading.ImportWorker,
+            progress: data_loading.FileProgress):
+        summary = self.import_progress
+        summary['files'] += 1
+        summary['bytes'] += progress['bytes_read']
+        summary['rows'] += progress['rows']
+        self.import_progressbar.config(value=summary['bytes'])
+        self.import_status.set(
+            f"Read {summary['files']}/{len(worker.paths)} files, "
+            f"{summary['bytes'] / 1e6:.1f} MB, {summary['rows']} rows"
+        )
+
+    def finish_import(
+            self, kind: str, payload,
+            on_complete: Callable[[], None]):
+        self.import_cancel_button.config(state='disabled')
+        self.import_progressbar.config(value=0)
+        self.import_span.stop(rows=self.import_progress['rows'])
+        if kind == 'cancelled':
+            self.import_status.set(data_loading.LoadCancelledError.message)
+        elif kind == 'failed':
+            self.import_status.set('')
+            tk.messagebox.showerror(title='Error', message=payload)
+        else:
+            results, errors = payload
+            memory_budget = self.memory_budget_mb * 1024 ** 2
+            if self.import_worker.lazy:
+                data_pool = pool.DataPool(
+                    results, App.LOADER_USE_CACHE, App.DATA_POOL_COMPACT,
+                    memory_budget
+                )
+            else:
+                data_pool = pool.DataPool.from_frames(
+                    self.import_worker.paths, results, App.LOADER_USE_CACHE,
+                    App.DATA_POOL_COMPACT, memory_budget
+                )
+            self.import_status.set(f'Imported {len(data_pool)} files.')
+            if errors:
+                tk.messagebox.showwarning(
+                    title='Warning',
+                    message='Failed to read:\n' + '\n'.join(errors.values())
+                )
+            self.present_data_pool(data_pool)
+            self.update_followers()
+            if on_complete is not None:
+                on_complete()
+
+    def cancel_import(self):
+        for worker in (self.import_worker, self.catalog_worker):
+            if worker is not None and worker.is_alive():
+                worker.cancel()
+                self.import_status.set('Cancelling...')
+
+    @instrumentation.traced('present_data_pool')
+    def present_data_pool(self, data_pool: pool.DataPool):
+        notebook_data_pool = self.config_widgets['data_pool']
+        notebook_data_visual = self.config_widgets['data_visual']
+        spinbox_dataset = self.config_widgets['dataset_number']
+        self.data_pool = data_pool
+        self.bundle_sources = {}
+        self.attach_derived_fields()
+        notebook_data_visual.remove_all_tabs()
+        notebook_data_visual.create_new_empty_tab('1')
+        notebook_data_visual.fill_data_visual_widgets('1')
+        spinbox_dataset.stringvar.set(1)
+        if not self.data_pool:
+            notebook_data_pool.clear_content()
+            return
+        notebook_data_pool.remove_all_tabs()
+        notebook_data_pool.present_data_pool(self.data_pool)
+        notebook_data_visual.initialize_widgets('1', self.derived)
 
     def clear_data_pool(self):
-        self.data_pool: DataPool = {}
+        self.stop_following()
+        self.data_pool = pool.DataPool()
+        self.bundle_sources = {}
+        self.attach_derived_fields()
         self.config_widgets['data_pool'].clear_content()
 
+    def attach_derived_fields(self):
+        fields = [] if self.derived is None else self.derived.definitions()
+        self.derived = expressions.DerivedPool(self.data_pool, fields)
+
+    def show_derived_fields(self):
+        try:
+            self.check_data_pool()
+        except EmptyDataPoolError as e:
+            tk.messagebox.showerror(title='Error', message=e.message)
+        else:
+            notebook = self.config_widgets['data_visual']
+            DerivedFieldsWindow(
+                self.root, self.derived,
+                lambda: notebook.refresh_fieldname_options(self.derived)
+            )
+
+    def toggle_follow(self):
+        self.config_widgets['csv_info'].toggle_live()
+        if hasattr(self, 'data_pool') and self.data_pool:
+            self.update_followers()
+
+    def update_followers(self):
+        live_ids = self.config_widgets['csv_info'].get_live_ids()
+        for tabname in list(self.followers):
+            if tabname not in live_ids:
+                self.followers.pop(tabname)
+                self.data_pool.pinned.discard(tabname)
+        started = set()
+        for tabname in live_ids - set(self.followers):
+            if tabname not in self.data_pool:
+                continue
+            follower = follow.FileFollower(self.data_pool.path(tabname))
+            try:
+                frame = follower.read_all()
+            except (OSError, ValueError) as e:
+                tk.messagebox.showerror(title='Error', message=f'{follower.path}: {e}')
+                continue
+            self.data_pool.set_frame(tabname, frame)
+            self.followers[tabname] = follower
+            started.add(tabname)
+        self.refresh_followed(started)
+
+        if not self.followers:
+            self.stop_following()
+        elif self.follow_job is None:
+            self.follow_job = self.root.after(App.FOLLOW_POLL_MS, self.poll_followers)
+
+    def stop_following(self):
+        if hasattr(self, 'data_pool'):
+            self.data_pool.pinned.difference_update(self.followers)
+        self.followers = {}
+        if self.follow_job is not None:
+            self.root.after_cancel(self.follow_job)
+            self.follow_job = None
+
+    def stop_follower(self, tabname: TabName, error: Exception):
+        follower = self.followers.pop(tabname)
+        self.data_pool.pinned.discard(tabname)
+        self.import_status.set(f'Stopped following {follower.path}: {error}')
+
+    def poll_followers(self):
+        grown = set()
+        for tabname, follower in list(self.followers.items()):
+            try:
+                rows = follower.poll()
+            except follow.FileTruncatedError:
+                try:
+                    frame = follower.read_all()
+                except (OSError, ValueError) as e:
+                    self.stop_follower(tabname, e)
+                else:
+                    self.data_pool.set_frame(tabname, frame)
+                    grown.add(tabname)
+            except (OSError, ValueError) as e:
+                self.stop_follower(tabname, e)
+            else:
+                if not rows.empty:
+                    self.data_pool.append_rows(tabname, rows)
+                    grown.add(tabname)
+        self.refresh_followed(grown)
+
+        if self.followers:
+            self.follow_job = self.root.after(App.FOLLOW_POLL_MS, self.poll_followers)
+        else:
+            self.follow_job = None
+
+    def refresh_followed(self, tabnames: Set[TabName]):
+        if not tabnames:
+            return
+        for tabname in tabnames:
+            self.config_widgets['data_pool'].extend_tab(tabname)
+
+        if self.plot_canvas is None or self.plot_canvas.config is None:
+            return
+        config = self.plot_canvas.config
+        if config.get('analysis', {}).get('method', 'none') != 'none':
+            return  # spectra are recomputed on the next plot, not extended
+        csv_indices = config['data']['csv_indices']
+        if not all(csv_idx in self.data_pool for csv_idx in csv_indices):
+            return
+        indices = {
+            idx for idx, csv_idx in enumerate(csv_indices) if csv_idx in tabnames
+        }
+        if indices:
+            try:
+                data_send = [
+                    self.derived.get_columns(csv_idx, [fieldname['x'], fieldname['y']])
+                    for csv_idx, fieldname in zip(csv_indices, config['data']['fieldnames'])
+                ]
+            except expressions.Error as e:
+                self.import_status.set(e.message)
+                return
+            self.plot_canvas.extend(data_send, indices)
+
     def modify_data_visual_tabs(self, tgt_num: int):
         notebook = self.config_widgets['data_visual']
         exist_num = len(self.config_widgets['data_visual'].tabs())
@@ -574,7 +1299,7 @@ class App:
             tabname = str(tgt_num)
             notebook.create_new_empty_tab(tabname)
             notebook.fill_data_visual_widgets(tabname)
-            notebook.initialize_widgets(tabname, self.data_pool)
+            notebook.initialize_widgets(tabname, self.derived)
         elif tgt_num < exist_num:
             tabname = str(exist_num)
             notebook.remove_tab(tabname)
@@ -611,7 +1336,8 @@ class App:
         notebook = self.config_widgets['data_visual']
         for tab in notebook.tabs_.values():
             csv_idx = tab.widgets['csv_idx'].get()
-            data_send.append(self.data_pool[csv_idx])
+            columns = [tab.widgets['field_x'].get(), tab.widgets['field_y'].get()]
+            data_send.append(self.derived.get_columns(csv_idx, columns))
         return data_send
 
     def collect_configurations_csvs(self):
@@ -630,6 +1356,7 @@ class App:
                 'x': tab.widgets['field_x'].get(),
                 'y': tab.widgets['field_y'].get()
             })
+        self.config_values['data']['derived_fields'] = self.derived.definitions()
 
     def collect_configurations_figure(self):
         widgets = self.config_widgets['figure_visual']
@@ -641,6 +1368,14 @@ class App:
         ]
         values['grid_visible'] = widgets['grid_visible'].get()
         values['legend_visible'] = widgets['legend_visible'].get()
+        values['decimation'] = widgets['decimation'].get()
+
+    def collect_configurations_analysis(self):
+        widgets = self.config_widgets['figure_visual']
+        values = self.config_values['analysis']
+        values['method'] = widgets['analysis'].get()
+        if values['method'] == 'response_spectrum':
+            values['damping'] = analysis.parse_damping(widgets['damping'].variable.get())
 
     def collect_configurations_axes(self):
         widgets = self.config_widgets['axis_x']
@@ -667,51 +1402,160 @@ class App:
         else:
             values['lim'] = None
 
+    def get_plot_requirements(self) -> Dict[TabName, Sequence[str]]:
+        requirements = {}
+        for tab in self.config_widgets['data_visual'].tabs_.values():
+            csv_idx = tab.widgets['csv_idx'].get()
+            columns = [tab.widgets['field_x'].get(), tab.widgets['field_y'].get()]
+            self.derived.get_requirements(csv_idx, columns, requirements)
+        return requirements
+
     def plot(self):
         try:
             self.check_data_pool()
-        except EmptyDataPoolError as e:
+            requirements = self.get_plot_requirements()
+        except (EmptyDataPoolError, expressions.Error) as e:
             tk.messagebox.showerror(title='Error', message=e.message)
         else:
+            self.import_status.set('Loading columns...')
+            load_columns(
+                self.root, self.data_pool, requirements,
+                self.plot_loaded, self.show_column_load_error
+            )
+
+    def show_column_load_error(self, message: str):
+        self.import_status.set('')
+        tk.messagebox.showerror(title='Error', message=message)
+
+    @instrumentation.traced('plot')
+    def plot_loaded(self):
+        self.import_status.set('')
+        try:
             data_send = self.collect_data_send()
+        except expressions.Error as e:
+            tk.messagebox.showerror(title='Error', message=e.message)
+        else:
             self.config_values = plotting.get_initial_configuration()
             self.collect_configurations_csvs()
             self.collect_configurations_data()
             self.collect_configurations_figure()
             self.collect_configurations_axes()
-            plotting.plot_by_app(self.config_values, data_send)
+            try:
+                self.collect_configurations_analysis()
+                config, data_send = analysis.apply(self.config_values, data_send)
+            except analysis.Error as e:
+                tk.messagebox.showerror(title='Error', message=e.message)
+                return
+            if self.plot_external.get():
+                self.last_figure = plotting.plot_by_app(
+                    config, data_send, App.MAX_EXTERNAL_FIGURES
+                )
+            else:
+                self.get_plot_canvas().plot(config, data_send)
+                self.last_figure = self.plot_canvas.figure
 
     def copy(self):
         try:
-            plotting.copy_to_clipboard()
-        except plotting.FigureNumsError as e:
+            plotting.copy_to_clipboard(self.last_figure)
+        except (plotting.FigureNumsError, plotting.ClipboardUnavailableError) as e:
             tk.messagebox.showerror(title='Error', message=e.message)
 
+    def show_cache_info(self):
+        info = csv_cache.get_info()
+        info['entries'] = info['entries'][:App.CACHE_INFO_ENTRIES]
+        message = csv_cache.format_info(info)
+        tk.messagebox.showinfo(title='Cache', message=message)
+
+    def clear_cache(self):
+        if tk.messagebox.askyesno(title='Cache', message='Clear the CSV cache?'):
+            csv_cache.clear()
+
+    def update_memory_usage(self):
+        usage = self.data_pool.get_memory_usage() if hasattr(self, 'data_pool') else 0
+        self.memory_status.set(
+            f'Memory: {usage / 1024 ** 2:.1f} / {self.memory_budget_mb} MB'
+        )
+        self.root.after(App.MEMORY_POLL_MS, self.update_memory_usage)
+
+    def set_memory_budget(self):
+        budget = simpledialog.askinteger(
+            title='Memory',
+            prompt='Data pool memory budget [MB]:',
+            initialvalue=self.memory_budget_mb,
+            minvalue=1,
+            parent=self.root
+        )
+        if budget is None:
+            return
+        self.memory_budget_mb = budget
+        if hasattr(self, 'data_pool'):
+            self.data_pool.memory_budget = budget * 1024 ** 2
+            self.data_pool.enforce_budget()
+
+    def show_diagnostics(self):
+        DiagnosticsWindow(self.root)
+
     def new(self):
         os.execl(sys.executable, sys.executable, *sys.argv)
 
     def open(self):
         # Read configs
-        files = [('JSON File', '*.json'), ]
-        file = filedialog.askopenfile(
+        files = [('JSON File', '*.json'), ('Bundle', f'*{bundle.EXTENSION}')]
+        path = filedialog.askopenfilename(
             filetypes=files,
             defaultextension=files
         )
-        configs = json.load(file)
+        if not path:
+            return
+        if bundle.is_bundle(path):
+            self.open_bundle(path)
+            return
+        with open(path, 'r') as file:
+            configs = json.load(file)
 
         # Update csv info & data pool
+        self.update_csv_info(self.get_csv_info(configs))
+        self.import_csv(on_complete=lambda: self.apply_configurations(configs))
+
+    def get_csv_info(self, configs: plotting.Config) -> pd.DataFrame:
         indices = configs['csvs']['indices']
         paths = configs['csvs']['paths']
-        csv_info = pd.DataFrame(
+        return pd.DataFrame(
             data=[[idx, path] for idx, path in zip(indices, paths)],
             columns=['CSV ID', 'CSV Path']
         )
-        self.update_csv_info(csv_info)
-        self.import_csv()
 
+    def open_bundle(self, path: str):
+        try:
+            project = bundle.Bundle(path)
+            changed = project.changed_sources()
+            data_pool = project.get_data_pool(
+                App.LOADER_USE_CACHE, App.DATA_POOL_COMPACT,
+                self.memory_budget_mb * 1024 ** 2
+            )
+        except bundle.Error as e:
+            tk.messagebox.showerror(title='Error', message=e.message)
+            return
+        configs = project.config
+        self.update_csv_info(self.get_csv_info(configs))
+        self.present_data_pool(data_pool)
+        self.bundle_sources = project.sources
+        self.apply_configurations(configs)
+        self.import_status.set(f'Opened {len(data_pool)} datasets from the bundle.')
+        if changed:
+            tk.messagebox.showwarning(
+                title='Warning',
+                message='Source files changed after the bundle was saved. '
+                        'The bundled data is shown:\n'
+                        + '\n'.join(data_pool.path(tabname) for tabname in changed)
+            )
+
+    def apply_configurations(self, configs: plotting.Config):
         # Update data visual
         dataset_num = len(configs['data']['csv_indices'])
         notebook = self.config_widgets['data_visual']
+        self.derived.set_fields(configs['data'].get('derived_fields', []))
+        notebook.refresh_fieldname_options(self.derived)
         for idx in range(dataset_num):
             tgt_num = idx + 1
             csv_idx = configs['data']['csv_indices'][idx]
@@ -735,6 +1579,12 @@ class App:
         widgets['height'].variable.set(size[1])
         widgets['grid_visible'].set(grid_visible)
         widgets['legend_visible'].set(legend_visible)
+        widgets['decimation'].set(
+            configs['figure'].get('decimation', decimation.DEFAULT_METHOD)
+        )
+        options = configs.get('analysis') or analysis.get_initial_configuration()
+        widgets['analysis'].set(options['method'])
+        widgets['damping'].variable.set(', '.join(f'{ratio:g}' for ratio in options['damping']))
 
         # Update axis visual - x
         label = configs['axis_x']['label']
@@ -780,6 +1630,7 @@ class App:
         self.collect_configurations_data()
         self.collect_configurations_figure()
         self.collect_configurations_axes()
+        self.collect_configurations_analysis()
         files = [('JSON File', '*.json'), ]
         file = filedialog.asksaveasfile(
             filetypes=files,
@@ -788,6 +1639,52 @@ class App:
         json.dump(self.config_values, file, indent=4)
         file.close()
 
+    def save_with_data(self):
+        try:
+            self.check_data_pool()
+        except EmptyDataPoolError as e:
+            tk.messagebox.showerror(title='Error', message=e.message)
+            return
+        self.config_values = plotting.get_initial_configuration()
+        self.collect_configurations_csvs()
+        self.collect_configurations_data()
+        self.collect_configurations_figure()
+        self.collect_configurations_axes()
+        self.collect_configurations_analysis()
+        files = [('Bundle', f'*{bundle.EXTENSION}'), ]
+        path = filedialog.asksaveasfilename(
+            filetypes=files,
+            defaultextension=bundle.EXTENSION
+        )
+        if not path:
+            return
+        worker = bundle.BundleWriter(
+            path, self.config_values, self.data_pool, self.bundle_sources
+        )
+        self.import_status.set('Saving bundle...')
+        worker.start()
+        self.root.after(App.IMPORT_POLL_MS, lambda: self.poll_bundle_writer(worker))
+
+    def poll_bundle_writer(self, worker: bundle.BundleWriter):
+        while True:
+            try:
+                kind, payload = worker.messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                done, total = payload
+                self.import_status.set(f'Saving bundle: {done}/{total} datasets')
+            elif kind == 'failed':
+                self.import_status.set('')
+                tk.messagebox.showerror(title='Error', message=payload)
+                return
+            else:
+                self.import_status.set(
+                    f'Saved {len(worker.data_pool)} datasets with the project.'
+                )
+                return
+        self.root.after(App.IMPORT_POLL_MS, lambda: self.poll_bundle_writer(worker))
+
     def close(self):
         self.root.destroy()
 
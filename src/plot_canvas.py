@@ -0,0 +1,76 @@
+import copy
+import tkinter as tk
+from tkinter import ttk
+from typing import Sequence, Set, Union
+
+import pandas as pd
+from matplotlib.backends.backend_tkagg import (
+    FigureCanvasTkAgg, NavigationToolbar2Tk
+)
+from matplotlib.figure import Figure
+
+import plotting
+from instrumentation import span, tracer
+
+
+class PlotCanvas:
+    '''
+    Matplotlib figure embedded in a Tk frame and reused across plots. Each
+    call to `plot` diffs the new configuration and data against the last
+    ones and only updates the artists that changed.
+    '''
+
+    def __init__(self, frame: Union[tk.Frame, ttk.Frame]):
+        self.figure = Figure(tight_layout=True)
+        self.ax = self.figure.add_subplot()
+        self.canvas = FigureCanvasTkAgg(self.figure, master=frame)
+        self.toolbar = NavigationToolbar2Tk(self.canvas, frame, pack_toolbar=False)
+        self.toolbar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.config: plotting.Config = None
+        self.fingerprints: Sequence = None
+
+    def plot(self, config: plotting.Config, data_pool: Sequence[pd.DataFrame]):
+        changes = plotting.get_config_changes(self.config, config)
+        fingerprints = plotting.get_data_fingerprints(config, data_pool)
+        if fingerprints != self.fingerprints:
+            changes.add('lines')
+        if not changes:
+            return
+
+        if 'size' in changes:
+            self.resize(config['figure']['size'])
+            changes.discard('size')
+        with span('update_axes'):
+            plotting.update_axes(config, data_pool, self.ax, changes)
+        self.config = copy.deepcopy(config)
+        self.fingerprints = fingerprints
+        if tracer.enabled:
+            with span('render'):
+                self.canvas.draw()  # drawn now to be timed
+        else:
+            self.canvas.draw_idle()
+
+    def extend(self, data_pool: Sequence[pd.DataFrame], indices: Set[int]):
+        '''
+        Update the series at `indices` of the current plot to data that grew
+        without rebuilding the axes.
+        '''
+        if self.config is None:
+            return
+        with span('extend_lines'):
+            plotting.extend_lines(self.config, data_pool, self.ax, indices)
+        self.fingerprints = None  # not rehashed on every poll; the next plot redraws
+        self.canvas.draw_idle()
+
+    def resize(self, size: Sequence[float]):
+        width, height = size
+        dpi = self.figure.dpi
+        self.canvas.get_tk_widget().config(width=width * dpi, height=height * dpi)
+
+    def clear(self):
+        plotting.remove_lines(self.ax)
+        self.ax.clear()
+        self.config = None
+        self.fingerprints = None
+        self.canvas.draw_idle()
@@ -1,11 +1,32 @@
 import json
 from io import BytesIO
 from pathlib import Path
-from typing import Callable, Dict, Sequence, Tuple, TypedDict
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple, TypedDict
 
 import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.collections import LineCollection
 import pandas as pd
-import win32clipboard
+
+try:
+    import win32clipboard  # Windows only (pywin32)
+except ImportError:
+    win32clipboard = None
+
+import analysis
+import catalog
+import chunked
+import data_loading
+import decimation
+import expressions
+from instrumentation import span
+
+
+MAX_EXTERNAL_FIGURES = 5
+DATA_PATTERN = '*.csv'
+MAX_FETCH_ROWS = 2_000_000  # exact rows read from out-of-core files on zoom
+BULK_THRESHOLD = 50  # series drawn as one LineCollection from this many on
+BULK_GID = 'bulk-series'
 
 
 class CsvsConfig(TypedDict):
@@ -15,9 +36,12 @@ class CsvsConfig(TypedDict):
 
 class DataConfig(TypedDict):
     directory: str  # no use in "plot_by_app"
+    pattern: str  # glob of the data files in directory, '*.csv' if missing
+    columns: Sequence[str]  # optional, keep only files having all of these
     csv_indices: Sequence[int]  # only for open and save in gui
     labels: Sequence[str]
     fieldnames: Sequence[Dict[str, str]]
+    derived_fields: Sequence[expressions.DerivedField]  # optional
 
 
 class FigureConfig(TypedDict):
@@ -25,6 +49,8 @@ class FigureConfig(TypedDict):
     size: Sequence[float]
     grid_visible: bool
     legend_visible: bool
+    decimation: str  # 'none', 'm4' or 'lttb'
+    bulk_threshold: int  # optional, BULK_THRESHOLD if missing
 
 
 class AxisConfig(TypedDict):
@@ -39,6 +65,7 @@ class Config(TypedDict):
     figure: FigureConfig
     axis_x: AxisConfig
     axis_y: AxisConfig
+    analysis: analysis.AnalysisConfig  # optional, no analysis if missing
 
 
 class Error(Exception):
@@ -51,6 +78,20 @@ class FigureNumsError(Error):
     message = 'No figure to copy.'
 
 
+class ClipboardUnavailableError(Error):
+    '''Exception raised when the platform has no supported clipboard.'''
+    message = 'Copying figures needs pywin32 on Windows.'
+
+
+class DataLoadError(Error):
+    '''Exception raised when some csv files could not be read.'''
+
+    def __init__(self, errors: Sequence[str]):
+        self.errors = errors
+        self.message = 'Failed to read:\n' + '\n'.join(errors)
+        super().__init__(self.message)
+
+
 def get_initial_configuration():
     config_ini: Config = {
         'csvs': {
@@ -61,13 +102,15 @@ def get_initial_configuration():
             'directory': '',
             'csv_indices': [],
             'labels': [],
-            'fieldnames': []
+            'fieldnames': [],
+            'derived_fields': []
         },
         'figure': {
             'title': '',
             'size': [],
             'grid_visible': False,
-            'legend_visible': False
+            'legend_visible': False,
+            'decimation': decimation.DEFAULT_METHOD
         },
         'axis_x': {
             'label': '',
@@ -78,7 +121,8 @@ def get_initial_configuration():
             'label': '',
             'scale': '',
             'lim': []
-        }
+        },
+        'analysis': analysis.get_initial_configuration()
     }
     return config_ini
 
@@ -91,10 +135,52 @@ def read_configurations(config_name: str) -> Config:
     return config
 
 
-def get_data_pool(config: Config) -> Sequence[pd.DataFrame]:
+def list_csvs(config: Config) -> Sequence[Path]:
+    '''
+    Files of the data directory sorted by path, as dataset i reads the i-th
+    one. With config['data']['columns'], files are filtered through the
+    catalog of the directory, which only reads new or modified files.
+    '''
     data_dir = config['data']['directory']
-    csvs = list(Path(data_dir).glob('*.csv'))
-    return [pd.read_csv(path) for path in csvs]
+    pattern = config['data'].get('pattern', DATA_PATTERN)
+    columns = config['data'].get('columns')
+    if not columns:
+        return sorted(Path(data_dir).glob(pattern))
+    return [Path(path) for path in catalog.find_files(data_dir, columns, [pattern])]
+
+
+def get_required_columns(config: Config) -> Dict[int, Sequence[str]]:
+    '''Raw columns to read for every plotted dataset, by position.'''
+    required = {}
+    for idx, fieldname in enumerate(config['data']['fieldnames']):
+        columns = required.setdefault(idx, [])
+        for column in (fieldname['x'], fieldname['y']):
+            if column not in columns:
+                columns.append(column)
+    return expressions.expand_required_columns(config, required)
+
+
+def get_data_pool(
+        config: Config, max_workers: int = None,
+        use_processes: bool = False,
+        use_cache: bool = True,
+        project_columns: bool = True) -> Sequence[pd.DataFrame]:
+    '''
+    With `project_columns`, only the files and columns referenced by
+    config['data']['fieldnames'] are parsed.
+    '''
+    paths = dict(enumerate(list_csvs(config)))
+    usecols = None
+    if project_columns:
+        usecols = get_required_columns(config)
+        paths = {idx: path for idx, path in paths.items() if idx in usecols}
+    frames, errors = data_loading.load_csvs(
+        paths, max_workers, use_processes,
+        use_cache=use_cache, usecols=usecols
+    )
+    if errors:
+        raise DataLoadError(list(errors.values()))
+    return expressions.evaluate_frames(config, list(frames.values()))
 
 
 def initialize_figure(config: Config) -> Tuple[plt.Figure, plt.Axes]:
@@ -118,62 +204,444 @@ def get_plot_function(config: Config, ax: plt.Axes):
     return plot_function
 
 
+def get_pixel_width(config: Config) -> int:
+    width = config['figure']['size'][0]
+    return int(width * plt.rcParams['figure.dpi'])
+
+
+class LevelOfDetailLine:
+    '''
+    Keep a line at the resolution its visible x-range needs by re-querying
+    the series pyramid whenever the axes limits change.
+    '''
+
+    def __init__(self, line: plt.Line2D, pyramid: decimation.MinMaxPyramid):
+        self.line = line
+        self.pyramid = pyramid
+        self.ax = line.axes
+        line.lod = self  # callbacks only hold a weak reference
+        self.cid = self.ax.callbacks.connect('xlim_changed', self.refine)
+
+    def disconnect(self):
+        self.ax.callbacks.disconnect(self.cid)
+
+    def get_pixel_width(self) -> int:
+        return max(int(self.ax.get_window_extent().width), 1)
+
+    def refine(self, ax: plt.Axes):
+        xmin, xmax = sorted(ax.get_xlim())
+        values_x, values_y = self.pyramid.query(xmin, xmax, self.get_pixel_width())
+        self.line.set_data(values_x, values_y)
+        ax.figure.canvas.draw_idle()
+
+
+class OutOfCoreLine(LevelOfDetailLine):
+    '''
+    Line drawn from the overview of a file too large to load. Once the
+    visible x-range spans at most MAX_FETCH_ROWS rows, the exact rows are
+    read from the file through its block index; wider ranges fall back to
+    the overview.
+    '''
+
+    def __init__(
+            self, line: plt.Line2D, source: chunked.ChunkedFile,
+            fieldname: Dict[str, str], log_x: bool,
+            pyramid: Optional[decimation.MinMaxPyramid] = None):
+        self.source = source
+        self.fieldname = fieldname
+        self.log_x = log_x
+        self.overview = line.get_data()
+        super().__init__(line, pyramid)
+
+    def refine(self, ax: plt.Axes):
+        xmin, xmax = sorted(ax.get_xlim())
+        column_x, column_y = self.fieldname['x'], self.fieldname['y']
+        if self.source.count_rows(column_x, xmin, xmax) > MAX_FETCH_ROWS:
+            if self.pyramid is not None:
+                super().refine(ax)
+            else:
+                self.line.set_data(*self.overview)
+                ax.figure.canvas.draw_idle()
+            return
+        df = self.source.read_range(column_x, xmin, xmax, [column_x, column_y])
+        values_x, values_y = decimation.decimate(
+            df[column_x], df[column_y], self.get_pixel_width(), 'm4', self.log_x
+        )
+        self.line.set_data(values_x, values_y)
+        ax.figure.canvas.draw_idle()
+
+
+def get_series(
+        values_x, values_y, method: str, pixel_width: int,
+        log_x: bool) -> Tuple[np.ndarray, np.ndarray, Optional[decimation.MinMaxPyramid]]:
+    pyramid = None
+    if method == 'm4' and len(values_x) > 4 * pixel_width:
+        pyramid = decimation.get_pyramid(values_x, values_y, log_x)
+    if pyramid is not None:
+        values_x, values_y = pyramid.query(None, None, pixel_width)
+        return values_x, values_y, pyramid
+    values_x, values_y = decimation.decimate(
+        values_x, values_y, pixel_width, method, log_x
+    )
+    return values_x, values_y, None
+
+
 def plot_data(
         config: Config, data_pool: Sequence[pd.DataFrame],
         plot_function: Callable):
 
     fieldnames = config['data']['fieldnames']
     labels = config['data']['labels']
-    for df, fieldname, label in zip(data_pool, fieldnames, labels):
-        values_x = df[fieldname['x']]
-        values_y = df[fieldname['y']]
-        plot_function(values_x, values_y, label=label)
+    method = config['figure'].get('decimation', decimation.DEFAULT_METHOD)
+    pixel_width = get_pixel_width(config)
+    log_x = config['axis_x']['scale'] == 'log'
+    with span('plot_data', rows=sum(map(len, data_pool))):
+        for df, fieldname, label in zip(data_pool, fieldnames, labels):
+            values_x, values_y, pyramid = get_series(
+                df[fieldname['x']], df[fieldname['y']],
+                method, pixel_width, log_x
+            )
+            lines = plot_function(values_x, values_y, label=label)
+            source = data_loading.get_out_of_core(df)
+            if source is not None:
+                OutOfCoreLine(lines[0], source, fieldname, log_x, pyramid)
+            elif pyramid is not None:
+                LevelOfDetailLine(lines[0], pyramid)
+
+
+def is_bulk(config: Config, data_pool: Sequence[pd.DataFrame]) -> bool:
+    '''
+    Whether to draw with plot_bulk: from the bulk threshold on, when every
+    series is numeric. Strings, categories and dates keep the per-line path,
+    which converts them through matplotlib's units.
+    '''
+    fieldnames = config['data']['fieldnames']
+    threshold = config['figure'].get('bulk_threshold', BULK_THRESHOLD)
+    if len(fieldnames) < threshold:
+        return False
+    return all(
+        pd.api.types.is_numeric_dtype(df[fieldname[axis]])
+        for df, fieldname in zip(data_pool, fieldnames) for axis in ('x', 'y')
+    )
 
 
-def set_axes(config: Config, ax: plt.Axes):
-    ax.set_title(config['figure'].get('title', ''))
-    ax.set_xlabel(config['axis_x'].get('label', ''))
-    ax.set_xlim(config['axis_x'].get('lim', ''))
-    ax.set_ylabel(config['axis_y'].get('label', ''))
-    ax.set_ylim(config['axis_y'].get('lim', ''))
-    ax.grid(
-        visible=config['figure'].get('grid_visible', ''),
-        axis='both'
+def get_bulk_label(labels: Sequence[str]) -> str:
+    '''One legend entry standing for every series of a collection.'''
+    if len(set(labels)) == 1:
+        return f'{labels[0]} ({len(labels)} series)'
+    return f'{labels[0]} ... {labels[-1]} ({len(labels)} series)'
+
+
+def pack_series(
+        series: Sequence[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, List[np.ndarray]]:
+    '''
+    Copy every (x, y) series into one contiguous (points, 2) array and
+    return it with a view of it per series.
+    '''
+    sizes = [len(values_x) for values_x, _ in series]
+    packed = np.empty((sum(sizes), 2))
+    segments = []
+    start = 0
+    for size, (values_x, values_y) in zip(sizes, series):
+        segment = packed[start:start + size]
+        segment[:, 0] = values_x
+        segment[:, 1] = values_y
+        segments.append(segment)
+        start += size
+    return packed, segments
+
+
+def get_bulk_segments(
+        config: Config,
+        data_pool: Sequence[pd.DataFrame]) -> Tuple[np.ndarray, List[np.ndarray]]:
+    fieldnames = config['data']['fieldnames']
+    method = config['figure'].get('decimation', decimation.DEFAULT_METHOD)
+    pixel_width = get_pixel_width(config)
+    log_x = config['axis_x']['scale'] == 'log'
+    series = []
+    for df, fieldname in zip(data_pool, fieldnames):
+        values_x, values_y, _ = get_series(
+            df[fieldname['x']], df[fieldname['y']],
+            method, pixel_width, log_x
+        )
+        series.append((values_x, values_y))
+    return pack_series(series)
+
+
+def get_bulk_collections(ax: plt.Axes) -> List[LineCollection]:
+    return [
+        collection for collection in ax.collections
+        if collection.get_gid() == BULK_GID
+    ]
+
+
+def plot_bulk(config: Config, data_pool: Sequence[pd.DataFrame], ax: plt.Axes):
+    '''
+    Draw every series as one segment of a single LineCollection backed by
+    one contiguous array, with the colors of the axes color cycle and one
+    legend entry. Series are decimated once to the figure width and are not
+    refined on zoom.
+    '''
+    labels = config['data']['labels']
+    with span('plot_bulk', rows=sum(map(len, data_pool))):
+        packed, segments = get_bulk_segments(config, data_pool)
+        cycle = plt.rcParams['axes.prop_cycle'].by_key()['color']
+        colors = [cycle[idx % len(cycle)] for idx in range(len(segments))]
+        collection = LineCollection(
+            segments, colors=colors,
+            linewidths=plt.rcParams['lines.linewidth'],
+            label=get_bulk_label(labels), gid=BULK_GID
+        )
+        collection.packed = packed
+        ax.set_xscale(config['axis_x']['scale'] or 'linear')
+        ax.set_yscale(config['axis_y']['scale'] or 'linear')
+        ax.add_collection(collection, autolim=False)
+        relim(ax)
+        ax.autoscale_view()
+
+
+def relim(ax: plt.Axes):
+    '''Like Axes.relim, also counting the series of bulk collections.'''
+    ax.relim()
+    for collection in get_bulk_collections(ax):
+        points = collection.packed[np.isfinite(collection.packed).all(axis=1)]
+        if len(points):
+            ax.update_datalim(points)
+
+
+def plot_series(
+        config: Config, data_pool: Sequence[pd.DataFrame], ax: plt.Axes,
+        plot_function: Callable):
+    '''Draw with plot_bulk from the bulk threshold on, else with plot_data.'''
+    if is_bulk(config, data_pool):
+        plot_bulk(config, data_pool, ax)
+    else:
+        plot_data(config, data_pool, plot_function)
+
+
+def extend_pyramid(
+        pyramid: decimation.MinMaxPyramid, df: pd.DataFrame,
+        fieldname: Dict[str, str]) -> bool:
+    '''
+    Add the rows of `df` beyond those the pyramid was built from, without
+    rebuilding it. False when `df` is not a continuation of the series.
+    '''
+    if len(df) < pyramid.rows:
+        return False
+    appended = df.iloc[pyramid.rows:]
+    decimation.forget_pyramid(pyramid)  # no longer matches its cache key
+    return pyramid.extend(
+        appended[fieldname['x']].to_numpy(), appended[fieldname['y']].to_numpy()
     )
-    if config['figure']['legend_visible']:
-        ax.legend()
 
 
-def main(config_name: str = 'config.json'):
-    config = read_configurations(config_name)
-    data_pool = get_data_pool(config)
+def extend_lines(
+        config: Config, data_pool: Sequence[pd.DataFrame], ax: plt.Axes,
+        indices: Set[int] = None):
+    '''
+    Give the lines drawn by plot_data the data of series that grew, keeping
+    the artists, their styles and the legend. Only the series at `indices`
+    are updated (all when None). Lines refined through a pyramid only add
+    the appended rows to it. Axes without fixed limits are rescaled to the
+    new data.
+    '''
+    fieldnames = config['data']['fieldnames']
+    method = config['figure'].get('decimation', decimation.DEFAULT_METHOD)
+    pixel_width = get_pixel_width(config)
+    log_x = config['axis_x']['scale'] == 'log'
+    for collection in get_bulk_collections(ax):
+        collection.packed, segments = get_bulk_segments(config, data_pool)
+        collection.set_segments(segments)
+    for idx, (line, df, fieldname) in enumerate(zip(ax.lines, data_pool, fieldnames)):
+        if indices is not None and idx not in indices:
+            continue
+        lod = getattr(line, 'lod', None)
+        if type(lod) is LevelOfDetailLine and extend_pyramid(lod.pyramid, df, fieldname):
+            line.set_data(*lod.pyramid.query(None, None, pixel_width))
+            continue
+        values_x, values_y, pyramid = get_series(
+            df[fieldname['x']], df[fieldname['y']],
+            method, pixel_width, log_x
+        )
+        if hasattr(line, 'lod'):
+            line.lod.disconnect()
+            del line.lod
+        line.set_data(values_x, values_y)
+        if pyramid is not None:
+            LevelOfDetailLine(line, pyramid)
+
+    relim(ax)
+    for axis in ('x', 'y'):
+        if not config[f'axis_{axis}'].get('lim'):
+            ax.autoscale(enable=True, axis=axis)
+
+
+def set_axes(config: Config, ax: plt.Axes):
+    with span('set_axes'):
+        ax.set_title(config['figure'].get('title', ''))
+        ax.set_xlabel(config['axis_x'].get('label', ''))
+        ax.set_xlim(config['axis_x'].get('lim', ''))
+        ax.set_ylabel(config['axis_y'].get('label', ''))
+        ax.set_ylim(config['axis_y'].get('lim', ''))
+        ax.grid(
+            visible=config['figure'].get('grid_visible', ''),
+            axis='both'
+        )
+        if config['figure']['legend_visible']:
+            ax.legend()
+
+
+def get_data_fingerprints(
+        config: Config, data_pool: Sequence[pd.DataFrame]) -> Sequence[Tuple]:
+    fingerprints = []
+    for df, fieldname in zip(data_pool, config['data']['fieldnames']):
+        fingerprints.append((
+            decimation.get_fingerprint(df[fieldname['x']].to_numpy()),
+            decimation.get_fingerprint(df[fieldname['y']].to_numpy())
+        ))
+    return fingerprints
+
+
+def get_config_changes(old: Optional[Config], new: Config) -> Set[str]:
+    '''
+    Name the parts of the figure that differ between two configurations:
+    'lines', 'labels', 'title', 'axis_labels', 'lims', 'scale', 'grid',
+    'legend' and 'size'. Everything is reported when `old` is None.
+    '''
+    if old is None:
+        return {
+            'lines', 'labels', 'title', 'axis_labels', 'lims',
+            'scale', 'grid', 'legend', 'size'
+        }
+
+    changes = set()
+    old_method = old['figure'].get('decimation', decimation.DEFAULT_METHOD)
+    new_method = new['figure'].get('decimation', decimation.DEFAULT_METHOD)
+    if old['data']['fieldnames'] != new['data']['fieldnames'] \
+            or old['data']['csv_indices'] != new['data']['csv_indices'] \
+            or old_method != new_method:
+        changes.add('lines')
+    if old['data']['labels'] != new['data']['labels']:
+        changes.add('labels')
+    if old['figure']['title'] != new['figure']['title']:
+        changes.add('title')
+    for axis in ('axis_x', 'axis_y'):
+        if old[axis]['label'] != new[axis]['label']:
+            changes.add('axis_labels')
+        if old[axis]['lim'] != new[axis]['lim']:
+            changes.add('lims')
+        if old[axis]['scale'] != new[axis]['scale']:
+            changes.update({'scale', 'lines'})
+    if old['figure']['grid_visible'] != new['figure']['grid_visible']:
+        changes.add('grid')
+    if old['figure']['legend_visible'] != new['figure']['legend_visible']:
+        changes.add('legend')
+    if list(old['figure']['size']) != list(new['figure']['size']):
+        changes.add('size')
+    return changes
+
+
+def remove_lines(ax: plt.Axes):
+    for line in list(ax.lines):
+        if hasattr(line, 'lod'):
+            line.lod.disconnect()
+        line.remove()
+    for collection in get_bulk_collections(ax):
+        collection.remove()
+    ax.set_prop_cycle(None)
+
+
+def update_axes(
+        config: Config, data_pool: Sequence[pd.DataFrame],
+        ax: plt.Axes, changes: Set[str]):
+    '''
+    Apply only the `changes` reported by get_config_changes to an existing
+    axes instead of rebuilding the figure.
+    '''
+    if 'size' in changes:
+        ax.figure.set_size_inches(config['figure']['size'])
+    if 'scale' in changes:
+        ax.set_xscale(config['axis_x']['scale'])
+        ax.set_yscale(config['axis_y']['scale'])
+    if 'lines' in changes:
+        remove_lines(ax)
+        plot_series(config, data_pool, ax, ax.plot)
+        changes = changes | {'lims', 'legend'}
+    elif 'labels' in changes:
+        for line, label in zip(ax.lines, config['data']['labels']):
+            line.set_label(label)
+        for collection in get_bulk_collections(ax):
+            collection.set_label(get_bulk_label(config['data']['labels']))
+        changes = changes | {'legend'}
+    if 'title' in changes:
+        ax.set_title(config['figure'].get('title', ''))
+    if 'axis_labels' in changes:
+        ax.set_xlabel(config['axis_x'].get('label', ''))
+        ax.set_ylabel(config['axis_y'].get('label', ''))
+    if 'lims' in changes:
+        for axis, set_lim in (('x', ax.set_xlim), ('y', ax.set_ylim)):
+            lim = config[f'axis_{axis}'].get('lim')
+            if lim:
+                set_lim(lim)
+            else:
+                relim(ax)
+                ax.autoscale(enable=True, axis=axis)
+    if 'grid' in changes:
+        ax.grid(visible=bool(config['figure'].get('grid_visible')), axis='both')
+    if 'legend' in changes:
+        legend = ax.get_legend()
+        if legend is not None:
+            legend.remove()
+        if config['figure']['legend_visible']:
+            ax.legend()
+
+
+def draw_figure(config: Config, data_pool: Sequence[pd.DataFrame]) -> plt.Figure:
     fig, ax = initialize_figure(config)
     plot_function = get_plot_function(config, ax)
-    plot_data(config, data_pool, plot_function)
+    plot_series(config, data_pool, ax, plot_function)
     set_axes(config, ax)
+    return fig
+
+
+def main(config_name: str = 'config.json'):
+    config = read_configurations(config_name)
+    data_pool = get_data_pool(config)
+    draw_figure(config, data_pool)
     plt.show()
 
 
-def plot_by_app(config: Config, data_pool: Sequence[pd.DataFrame]):
-    fig, ax = initialize_figure(config)
-    plot_function = get_plot_function(config, ax)
-    plot_data(config, data_pool, plot_function)
-    set_axes(config, ax)
+def close_old_figures(max_figures: int):
+    fignums = plt.get_fignums()
+    for fignum in fignums[:max(len(fignums) - max_figures, 0)]:
+        plt.close(fignum)
+
+
+def plot_by_app(
+        config: Config, data_pool: Sequence[pd.DataFrame],
+        max_figures: int = MAX_EXTERNAL_FIGURES) -> plt.Figure:
+    with span('plot_by_app'):
+        close_old_figures(max_figures - 1)
+        fig = draw_figure(config, data_pool)
     plt.show()
+    return fig
 
 
-def copy_to_clipboard():
+def copy_to_clipboard(fig: plt.Figure = None):
     '''
     Honestly, I don't know how it works. Here is the reference I found.
     https://stackoverflow.com/questions/7050448/write-image-to-windows-clipboard-in-python-with-pil-and-win32clipboard
 
     This method can copy the figure image and paste to MS office but not Paint.
     '''
-    fignums = plt.get_fignums()  # if no fig -> []
-    if not fignums:
-        raise FigureNumsError
+    if win32clipboard is None:
+        raise ClipboardUnavailableError
+    if fig is None:
+        fignums = plt.get_fignums()  # if no fig -> []
+        if not fignums:
+            raise FigureNumsError
+        fig = plt.gcf()
 
-    fig = plt.gcf()
     buffer = BytesIO()
     fig.savefig(buffer, format='png')
     clipboard_format = win32clipboard.RegisterClipboardFormat('PNG')
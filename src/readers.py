@@ -0,0 +1,365 @@
+'''
+File formats the data pool can import besides plain delimited text.
+
+Delimited text (CSV, TSV, whitespace-separated) is parsed by data_loading.
+If it is compressed, one of the CODECS decodes it on the fly, without
+temporary files. Binary formats are read by Reader subclasses added with
+`register_reader`. Both are chosen by magic bytes first and by file
+extension second.
+
+NumPy `.npy` files and raw binary arrays are memory-mapped rather than
+read: the returned DataFrame holds views of the mapped file, so series are
+plotted straight from the page cache. A raw array needs a JSON sidecar
+named like the file plus `.json`:
+
+    {"columns": ["time", "acc"], "dtype": "<f4", "layout": "rows", "offset": 0}
+
+`layout` is "rows" when the values of one row are stored together and
+"columns" when every column is stored contiguously. A `.npy` file may also
+have a sidecar, which then only names its columns.
+
+Parquet and Feather need the optional package pyarrow, and zstd needs the
+optional package zstandard.
+'''
+import bz2
+import gzip
+import io
+import json
+import lzma
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import (
+    BinaryIO, Callable, Dict, List, Optional, Sequence, Tuple, TypedDict, Union
+)
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+MAGIC_SIZE = 8
+TEXT_EXTENSIONS = ('.csv', '.tsv', '.txt', '.dat')
+SIDECAR_SUFFIX = '.json'
+MAPPED_ATTR = 'memory_mapped'
+
+PathLike = Union[str, Path]
+
+
+class Schema(TypedDict):
+    path: str
+    columns: List[str]
+    approx_rows: int
+
+
+class Sidecar(TypedDict):
+    columns: List[str]
+    dtype: str
+    layout: str  # 'rows' or 'columns'
+    offset: int
+
+
+class Error(Exception):
+    '''Base class for exceptions in this module.'''
+    pass
+
+
+class SidecarError(Error):
+    '''Exception raised when a raw array has no usable sidecar.'''
+
+    def __init__(self, path: PathLike, reason: str):
+        self.message = f'{path}{SIDECAR_SUFFIX}: {reason}'
+        super().__init__(self.message)
+
+
+class MissingDependencyError(Error):
+    '''Exception raised when a format needs an optional package.'''
+
+    def __init__(self, format_name: str, package: str):
+        self.message = f'Reading {format_name} files requires the package "{package}".'
+        super().__init__(self.message)
+
+
+class PrefixedReader(io.RawIOBase):
+    '''Replay bytes already read from a stream before the rest of it.'''
+
+    def __init__(self, prefix: bytes, stream: BinaryIO):
+        self.prefix = memoryview(prefix)
+        self.stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self.prefix:
+            size = min(len(buffer), len(self.prefix))
+            buffer[:size] = self.prefix[:size]
+            self.prefix = self.prefix[size:]
+            return size
+        return self.stream.readinto(buffer)
+
+
+class Codec:
+    def __init__(
+            self, name: str, extensions: Sequence[str], magic: bytes,
+            opener: Callable[[PathLike], BinaryIO]):
+        self.name = name
+        self.extensions = tuple(extensions)
+        self.magic = magic
+        self.opener = opener
+
+    def open(self, path: PathLike) -> BinaryIO:
+        return self.opener(path)
+
+
+def open_zstd(path: PathLike) -> BinaryIO:
+    if zstandard is None:
+        raise MissingDependencyError('zstd', 'zstandard')
+    stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return io.BufferedReader(stream)
+
+
+CODECS: List[Codec] = [
+    Codec('gzip', ('.gz',), b'\x1f\x8b', gzip.open),
+    Codec('bzip2', ('.bz2',), b'BZh', bz2.open),
+    Codec('xz', ('.xz',), b'\xfd7zXZ\x00', lzma.open),
+    Codec('zstd', ('.zst', '.zstd'), b'\x28\xb5\x2f\xfd', open_zstd),
+]
+
+
+class Reader(ABC):
+    '''
+    Base class of the readers for binary formats. Subclasses set `name`,
+    `extensions` and `magic` and implement `read` and `scan_schema`.
+    '''
+    name = ''
+    extensions: Tuple[str, ...] = ()
+    magic = b''
+
+    def accepts(self, path: PathLike, magic: bytes) -> bool:
+        if self.magic and magic.startswith(self.magic):
+            return True
+        return Path(path).suffix.lower() in self.extensions
+
+    @abstractmethod
+    def read(self, path: PathLike, usecols: Sequence[str] = None) -> pd.DataFrame:
+        pass
+
+    @abstractmethod
+    def scan_schema(self, path: PathLike) -> Schema:
+        pass
+
+
+class ParquetReader(Reader):
+    name = 'Parquet'
+    extensions = ('.parquet', '.pq')
+    magic = b'PAR1'
+
+    def read(self, path: PathLike, usecols: Sequence[str] = None) -> pd.DataFrame:
+        if pyarrow is None:
+            raise MissingDependencyError(self.name, 'pyarrow')
+        columns = None if usecols is None else list(dict.fromkeys(usecols))
+        return pd.read_parquet(path, columns=columns)
+
+    def scan_schema(self, path: PathLike) -> Schema:
+        if pyarrow is None:
+            raise MissingDependencyError(self.name, 'pyarrow')
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        return {
+            'path': str(path),
+            'columns': list(parquet_file.schema_arrow.names),
+            'approx_rows': parquet_file.metadata.num_rows
+        }
+
+
+class FeatherReader(Reader):
+    name = 'Feather'
+    extensions = ('.feather', '.arrow')
+    magic = b'ARROW1'
+
+    def read(self, path: PathLike, usecols: Sequence[str] = None) -> pd.DataFrame:
+        if pyarrow is None:
+            raise MissingDependencyError(self.name, 'pyarrow')
+        columns = None if usecols is None else list(dict.fromkeys(usecols))
+        return pd.read_feather(path, columns=columns)
+
+    def scan_schema(self, path: PathLike) -> Schema:
+        if pyarrow is None:
+            raise MissingDependencyError(self.name, 'pyarrow')
+        with pyarrow.memory_map(str(path)) as source:
+            reader = pyarrow.ipc.open_file(source)
+            rows = sum(
+                reader.get_batch(idx).num_rows
+                for idx in range(reader.num_record_batches)
+            )
+            columns = list(reader.schema.names)
+        return {'path': str(path), 'columns': columns, 'approx_rows': rows}
+
+
+def get_sidecar_path(path: PathLike) -> Path:
+    return Path(f'{path}{SIDECAR_SUFFIX}')
+
+
+def read_sidecar(path: PathLike) -> Optional[Dict]:
+    sidecar_path = get_sidecar_path(path)
+    if not sidecar_path.exists():
+        return None
+    with open(sidecar_path, 'r') as f:
+        return json.load(f)
+
+
+def get_column_views(
+        array: np.ndarray, names: Sequence[str],
+        usecols: Sequence[str] = None) -> Dict[str, np.ndarray]:
+    '''Map column names to views of a 2-D (rows x columns) array.'''
+    usecols = names if usecols is None else list(dict.fromkeys(usecols))
+    missing = [column for column in usecols if column not in names]
+    if missing:
+        raise ValueError(f'Columns not found: {", ".join(missing)}')
+    return {column: array[:, names.index(column)] for column in usecols}
+
+
+def frame_from_views(views: Dict[str, np.ndarray], path: PathLike) -> pd.DataFrame:
+    df = pd.DataFrame(views, copy=False)
+    df.attrs[MAPPED_ATTR] = str(path)
+    return df
+
+
+class NpyReader(Reader):
+    '''
+    Memory-maps a `.npy` file holding a 1-D array, a 2-D (rows x columns)
+    array or a structured array with one field per column.
+    '''
+    name = 'NumPy'
+    extensions = ('.npy',)
+    magic = b'\x93NUMPY'
+
+    def load(self, path: PathLike) -> Tuple[np.ndarray, List[str]]:
+        array = np.load(path, mmap_mode='r')
+        sidecar = read_sidecar(path) or {}
+        if array.dtype.names is not None:
+            return array, list(array.dtype.names)
+        if array.ndim == 1:
+            array = array[:, np.newaxis]
+        if array.ndim != 2:
+            raise ValueError(f'{path}: expected a 1-D or 2-D array, got {array.ndim}-D')
+        names = sidecar.get('columns') or [f'column-{idx}' for idx in range(array.shape[1])]
+        if len(names) != array.shape[1]:
+            raise SidecarError(path, f'{len(names)} names for {array.shape[1]} columns')
+        return array, list(names)
+
+    def read(self, path: PathLike, usecols: Sequence[str] = None) -> pd.DataFrame:
+        array, names = self.load(path)
+        if array.dtype.names is not None:
+            usecols = names if usecols is None else list(dict.fromkeys(usecols))
+            missing = [column for column in usecols if column not in names]
+            if missing:
+                raise ValueError(f'Columns not found: {", ".join(missing)}')
+            return frame_from_views({column: array[column] for column in usecols}, path)
+        return frame_from_views(get_column_views(array, names, usecols), path)
+
+    def scan_schema(self, path: PathLike) -> Schema:
+        array, names = self.load(path)
+        return {'path': str(path), 'columns': names, 'approx_rows': len(array)}
+
+
+class RawArrayReader(Reader):
+    '''
+    Memory-maps a headerless binary array described by its sidecar, e.g.
+    little-endian float32 values written by a DAQ or solver.
+    '''
+    name = 'raw array'
+    extensions = ('.f32', '.f64', '.bin', '.raw')
+
+    def load(self, path: PathLike) -> Tuple[np.ndarray, List[str]]:
+        sidecar: Sidecar = read_sidecar(path)
+        if sidecar is None:
+            raise SidecarError(path, 'not found')
+        if not sidecar.get('columns'):
+            raise SidecarError(path, '"columns" is missing')
+        names = list(sidecar['columns'])
+        dtype = np.dtype(sidecar.get('dtype', '<f4'))
+        offset = int(sidecar.get('offset', 0))
+        value_num = (os.path.getsize(path) - offset) // dtype.itemsize
+        row_num = value_num // len(names)
+        if row_num == 0:
+            return np.empty((0, len(names)), dtype=dtype), names
+
+        layout = sidecar.get('layout', 'rows')
+        shape = (row_num, len(names)) if layout == 'rows' else (len(names), row_num)
+        array = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+        if layout == 'columns':
+            array = array.T
+        elif layout != 'rows':
+            raise SidecarError(path, f'unknown layout "{layout}"')
+        return array, names
+
+    def read(self, path: PathLike, usecols: Sequence[str] = None) -> pd.DataFrame:
+        array, names = self.load(path)
+        return frame_from_views(get_column_views(array, names, usecols), path)
+
+    def scan_schema(self, path: PathLike) -> Schema:
+        array, names = self.load(path)
+        return {'path': str(path), 'columns': names, 'approx_rows': len(array)}
+
+
+_readers: List[Reader] = [
+    ParquetReader(), FeatherReader(), NpyReader(), RawArrayReader()
+]
+
+
+def register_reader(reader: Reader):
+    '''Add a reader. Readers registered later are tried first.'''
+    _readers.insert(0, reader)
+
+
+def read_magic(path: PathLike) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read(MAGIC_SIZE)
+
+
+def identify(path: PathLike) -> Tuple[Optional[Reader], Optional[Codec]]:
+    '''
+    Return the reader of a binary file, or the codec of a compressed text
+    file. Both are None for plain text.
+    '''
+    magic = read_magic(path)
+    for reader in _readers:
+        if reader.magic and magic.startswith(reader.magic):
+            return reader, None
+    for codec in CODECS:
+        if magic.startswith(codec.magic):
+            return None, codec
+    for reader in _readers:
+        if reader.accepts(path, magic):
+            return reader, None
+    return None, None
+
+
+def get_extensions() -> List[str]:
+    extensions = list(TEXT_EXTENSIONS)
+    for codec in CODECS:
+        extensions.extend(
+            text + extension
+            for text in TEXT_EXTENSIONS for extension in codec.extensions
+        )
+    for reader in _readers:
+        extensions.extend(reader.extensions)
+    return extensions
+
+
+def get_filetypes() -> List[Tuple[str, str]]:
+    '''File dialog filter of every supported format.'''
+    patterns = ' '.join(f'*{extension}' for extension in get_extensions())
+    return [('Data files', patterns), ('csv files', '*.csv'), ('All files', '*.*')]
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent
+for directory in (ROOT_DIR.joinpath('src'), ROOT_DIR):  # modules, benchmark
+    if str(directory) not in sys.path:
+        sys.path.insert(0, str(directory))
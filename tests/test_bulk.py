@@ -0,0 +1,40 @@
+'''
+From the bulk threshold on, numeric series are drawn as one LineCollection;
+series the collection cannot hold keep the per-line path.
+'''
+import matplotlib
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt  # noqa: E402
+import pandas as pd  # noqa: E402
+import pytest  # noqa: E402
+
+import plotting  # noqa: E402
+
+
+def make_config(series: int):
+    config = plotting.get_initial_configuration()
+    config['data']['fieldnames'] = [{'x': 't', 'y': 'v'}] * series
+    config['data']['labels'] = [f'run-{idx}' for idx in range(series)]
+    config['figure']['size'] = [6.4, 4.8]
+    config['figure']['bulk_threshold'] = 2
+    config['axis_x']['scale'] = config['axis_y']['scale'] = 'linear'
+    config['axis_x']['lim'] = config['axis_y']['lim'] = None
+    return config
+
+
+@pytest.mark.parametrize('x, bulk', [
+    ([0.0, 1.0, 2.0], True),
+    (['a', 'b', 'c'], False),
+    (pd.Categorical(['a', 'b', 'c']), False),
+])
+def test_bulk_only_for_numeric_series(x, bulk):
+    data_pool = [pd.DataFrame({'t': x, 'v': [1.0, 2.0, 3.0]})] * 3
+    fig = plotting.draw_figure(make_config(3), data_pool)
+    try:
+        fig.canvas.draw()
+        ax = fig.axes[0]
+        assert len(plotting.get_bulk_collections(ax)) == int(bulk)
+        assert len(ax.lines) == (0 if bulk else 3)
+    finally:
+        plt.close(fig)
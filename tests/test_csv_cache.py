@@ -0,0 +1,44 @@
+'''
+A cache hit must return the same frame as a fresh parse of the file.
+'''
+import pandas as pd
+
+import csv_cache
+
+
+def write_csv(tmp_path, text: str):
+    path = tmp_path.joinpath('data.csv')
+    path.write_text(text)
+    return path
+
+
+def test_string_column_keeps_missing_values(tmp_path):
+    path = write_csv(tmp_path, 't,name,v\n0,a,1\n1,,2\n2,b,\n')
+    df = pd.read_csv(path)
+    csv_cache.store(path, df, cache_dir=tmp_path.joinpath('cache'))
+
+    cached = csv_cache.load(path, cache_dir=tmp_path.joinpath('cache'))
+    assert cached.equals(df)
+    assert cached['name'].isna().tolist() == [False, True, False]
+
+
+def test_partial_entries_merge_string_columns(tmp_path):
+    path = write_csv(tmp_path, 't,name,unit\n0,a,g\n1,,m\n2,b,\n')
+    df = pd.read_csv(path)
+    cache_dir = tmp_path.joinpath('cache')
+    csv_cache.store(path, df[['name']], cache_dir=cache_dir, complete=False)
+    csv_cache.store(path, df[['t', 'unit']], cache_dir=cache_dir, complete=False)
+
+    cached = csv_cache.load(path, cache_dir=cache_dir, usecols=['t', 'name', 'unit'])
+    assert cached.equals(df)
+
+
+def test_mixed_column_is_not_cached(tmp_path):
+    path = write_csv(tmp_path, 't,v\n0,1\n1,2\n')
+    df = pd.DataFrame({'t': [0, 1], 'v': pd.Series([1, 'x'], dtype=object)})
+    cache_dir = tmp_path.joinpath('cache')
+    csv_cache.store(path, df, cache_dir=cache_dir)
+
+    assert csv_cache.load(path, cache_dir=cache_dir) is None
+    assert csv_cache.load(path, cache_dir=cache_dir, usecols=['v']) is None
+    assert csv_cache.load(path, cache_dir=cache_dir, usecols=['t']).equals(df[['t']])
@@ -0,0 +1,141 @@
+'''
+Decimation must never lose what a reader looks for in a record: the first
+and last samples and the extrema. m4 and the pyramid keep the minimum and
+maximum of every bucket they reduce; lttb keeps one sample per bucket, so
+only its global extrema and end points are checked, on spikes that fall
+into separate buckets.
+'''
+import numpy as np
+import pytest
+
+import decimation
+
+
+PIXEL_WIDTH = 100
+SPIKES = [333, 1_234, 4_567]  # in separate lttb buckets
+
+
+def make_spiky(rows: int = 20_000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    x = np.arange(rows) * 0.01
+    y = np.sin(x) + 0.01 * rng.standard_normal(rows)
+    y[SPIKES] = [25.0, -30.0, 12.0]
+    return x, y
+
+
+def with_nans(x: np.ndarray, y: np.ndarray):
+    y = y.copy()
+    y[[0, 10, 500, 7_777, len(y) - 2]] = np.nan
+    x = x.copy()
+    x[[20, 9_000]] = np.nan
+    return x, y
+
+
+def assert_kept(values_x, values_y, expected_x, expected_y):
+    kept = set(zip(values_x.tolist(), values_y.tolist()))
+    for point in zip(np.atleast_1d(expected_x).tolist(), np.atleast_1d(expected_y).tolist()):
+        assert point in kept
+
+
+def assert_ends_and_extrema(values_x, values_y, x, y):
+    x, y = decimation.get_finite(x, y)
+    assert len(values_x) < len(x)
+    assert (values_x[0], values_y[0]) == (x[0], y[0])
+    assert (values_x[-1], values_y[-1]) == (x[-1], y[-1])
+    assert values_y.max() == y.max()
+    assert values_y.min() == y.min()
+
+
+@pytest.mark.parametrize('nans', [False, True])
+@pytest.mark.parametrize('method', ['m4', 'lttb'])
+def test_decimate_keeps_ends_and_global_extrema(method, nans):
+    x, y = make_spiky()
+    if nans:
+        x, y = with_nans(x, y)
+    values_x, values_y = decimation.decimate(x, y, PIXEL_WIDTH, method)
+    assert np.isfinite(values_x).all() and np.isfinite(values_y).all()
+    assert_ends_and_extrema(values_x, values_y, x, y)
+
+
+@pytest.mark.parametrize('nans', [False, True])
+def test_m4_keeps_bucket_extrema(nans):
+    x, y = make_spiky()
+    if nans:
+        x, y = with_nans(x, y)
+    values_x, values_y = decimation.decimate(x, y, PIXEL_WIDTH, 'm4')
+
+    x, y = decimation.get_finite(x, y)
+    starts = decimation.get_bucket_starts(x, PIXEL_WIDTH)
+    for start, end in zip(starts, np.append(starts[1:], len(x))):
+        bucket = slice(start, end)
+        for idx in (np.argmin(y[bucket]), np.argmax(y[bucket]), 0, end - start - 1):
+            assert_kept(values_x, values_y, x[bucket][idx], y[bucket][idx])
+
+
+def test_lttb_keeps_isolated_spikes():
+    x, y = make_spiky()
+    values_x, values_y = decimation.decimate(x, y, PIXEL_WIDTH, 'lttb')
+    assert_kept(values_x, values_y, x[SPIKES], y[SPIKES])
+
+
+def test_short_series_is_unchanged():
+    x, y = make_spiky()
+    x, y = x[:4 * PIXEL_WIDTH], y[:4 * PIXEL_WIDTH]
+    values_x, values_y = decimation.decimate(x, y, PIXEL_WIDTH, 'm4')
+    assert np.array_equal(values_x, x) and np.array_equal(values_y, y)
+
+
+def get_query_level(pyramid: decimation.MinMaxPyramid, sample_num: int) -> int:
+    target_block = sample_num / (2 * PIXEL_WIDTH)
+    for level in pyramid.levels:
+        if level.block >= target_block:
+            return level.block
+    return pyramid.levels[-1].block
+
+
+@pytest.mark.parametrize('nans', [False, True])
+@pytest.mark.parametrize('lims', [(None, None), (30.0, 150.0), (120.0, 125.0)])
+def test_pyramid_query_keeps_ends_and_block_extrema(lims, nans):
+    x, y = make_spiky()
+    if nans:
+        x, y = with_nans(x, y)
+    pyramid = decimation.get_pyramid(x, y)
+    values_x, values_y = pyramid.query(*lims, PIXEL_WIDTH)
+
+    x, y = pyramid.x, pyramid.y
+    start, end = pyramid.get_index_range(*lims)
+    assert (values_x[0], values_x[-1]) == (x[start], x[end - 1])
+    assert values_y.max() == y[start:end].max()
+    assert values_y.min() == y[start:end].min()
+
+    block = get_query_level(pyramid, end - start)
+    for block_start in range(-(-start // block) * block, end - block + 1, block):
+        bucket = slice(block_start, block_start + block)
+        for idx in (np.argmin(y[bucket]), np.argmax(y[bucket])):
+            assert_kept(values_x, values_y, x[bucket][idx], y[bucket][idx])
+
+
+@pytest.mark.parametrize('initial', [1, 5, 4_096, 19_999])
+def test_extended_pyramid_matches_rebuilt_one(initial):
+    x, y = with_nans(*make_spiky())
+    pyramid = decimation.MinMaxPyramid(*decimation.get_finite(x[:initial], y[:initial]))
+    rng = np.random.default_rng(1)
+    position = initial
+    while position < len(x):
+        step = int(rng.integers(1, 700))
+        assert pyramid.extend(x[position:position + step], y[position:position + step])
+        position += step
+
+    rebuilt = decimation.MinMaxPyramid(*decimation.get_finite(x, y))
+    assert np.array_equal(pyramid.x, rebuilt.x)
+    assert [level.block for level in pyramid.levels] == [level.block for level in rebuilt.levels]
+    for level, expected in zip(pyramid.levels, rebuilt.levels):
+        assert np.array_equal(level.min_idx, expected.min_idx)
+        assert np.array_equal(level.max_idx, expected.max_idx)
+
+
+def test_pyramid_rejects_unsorted_extension():
+    x, y = make_spiky()
+    pyramid = decimation.MinMaxPyramid(x, y)
+    assert not pyramid.extend(x[:10], y[:10])
+    assert len(pyramid) == len(x)
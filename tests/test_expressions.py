@@ -0,0 +1,69 @@
+'''
+Derived fields evaluated outside the GUI, as batch_render and
+plotting.get_data_pool do.
+'''
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_pool
+import expressions
+import plotting
+
+
+def make_config(csv_indices, fieldnames, derived_fields):
+    config = plotting.get_initial_configuration()
+    config['data']['csv_indices'] = csv_indices
+    config['data']['fieldnames'] = fieldnames
+    config['data']['derived_fields'] = derived_fields
+    return config
+
+
+def test_datasets_sharing_a_csv_id_use_their_own_frames():
+    config = make_config(
+        ['1', '1'],
+        [{'x': 't', 'y': 'r2'}, {'x': 't', 'y': 'b'}],
+        [{'csv_idx': '1', 'name': 'r2', 'expression': '{r} * 2'}]
+    )
+    frames = [
+        pd.DataFrame({'t': [0.0, 1.0], 'r': [1.0, 2.0]}),
+        pd.DataFrame({'t': [0.0, 1.0, 2.0], 'b': [5.0, 6.0, 7.0]}),
+    ]
+    first, second = expressions.evaluate_frames(config, frames)
+    assert first['r2'].tolist() == [2.0, 4.0]
+    assert second.equals(frames[1][['t', 'b']])
+
+
+def test_required_columns_of_repeated_csv_id_stay_with_the_dataset():
+    config = make_config(
+        ['1', '2', '1'],
+        [{'x': 't', 'y': 'r'}, {'x': 't', 'y': 'sum'}, {'x': 't', 'y': 'r2'}],
+        [
+            {'csv_idx': '1', 'name': 'r2', 'expression': '{r} * 2'},
+            {'csv_idx': '2', 'name': 'sum', 'expression': '{a} + {1:r}'},
+        ]
+    )
+    assert plotting.get_required_columns(config) == {
+        0: ['t', 'r'], 1: ['t', 'a'], 2: ['t', 'r']
+    }
+
+
+def test_non_numeric_column_raises_expression_error():
+    config = make_config(
+        ['1'],
+        [{'x': 't', 'y': 'twice'}],
+        [{'csv_idx': '1', 'name': 'twice', 'expression': '{name} * 2'}]
+    )
+    frames = [pd.DataFrame({'t': [0.0, 1.0], 'name': ['a', 'b']})]
+    with pytest.raises(expressions.ExpressionError):
+        expressions.evaluate_frames(config, frames)
+
+
+def test_frames_without_file_report_unloaded_columns():
+    pool = data_pool.DataPool.from_frames(
+        {'1': ''}, {'1': pd.DataFrame({'t': np.arange(3.0)})},
+        use_cache=False, compact=False
+    )
+    pool.schemas['1']['columns'].append('y')
+    with pytest.raises(data_pool.NoSourceError):
+        pool.get_columns('1', ['y'])
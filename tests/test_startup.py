@@ -0,0 +1,17 @@
+'''
+`import main_gui` must stay cheap: pandas, numpy and matplotlib are only
+imported once the window is shown (see lazy_imports). The budget and the
+timing are those of benchmark.bench_startup.
+'''
+from benchmark.bench_startup import IMPORT_BUDGET_MS, time_import, time_imports
+
+RUNS = 3
+
+
+def test_import_loads_no_heavy_module():
+    assert time_import()[1] == []
+
+
+def test_import_within_budget():
+    median = time_imports(RUNS)[0]
+    assert median <= IMPORT_BUDGET_MS, f'import main_gui took {median:.1f} ms'